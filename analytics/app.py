@@ -1,19 +1,73 @@
+import hmac
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from config import Config
 from models import db
 from dotenv import load_dotenv
-from services import AnalyticsService
+from services import AnalyticsService, with_staleness
+from cache import NAMESPACES, bump_versions, init_cache
 
 load_dotenv()
 
 
+def top_books_limit(value):
+    return min(int(value), 50)  # Prevent excessive queries
+
+
+# Metrics /analytics/batch can compute: service method and how to read each
+# spec parameter. Unreadable parameters fall back to the method's default,
+# as they do on the single-metric routes.
+BATCH_METRICS = {
+    'borrowed-per-month': (AnalyticsService.get_borrowed_per_month, {'year': int}),
+    'top-books-by-borrowings': (AnalyticsService.get_top_books_by_borrowings, {'limit': top_books_limit}),
+    'top-books-by-ratings': (AnalyticsService.get_top_books_by_ratings, {'limit': top_books_limit}),
+    'borrowed-by-category': (
+        AnalyticsService.get_borrowed_by_category,
+        {'start_date': date.fromisoformat, 'end_date': date.fromisoformat},
+    ),
+    'borrowed-vs-returned': (
+        AnalyticsService.get_borrowed_vs_returned,
+        {'start_date': date.fromisoformat, 'end_date': date.fromisoformat},
+    ),
+}
+
+
+def run_batch_metric(app, spec):
+    """Compute one batch metric in its own app context, and so on its own pooled connection."""
+    method, params = BATCH_METRICS[spec['metric']]
+    kwargs = {}
+    for name, convert in params.items():
+        if spec.get(name) is None:
+            continue
+        try:
+            kwargs[name] = convert(spec[name])
+        except (TypeError, ValueError):
+            pass
+
+    with app.app_context():
+        try:
+            data = method(**kwargs)
+        except Exception as e:
+            data = {'success': False, 'error': str(e)}
+    if data.get('refreshed_at'):
+        data = with_staleness(data)
+    return {
+        'metric': spec['metric'],
+        'success': data.get('success', 'error' not in data),
+        'data': data,
+    }
+
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
     db.init_app(app)
+    init_cache(app)
     CORS(app) 
     register_routes(app)
     
@@ -43,7 +97,8 @@ def register_routes(app):
                 '/analytics/top-books-by-borrowings', 
                 '/analytics/top-books-by-ratings',
                 '/analytics/borrowed-by-category',
-                '/analytics/borrowed-vs-returned'
+                '/analytics/borrowed-vs-returned',
+                '/analytics/batch'
             ],
             'database': 'PostgreSQL',
             'status': 'ready'
@@ -82,6 +137,7 @@ def register_routes(app):
             data = AnalyticsService.get_top_books_by_borrowings(limit)
             
             if data['success']:
+                data = with_staleness(data)
                 return jsonify({
                     'success': True,
                     'data': data,
@@ -115,6 +171,7 @@ def register_routes(app):
             data = AnalyticsService.get_top_books_by_ratings(limit)
             
             if data['success']:
+                data = with_staleness(data)
                 return jsonify({
                     'success': True,
                     'data': data,
@@ -134,6 +191,140 @@ def register_routes(app):
                 'message': 'Failed to retrieve top books by ratings'
             }), 500
 
+    @app.route('/analytics/borrowed-by-category', methods=['GET'])
+    def borrowed_by_category():
+        """Get borrowings per book category, optionally between start_date and end_date (YYYY-MM-DD)."""
+        try:
+            start_date = request.args.get('start_date', type=date.fromisoformat)
+            end_date = request.args.get('end_date', type=date.fromisoformat)
+            data = AnalyticsService.get_borrowed_by_category(start_date, end_date)
+
+            if data['success']:
+                return jsonify({
+                    'success': True,
+                    'data': data,
+                    'message': f'Borrowings across {len(data["categories"])} categories'
+                }), 200
+            else:
+                return jsonify({
+                    'success': False,
+                    'error': data['error'],
+                    'message': 'Failed to retrieve borrowings by category'
+                }), 500
+
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'message': 'Failed to retrieve borrowings by category'
+            }), 500
+
+    @app.route('/analytics/borrowed-vs-returned', methods=['GET'])
+    def borrowed_vs_returned():
+        """Get monthly borrowed vs returned counts, optionally between start_date and end_date (YYYY-MM-DD)."""
+        try:
+            start_date = request.args.get('start_date', type=date.fromisoformat)
+            end_date = request.args.get('end_date', type=date.fromisoformat)
+            data = AnalyticsService.get_borrowed_vs_returned(start_date, end_date)
+
+            if data['success']:
+                return jsonify({
+                    'success': True,
+                    'data': data,
+                    'message': f'Borrowed vs returned over {len(data["labels"])} months'
+                }), 200
+            else:
+                return jsonify({
+                    'success': False,
+                    'error': data['error'],
+                    'message': 'Failed to retrieve borrowed vs returned statistics'
+                }), 500
+
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'message': 'Failed to retrieve borrowed vs returned statistics'
+            }), 500
+
+    batch_executor = ThreadPoolExecutor(
+        max_workers=app.config['ANALYTICS_BATCH_WORKERS'], thread_name_prefix='analytics-batch'
+    )
+
+    @app.route('/analytics/batch', methods=['POST'])
+    def analytics_batch():
+        """
+        Compute several metrics in one request. The body is
+        ``{"metrics": [{"metric": "top-books-by-ratings", "limit": 10}, ...]}``;
+        results come back in the same order. Metrics run concurrently, so the
+        request takes about as long as the slowest one.
+        """
+        payload = request.get_json(silent=True)
+        specs = payload.get('metrics') if isinstance(payload, dict) else None
+        if not isinstance(specs, list) or not specs:
+            return jsonify({
+                'success': False,
+                'message': 'Provide a non-empty "metrics" list'
+            }), 400
+        if len(specs) > app.config['ANALYTICS_BATCH_MAX_METRICS']:
+            return jsonify({
+                'success': False,
+                'message': f'At most {app.config["ANALYTICS_BATCH_MAX_METRICS"]} metrics per batch'
+            }), 400
+        unknown = [
+            str(spec.get('metric')) if isinstance(spec, dict) else repr(spec)
+            for spec in specs
+            if not isinstance(spec, dict) or not isinstance(spec.get('metric'), str) or spec['metric'] not in BATCH_METRICS
+        ]
+        if unknown:
+            return jsonify({
+                'success': False,
+                'message': f'Unknown metrics: {", ".join(unknown)}',
+                'available': list(BATCH_METRICS)
+            }), 400
+
+        started = time.perf_counter()
+        results = list(batch_executor.map(lambda spec: run_batch_metric(app, spec), specs))
+        return jsonify({
+            'success': all(result['success'] for result in results),
+            'results': results,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            'message': f'Computed {len(results)} metrics'
+        }), 200
+
+    @app.route('/analytics/cache/invalidate', methods=['POST'])
+    def invalidate_cache():
+        """Drop cached results that depend on the given namespaces (all by default)."""
+        token = app.config.get('ANALYTICS_CACHE_INVALIDATE_TOKEN')
+        if not token or not hmac.compare_digest(request.headers.get('X-Analytics-Token', ''), token):
+            return jsonify({
+                'success': False,
+                'message': 'Invalid or missing invalidation token'
+            }), 403
+
+        payload = request.get_json(silent=True)
+        if payload is None:
+            payload = {}
+        namespaces = (payload.get('namespaces') or list(NAMESPACES)) if isinstance(payload, dict) else None
+        if not isinstance(namespaces, list) or not all(isinstance(name, str) for name in namespaces):
+            return jsonify({
+                'success': False,
+                'message': 'Provide a JSON object whose optional "namespaces" is a list of strings'
+            }), 400
+        unknown = sorted(set(namespaces) - set(NAMESPACES))
+        if unknown:
+            return jsonify({
+                'success': False,
+                'message': f'Unknown namespaces: {", ".join(unknown)}'
+            }), 400
+
+        bump_versions(namespaces)
+        return jsonify({
+            'success': True,
+            'namespaces': namespaces,
+            'message': 'Analytics cache invalidated'
+        }), 200
+
 
 if __name__ == '__main__':
     app = create_app()
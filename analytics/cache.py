@@ -0,0 +1,123 @@
+import functools
+import inspect
+import logging
+import time
+
+from flask import current_app
+from flask_caching import Cache
+
+
+logger = logging.getLogger(__name__)
+
+# Shared with a Redis backend, so every worker sees the same entries,
+# versions and locks. Without Redis each process keeps its own.
+cache = Cache()
+
+NAMESPACES = ('books', 'borrowings', 'reviews')
+VERSION_KEY = 'analytics:version:{}'
+ENTRY_KEY = 'analytics:entry:{}'
+LOCK_KEY = 'analytics:lock:{}'
+
+
+def cache_config(app):
+    """
+    Flask-Caching settings for ``app``: Redis when ``CACHE_REDIS_URL`` is set
+    and answers a ping, else a FileSystemCache under ``CACHE_DIR``, else a
+    per-process SimpleCache.
+    """
+    config = {'CACHE_DEFAULT_TIMEOUT': app.config['ANALYTICS_CACHE_TIMEOUT']}
+    if app.config.get('CACHE_TYPE'):
+        return config
+
+    redis_url = app.config.get('CACHE_REDIS_URL')
+    if redis_url:
+        try:
+            import redis
+            redis.Redis.from_url(redis_url, socket_connect_timeout=1).ping()
+            config.update(CACHE_TYPE='RedisCache', CACHE_REDIS_URL=redis_url)
+            return config
+        except Exception as e:
+            logger.warning(f"Redis cache unavailable ({e}); falling back to a local cache")
+
+    if app.config.get('CACHE_DIR'):
+        config.update(CACHE_TYPE='FileSystemCache', CACHE_DIR=app.config['CACHE_DIR'])
+    else:
+        config.update(CACHE_TYPE='SimpleCache')
+    return config
+
+
+def init_cache(app):
+    cache.init_app(app, config={**app.config, **cache_config(app)})
+
+
+def bump_versions(namespaces=NAMESPACES):
+    """
+    Invalidate every cached result that depends on ``namespaces``. Versions
+    are timestamps rather than counters so an evicted version key can never
+    come back with a value that was already used.
+    """
+    version = time.time_ns()
+    cache.set_many({VERSION_KEY.format(name): version for name in namespaces}, timeout=0)
+
+
+def current_version(namespaces):
+    keys = [VERSION_KEY.format(name) for name in namespaces]
+    return tuple(version or 0 for version in cache.get_many(*keys))
+
+
+def is_failure(result):
+    return isinstance(result, dict) and (result.get('success') is False or 'error' in result)
+
+
+def cached_analytics(name, depends_on):
+    """
+    Cache a service method's result per call arguments for
+    ``ANALYTICS_CACHE_TIMEOUT`` seconds, or until one of ``depends_on`` is
+    invalidated.
+
+    Misses are coalesced: the first caller takes a short lock and runs the
+    query while concurrent callers for the same arguments wait for its
+    result instead of all hitting PostgreSQL at once. Failed results (the
+    services' error fallbacks) are never stored.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = ','.join(f"{key}={value!r}" for key, value in bound.arguments.items())
+            key = f"{name}({arguments})"
+
+            version = current_version(depends_on)
+            entry_key = ENTRY_KEY.format(key)
+            entry = cache.get(entry_key)
+            if entry and entry['version'] == version:
+                return entry['value']
+
+            lock_key = LOCK_KEY.format(key)
+            lock_seconds = current_app.config.get('ANALYTICS_CACHE_LOCK_SECONDS', 10)
+            locked = cache.add(lock_key, 1, timeout=lock_seconds)
+            if not locked:
+                deadline = time.monotonic() + lock_seconds
+                while cache.has(lock_key):
+                    if time.monotonic() > deadline:
+                        logger.warning(f"Timed out waiting for {key} to be computed; computing it here")
+                        break
+                    time.sleep(0.05)
+                entry = cache.get(entry_key)
+                if entry and entry['version'] == version:
+                    return entry['value']
+
+            try:
+                value = func(*args, **kwargs)
+                if not is_failure(value):
+                    cache.set(entry_key, {'value': value, 'version': version})
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            return value
+
+        return wrapper
+    return decorator
@@ -23,6 +23,14 @@ class Config:
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
     
     ANALYTICS_CACHE_TIMEOUT = int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', '300'))
+    # Redis when reachable, else a FileSystemCache in CACHE_DIR, else in-process memory.
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_DIR = os.environ.get('CACHE_DIR')
+    # Shared secret the Django sync sends with cache invalidations; unset disables the hook.
+    ANALYTICS_CACHE_INVALIDATE_TOKEN = os.environ.get('ANALYTICS_CACHE_INVALIDATE_TOKEN', '')
+    # /analytics/batch: metrics per request and metrics computed at once (each holds a pooled connection)
+    ANALYTICS_BATCH_MAX_METRICS = int(os.environ.get('ANALYTICS_BATCH_MAX_METRICS', '10'))
+    ANALYTICS_BATCH_WORKERS = int(os.environ.get('ANALYTICS_BATCH_WORKERS', '4'))
     MAX_RECORDS_PER_QUERY = int(os.environ.get('MAX_RECORDS_PER_QUERY', '1000'))
     
     DJANGO_API_BASE_URL = os.environ.get('DJANGO_API_BASE_URL', 'http://localhost:8000/api')
@@ -40,6 +48,7 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    CACHE_TYPE = 'SimpleCache'
 
 # Configuration mapping
 config = {
@@ -1,23 +1,22 @@
 from models import db
-from datetime import datetime
+from datetime import datetime, timezone
 import calendar
 from sqlalchemy import func, extract, text
+from cache import cached_analytics
 
 
 def get_top_books_by_borrowings_query(limit=10):
-    """Raw SQL query for top books by borrowings."""
+    """Top books by borrowings, read from the materialized ranking in rank order."""
     query = text("""
         SELECT 
             b.id,
             b.title,
             b.author,
             b.cover_image,
-            COUNT(br.id) as borrow_count
-        FROM library_app_book b
-        INNER JOIN library_app_borrowrecord br ON b.id = br.book_id
-        GROUP BY b.id, b.title, b.author, b.cover_image
-        HAVING COUNT(br.id) >= 1
-        ORDER BY borrow_count DESC
+            v.borrow_count
+        FROM analytics_top_books_by_borrowings v
+        INNER JOIN library_app_book b ON b.id = v.book_id
+        ORDER BY v.borrow_count DESC, v.book_id
         LIMIT :limit
     """)
     result = db.session.execute(query, {'limit': limit})
@@ -25,44 +24,131 @@ def get_top_books_by_borrowings_query(limit=10):
 
 
 def get_top_books_by_ratings_query(limit=10):
-    """Raw SQL query for top books by ratings."""
+    """Top books by average rating, read from the materialized ranking in rank order."""
     query = text("""
         SELECT 
             b.id,
             b.title,
             b.author,
             b.cover_image,
-            AVG(CAST(r.rating AS FLOAT)) as avg_rating,
-            COUNT(r.id) as review_count
-        FROM library_app_book b
-        INNER JOIN library_app_review r ON b.id = r.book_id
-        GROUP BY b.id, b.title, b.author, b.cover_image
-        HAVING COUNT(r.id) >= 1
-        ORDER BY avg_rating DESC, review_count DESC
+            v.avg_rating,
+            v.review_count
+        FROM analytics_top_books_by_ratings v
+        INNER JOIN library_app_book b ON b.id = v.book_id
+        ORDER BY v.avg_rating DESC, v.review_count DESC, v.book_id
         LIMIT :limit
     """)
     result = db.session.execute(query, {'limit': limit})
     return result.fetchall()
 
 
+def get_view_refreshed_at(view_name):
+    """When ``view_name`` was last refreshed, or None before its first refresh is recorded."""
+    query = text("SELECT refreshed_at FROM analytics_view_refresh WHERE view_name = :view_name")
+    return db.session.execute(query, {'view_name': view_name}).scalar()
+
+
+def with_staleness(data):
+    """Copy of a ranking result with ``stale_seconds``: the age of the view it was read from."""
+    refreshed_at = data.get('refreshed_at')
+    if not refreshed_at:
+        return {**data, 'stale_seconds': None}
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(refreshed_at)
+    return {**data, 'stale_seconds': max(0, int(age.total_seconds()))}
+
+
 def get_borrowed_per_month_query(year):
-    """Raw SQL query for monthly borrowing data."""
+    """
+    Monthly borrowing counts from the per-category daily rollup. The date
+    range on ``day`` is an index range over a few thousand rows a year
+    instead of an EXTRACT over every borrow record.
+    """
     query = text("""
         SELECT 
-            EXTRACT(month FROM borrow_date) as month,
-            COUNT(*) as count
-        FROM library_app_borrowrecord
-        WHERE EXTRACT(year FROM borrow_date) = :year
-        GROUP BY EXTRACT(month FROM borrow_date)
+            EXTRACT(month FROM day) as month,
+            SUM(borrows) as count
+        FROM analytics_daily_category_activity
+        WHERE day >= make_date(:year, 1, 1) AND day < make_date(:year + 1, 1, 1)
+        GROUP BY EXTRACT(month FROM day)
         ORDER BY month
     """)
     result = db.session.execute(query, {'year': year})
     return result.fetchall()
 
 
+def day_range_filter(start_date=None, end_date=None):
+    """WHERE conditions and params for an inclusive ``day`` range; either end may be open."""
+    conditions, params = [], {}
+    if start_date:
+        conditions.append("a.day >= :start_date")
+        params['start_date'] = start_date
+    if end_date:
+        conditions.append("a.day <= :end_date")
+        params['end_date'] = end_date
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+
+def get_borrowed_by_category_query(start_date=None, end_date=None):
+    """
+    Borrowings and returns per category, plus an overall row, in one pass
+    over the per-category daily rollup.
+    """
+    where, params = day_range_filter(start_date, end_date)
+    query = text(f"""
+        SELECT 
+            c.id,
+            c.name,
+            GROUPING(c.id, c.name) as is_total,
+            SUM(a.borrows) as borrow_count,
+            SUM(a.returns) as return_count
+        FROM analytics_daily_category_activity a
+        LEFT JOIN library_app_bookcategory c ON c.id = a.category_id
+        {where}
+        GROUP BY GROUPING SETS ((c.id, c.name), ())
+        ORDER BY is_total, borrow_count DESC, c.id
+    """)
+    result = db.session.execute(query, params)
+    return result.fetchall()
+
+
+def get_borrowed_vs_returned_query(start_date=None, end_date=None):
+    """
+    Borrowings and returns per month, plus an overall row, in one pass over
+    the per-category daily rollup.
+    """
+    where, params = day_range_filter(start_date, end_date)
+    query = text(f"""
+        SELECT 
+            date_trunc('month', a.day) as month,
+            GROUPING(date_trunc('month', a.day)) as is_total,
+            SUM(a.borrows) as borrow_count,
+            SUM(a.returns) as return_count
+        FROM analytics_daily_category_activity a
+        {where}
+        GROUP BY GROUPING SETS ((date_trunc('month', a.day)), ())
+        ORDER BY is_total, month
+    """)
+    result = db.session.execute(query, params)
+    return result.fetchall()
+
+
+def get_outstanding_loans_query():
+    """Loans out right now and how many of them are overdue (partial index on unreturned due dates; stored times are naive UTC)."""
+    query = text("""
+        SELECT 
+            COUNT(*) as outstanding,
+            COUNT(*) FILTER (WHERE due_date < (now() AT TIME ZONE 'UTC')) as overdue
+        FROM library_app_borrowrecord
+        WHERE NOT is_returned
+    """)
+    result = db.session.execute(query)
+    return result.fetchone()
+
+
 class AnalyticsService:
 
     @staticmethod
+    @cached_analytics('top_books_by_borrowings', depends_on=('borrowings', 'books'))
     def get_top_books_by_borrowings(limit=10):
         """
         Get top books by number of borrowings with cover images.
@@ -76,6 +162,7 @@ class AnalyticsService:
         try:
             # STEP 1: Get data using query function
             top_books = get_top_books_by_borrowings_query(limit)
+            refreshed_at = get_view_refreshed_at('analytics_top_books_by_borrowings')
             
             # STEP 2: Transform each book record into frontend-friendly format
             books_data = []
@@ -96,7 +183,8 @@ class AnalyticsService:
                 'labels': [book['label'] for book in books_data],    # For Chart.js labels
                 'values': [book['borrow_count'] for book in books_data],  # For Chart.js data
                 'total_borrowings': sum(book['borrow_count'] for book in books_data),  # Statistics
-                'metric': 'borrowings'            # Identifies this as borrowing data
+                'metric': 'borrowings',           # Identifies this as borrowing data
+                'refreshed_at': refreshed_at.isoformat() if refreshed_at else None  # Ranking snapshot time
             }
             
         except Exception as e:
@@ -112,6 +200,7 @@ class AnalyticsService:
             }
 
     @staticmethod
+    @cached_analytics('top_books_by_ratings', depends_on=('reviews', 'books'))
     def get_top_books_by_ratings(limit=10):
         """
         Get top books by average ratings.
@@ -126,6 +215,7 @@ class AnalyticsService:
         try:
             # STEP 1: Get data using query function
             top_books = get_top_books_by_ratings_query(limit)
+            refreshed_at = get_view_refreshed_at('analytics_top_books_by_ratings')
 
             # STEP 2: Transform each book record into frontend-friendly format
             books_data = []
@@ -148,7 +238,8 @@ class AnalyticsService:
                 'values': [book['avg_rating'] for book in books_data],  # For Chart.js data (ratings)
                 'total_reviews': sum(book['review_count'] for book in books_data),  # Total review count
                 'avg_rating_overall': round(sum(book['avg_rating'] for book in books_data) / len(books_data), 1) if books_data else 0,  # Average of all averages
-                'metric': 'ratings'               # Identifies this as rating data
+                'metric': 'ratings',              # Identifies this as rating data
+                'refreshed_at': refreshed_at.isoformat() if refreshed_at else None  # Ranking snapshot time
             }
 
         except Exception as e:
@@ -166,6 +257,7 @@ class AnalyticsService:
             }
     
     @staticmethod
+    @cached_analytics('borrowed_per_month', depends_on=('borrowings',))
     def get_borrowed_per_month(year=None):
         """
         Get books borrowed per month for a given year.
@@ -215,4 +307,120 @@ class AnalyticsService:
                 'peak_count': 0,
                 'error': f'Database connection issue: {str(e)}',
                 'note': 'This is mock data - configure PostgreSQL to see real analytics'
-            }
\ No newline at end of file
+            }
+
+
+    @staticmethod
+    @cached_analytics('borrowed_by_category', depends_on=('borrowings', 'books'))
+    def get_borrowed_by_category(start_date=None, end_date=None):
+        """
+        Get borrowings and returns per book category.
+
+        Args:
+            start_date (date, optional): First day counted. Defaults to all history.
+            end_date (date, optional): Last day counted. Defaults to the latest activity.
+
+        Returns:
+            dict: Categories with borrow/return counts and their share of borrowings
+        """
+        try:
+            # STEP 1: Get per-category rows and the overall row in one query
+            rows = get_borrowed_by_category_query(start_date, end_date)
+            totals = next((row for row in rows if row.is_total), None)
+            total_borrowings = int(totals.borrow_count) if totals else 0
+
+            # STEP 2: Transform each category into frontend-friendly format
+            categories = []
+            for row in rows:
+                if row.is_total:
+                    continue
+                borrow_count = int(row.borrow_count)
+                categories.append({
+                    'id': row.id,
+                    'name': row.name or 'Uncategorized',
+                    'borrow_count': borrow_count,
+                    'return_count': int(row.return_count),
+                    'share': round(100 * borrow_count / total_borrowings, 1) if total_borrowings else 0
+                })
+
+            return {
+                'success': True,
+                'categories': categories,
+                'labels': [category['name'] for category in categories],        # For Chart.js labels
+                'values': [category['borrow_count'] for category in categories],  # For Chart.js data
+                'total_borrowings': total_borrowings,
+                'total_returns': int(totals.return_count) if totals else 0,
+                'start_date': start_date.isoformat() if start_date else None,
+                'end_date': end_date.isoformat() if end_date else None,
+                'metric': 'categories'
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'categories': [],
+                'labels': [],
+                'values': [],
+                'total_borrowings': 0,
+                'total_returns': 0,
+                'start_date': start_date.isoformat() if start_date else None,
+                'end_date': end_date.isoformat() if end_date else None,
+                'metric': 'categories'
+            }
+
+    @staticmethod
+    @cached_analytics('borrowed_vs_returned', depends_on=('borrowings',))
+    def get_borrowed_vs_returned(start_date=None, end_date=None):
+        """
+        Get books borrowed vs returned per month, with the current number of
+        outstanding and overdue loans.
+
+        Args:
+            start_date (date, optional): First day counted. Defaults to all history.
+            end_date (date, optional): Last day counted. Defaults to the latest activity.
+
+        Returns:
+            dict: Month labels with borrowed/returned series and totals
+        """
+        try:
+            # STEP 1: Monthly rows plus the overall row, and the open-loan snapshot
+            rows = get_borrowed_vs_returned_query(start_date, end_date)
+            outstanding = get_outstanding_loans_query()
+            totals = next((row for row in rows if row.is_total), None)
+            months = [row for row in rows if not row.is_total]
+
+            # STEP 2: Build the two series for the frontend
+            total_borrowed = int(totals.borrow_count) if totals else 0
+            total_returned = int(totals.return_count) if totals else 0
+            return {
+                'success': True,
+                'labels': [row.month.strftime('%b %Y') for row in months],
+                'borrowed': [int(row.borrow_count) for row in months],
+                'returned': [int(row.return_count) for row in months],
+                'total_borrowed': total_borrowed,
+                'total_returned': total_returned,
+                'return_rate': round(100 * total_returned / total_borrowed, 1) if total_borrowed else 0,
+                'currently_borrowed': int(outstanding.outstanding),
+                'overdue': int(outstanding.overdue),
+                'start_date': start_date.isoformat() if start_date else None,
+                'end_date': end_date.isoformat() if end_date else None,
+                'metric': 'borrowed_vs_returned'
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'labels': [],
+                'borrowed': [],
+                'returned': [],
+                'total_borrowed': 0,
+                'total_returned': 0,
+                'return_rate': 0,
+                'currently_borrowed': 0,
+                'overdue': 0,
+                'start_date': start_date.isoformat() if start_date else None,
+                'end_date': end_date.isoformat() if end_date else None,
+                'metric': 'borrowed_vs_returned'
+            }
@@ -0,0 +1,135 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+# Config refuses to import without these; the tests never touch a database.
+os.environ.setdefault('SECRET_KEY', 'analytics-tests')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import app as app_module  # noqa: E402
+import services  # noqa: E402
+from cache import cache  # noqa: E402
+from config import TestingConfig  # noqa: E402
+
+
+TOKEN = 'invalidate-secret'
+
+
+class Config(TestingConfig):
+    ANALYTICS_CACHE_INVALIDATE_TOKEN = TOKEN
+
+
+def book_row(book_id, borrow_count):
+    return SimpleNamespace(
+        id=book_id, title=f"Book {book_id}", author="Author", cover_image=None, borrow_count=borrow_count,
+    )
+
+
+class AnalyticsAppTests(unittest.TestCase):
+    """
+    Request validation, batch isolation and result caching, with the query
+    layer stubbed out so no PostgreSQL is needed: ``python -m unittest test_app``.
+    """
+
+    def setUp(self):
+        self.app = app_module.create_app(Config)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            cache.clear()
+
+        # Stub the SQL under AnalyticsService, so the cached service wrappers still run.
+        self.top_books = mock.patch.object(
+            services, 'get_top_books_by_borrowings_query', return_value=[book_row(1, 5), book_row(2, 3)],
+        ).start()
+        mock.patch.object(services, 'get_view_refreshed_at', return_value=None).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def top_books_by_borrowings(self):
+        response = self.client.get('/analytics/top-books-by-borrowings?limit=2')
+        return response.status_code, response.get_json()
+
+    def invalidate(self, **kwargs):
+        return self.client.post('/analytics/cache/invalidate', **kwargs)
+
+    def test_batch_rejects_malformed_payloads(self):
+        for payload in ([], "metrics", {'metrics': []}, {'metrics': 'top-books-by-ratings'}):
+            with self.subTest(payload=payload):
+                response = self.client.post('/analytics/batch', json=payload)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.get_json()['success'])
+
+    def test_batch_rejects_unknown_metrics(self):
+        response = self.client.post('/analytics/batch', json={
+            'metrics': [{'metric': 'top-books-by-borrowings'}, {'metric': 'nope'}, 'bare'],
+        })
+        self.assertEqual(response.status_code, 400)
+        body = response.get_json()
+        self.assertIn('nope', body['message'])
+        self.assertIn('top-books-by-borrowings', body['available'])
+        self.top_books.assert_not_called()
+
+    def test_batch_isolates_failing_metrics(self):
+        def broken(year=None):
+            raise RuntimeError("database went away")
+
+        with mock.patch.dict(app_module.BATCH_METRICS, {'borrowed-per-month': (broken, {'year': int})}):
+            response = self.client.post('/analytics/batch', json={'metrics': [
+                {'metric': 'borrowed-per-month', 'year': 2024},
+                {'metric': 'top-books-by-borrowings', 'limit': 2},
+            ]})
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertFalse(body['success'])
+        failed, ok = body['results']
+        self.assertEqual((failed['metric'], failed['success']), ('borrowed-per-month', False))
+        self.assertIn("database went away", failed['data']['error'])
+        self.assertEqual((ok['metric'], ok['success']), ('top-books-by-borrowings', True))
+        self.assertEqual(ok['data']['values'], [5, 3])
+
+    def test_invalidate_requires_the_token(self):
+        for headers in ({}, {'X-Analytics-Token': 'wrong'}):
+            with self.subTest(headers=headers):
+                self.assertEqual(self.invalidate(headers=headers, json={}).status_code, 403)
+        # An unset token disables the hook rather than accepting an empty header.
+        self.app.config['ANALYTICS_CACHE_INVALIDATE_TOKEN'] = ''
+        self.assertEqual(self.invalidate(headers={'X-Analytics-Token': ''}, json={}).status_code, 403)
+
+    def test_invalidate_rejects_malformed_payloads(self):
+        headers = {'X-Analytics-Token': TOKEN}
+        for payload in (['books'], {'namespaces': 'books'}, {'namespaces': [1]}, {'namespaces': ['shelves']}):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.invalidate(headers=headers, json=payload).status_code, 400)
+
+    def test_version_bump_recomputes(self):
+        self.assertEqual(self.top_books_by_borrowings()[0], 200)
+        self.top_books_by_borrowings()
+        self.assertEqual(self.top_books.call_count, 1)
+
+        # Reviews do not feed this metric; borrowings do.
+        headers = {'X-Analytics-Token': TOKEN}
+        self.assertEqual(self.invalidate(headers=headers, json={'namespaces': ['reviews']}).status_code, 200)
+        self.top_books_by_borrowings()
+        self.assertEqual(self.top_books.call_count, 1)
+
+        self.top_books.return_value = [book_row(2, 9)]
+        self.assertEqual(self.invalidate(headers=headers, json={'namespaces': ['borrowings']}).status_code, 200)
+        _, body = self.top_books_by_borrowings()
+        self.assertEqual(self.top_books.call_count, 2)
+        self.assertEqual(body['data']['values'], [9])
+
+    def test_failed_results_are_not_cached(self):
+        self.top_books.side_effect = RuntimeError("database went away")
+        self.assertEqual(self.top_books_by_borrowings()[0], 500)
+        self.assertEqual(self.top_books_by_borrowings()[0], 500)
+        self.assertEqual(self.top_books.call_count, 2)
+
+        self.top_books.side_effect = None
+        status, body = self.top_books_by_borrowings()
+        self.assertEqual((status, body['data']['values']), (200, [5, 3]))
+        self.top_books_by_borrowings()
+        self.assertEqual(self.top_books.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
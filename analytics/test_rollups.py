@@ -0,0 +1,126 @@
+import os
+import unittest
+
+from sqlalchemy import text
+
+
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+
+RAW_BORROWED_PER_MONTH = text("""
+    SELECT EXTRACT(month FROM borrow_date) as month, COUNT(*) as count
+    FROM library_app_borrowrecord
+    WHERE EXTRACT(year FROM borrow_date) = :year
+    GROUP BY EXTRACT(month FROM borrow_date)
+""")
+
+RAW_TOP_BOOKS_BY_BORROWINGS = text("""
+    SELECT b.id, COUNT(br.id) as borrow_count
+    FROM library_app_book b
+    INNER JOIN library_app_borrowrecord br ON b.id = br.book_id
+    GROUP BY b.id
+    ORDER BY borrow_count DESC, b.id
+    LIMIT :limit
+""")
+
+RAW_DAILY_TOTALS = text("""
+    SELECT
+        (SELECT COUNT(*) FROM library_app_borrowrecord) as borrows,
+        (SELECT COUNT(*) FROM library_app_borrowrecord WHERE is_returned AND return_date IS NOT NULL) as returns,
+        (SELECT COALESCE(SUM(fine), 0) FROM library_app_borrowrecord WHERE is_returned AND return_date IS NOT NULL) as fines
+""")
+
+RAW_BY_CATEGORY = text("""
+    SELECT b.category_id as id,
+           COUNT(*) FILTER (WHERE br.borrow_date >= :start AND br.borrow_date < :end) as borrow_count,
+           COUNT(*) FILTER (WHERE br.is_returned AND br.return_date >= :start AND br.return_date < :end) as return_count
+    FROM library_app_borrowrecord br
+    INNER JOIN library_app_book b ON b.id = br.book_id
+    GROUP BY b.category_id
+""")
+
+
+@unittest.skipUnless(DATABASE_URL.startswith('postgresql'), "Rollup parity needs the PostgreSQL analytics database")
+class RollupParityTests(unittest.TestCase):
+    """
+    The rollup-backed queries must give exactly the answers the raw
+    ``library_app_borrowrecord`` table does. Run against a synced analytics
+    database: ``DATABASE_URL=postgresql://... python -m unittest test_rollups``.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault('SECRET_KEY', 'rollup-parity')
+        from app import create_app
+        from models import db
+
+        cls.db = db
+        cls.app = create_app()
+        cls.ctx = cls.app.app_context()
+        cls.ctx.push()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ctx.pop()
+
+    def years(self):
+        rows = self.db.session.execute(text(
+            "SELECT DISTINCT EXTRACT(year FROM borrow_date)::int FROM library_app_borrowrecord"
+        ))
+        return [row[0] for row in rows]
+
+    def test_totals_match_raw_rows(self):
+        raw = self.db.session.execute(RAW_DAILY_TOTALS).one()
+        rollup = self.db.session.execute(text(
+            "SELECT COALESCE(SUM(borrows), 0), COALESCE(SUM(returns), 0), COALESCE(SUM(fines), 0) "
+            "FROM analytics_daily_category_activity"
+        )).one()
+        self.assertEqual(tuple(rollup), tuple(raw))
+
+    def test_borrowed_per_month_matches_raw_rows(self):
+        from services import AnalyticsService
+
+        for year in self.years() + [1999]:
+            raw = {int(row.month): int(row.count) for row in self.db.session.execute(RAW_BORROWED_PER_MONTH, {'year': year})}
+            data = AnalyticsService.get_borrowed_per_month(year)
+            self.assertNotIn('error', data)
+            self.assertEqual(data['values'], [raw.get(month, 0) for month in range(1, 13)], year)
+
+    def test_borrowed_by_category_and_vs_returned_match_raw_rows(self):
+        from datetime import date, timedelta
+        from services import AnalyticsService
+
+        for year in self.years():
+            start, end = date(year, 1, 1), date(year, 12, 31)
+            raw = {
+                row.id: (int(row.borrow_count), int(row.return_count))
+                for row in self.db.session.execute(RAW_BY_CATEGORY, {'start': start, 'end': end + timedelta(days=1)})
+                if row.borrow_count or row.return_count
+            }
+            data = AnalyticsService.get_borrowed_by_category(start, end)
+            self.assertTrue(data['success'], data.get('error'))
+            self.assertEqual({c['id']: (c['borrow_count'], c['return_count']) for c in data['categories']}, raw)
+
+            data = AnalyticsService.get_borrowed_vs_returned(start, end)
+            self.assertTrue(data['success'], data.get('error'))
+            self.assertEqual(
+                (data['total_borrowed'], data['total_returned']),
+                (sum(b for b, _ in raw.values()), sum(r for _, r in raw.values())),
+            )
+
+    def test_book_rollup_matches_raw_rows(self):
+        rollup_ranking = text("""
+            SELECT book_id as id, SUM(borrows) as borrow_count
+            FROM analytics_daily_book_activity
+            GROUP BY book_id
+            HAVING SUM(borrows) >= 1
+            ORDER BY borrow_count DESC, book_id
+            LIMIT :limit
+        """)
+        for limit in (1, 10, 50):
+            raw = [(row.id, int(row.borrow_count)) for row in self.db.session.execute(RAW_TOP_BOOKS_BY_BORROWINGS, {'limit': limit})]
+            rollup = [(row.id, int(row.borrow_count)) for row in self.db.session.execute(rollup_ranking, {'limit': limit})]
+            self.assertEqual(rollup, raw)
+
+
+if __name__ == '__main__':
+    unittest.main()
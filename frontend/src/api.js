@@ -54,4 +54,37 @@ api.interceptors.response.use(
     }
 );
 
+// List endpoints are paginated: each response holds one page and the URLs of the
+// next/previous pages (if any) are in the Link header. getPage fetches a single
+// page and exposes those URLs as next/prev; pass one back as the url to move on.
+// getAll follows every next link, so keep it for lists bounded per user, such
+// as a reader's own borrowings; admin lists page with a "Load more" control.
+const pageLink = (response, rel) => {
+    const link = response.headers?.link || '';
+    const match = link.match(new RegExp(`<([^>]+)>;\\s*rel="${rel}"`));
+    return match ? match[1] : null;
+};
+
+api.getPage = async (url, config = {}) => {
+    // Page links are absolute and already carry the query string.
+    const isLink = /^https?:\/\//.test(url);
+    const response = await api.get(url, isLink ? { ...config, params: undefined } : config);
+    return { ...response, next: pageLink(response, 'next'), prev: pageLink(response, 'prev') };
+};
+
+api.getAll = async (url, config = {}) => {
+    const first = await api.getPage(url, {
+        ...config,
+        params: { page_size: 200, ...(config.params || {}) }
+    });
+    const data = [...first.data];
+    let next = first.next;
+    while (next) {
+        const page = await api.getPage(next, config);
+        data.push(...page.data);
+        next = page.next;
+    }
+    return { ...first, data };
+};
+
 export default api; 
\ No newline at end of file
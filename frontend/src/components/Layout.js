@@ -21,18 +21,23 @@ function Layout() {
     const notifRef = useRef();
     const profileRef = useRef();
 
+    // The badge comes from the maintained counter, not from counting the list.
+    const loadNotifications = () => {
+        api.get('notifications/')
+            .then(res => setNotifications(res.data))
+            .catch(() => setNotifications([]));
+        api.get('notifications/unread-count/')
+            .then(res => setNotifUnread(res.data.unread_count))
+            .catch(() => setNotifUnread(0));
+    };
+
     useEffect(() => {
         const token = localStorage.getItem('token');
         if (token) {
             api.get('profile/')
                 .then(res => setProfile(res.data))
                 .catch(() => setProfile(null));
-            api.get('notifications/')
-                .then(res => {
-                    setNotifications(res.data);
-                    setNotifUnread(res.data.filter(n => !n.is_read).length);
-                })
-                .catch(() => setNotifications([]));
+            loadNotifications();
         } else {
             setProfile(null);
             setNotifications([]);
@@ -48,12 +53,7 @@ function Layout() {
                 api.get('profile/')
                     .then(res => setProfile(res.data))
                     .catch(() => setProfile(null));
-                api.get('notifications/')
-                    .then(res => {
-                        setNotifications(res.data);
-                        setNotifUnread(res.data.filter(n => !n.is_read).length);
-                    })
-                    .catch(() => setNotifications([]));
+                loadNotifications();
             }
         };
 
@@ -61,6 +61,48 @@ function Layout() {
         return () => window.removeEventListener('loginSuccess', handleLoginSuccess);
     }, []);
 
+    // New notifications are pushed over server-sent events while logged in;
+    // EventSource reconnects by itself and resumes from the last event id.
+    // It authenticates with a short-lived stream token; once that expires the
+    // server refuses the reconnect, so fetch a fresh one and open a new stream.
+    useEffect(() => {
+        const token = localStorage.getItem('token');
+        if (!profile || !token || typeof EventSource === 'undefined') return undefined;
+        let source = null;
+        let closed = false;
+        let lastEventId = null;
+
+        const connect = async () => {
+            let streamToken;
+            try {
+                streamToken = (await api.post('notifications/stream/token/')).data.token;
+            } catch (error) {
+                return;
+            }
+            if (closed) return;
+            const params = new URLSearchParams({ token: streamToken });
+            if (lastEventId) params.set('last_event_id', lastEventId);
+            source = new EventSource(`${api.defaults.baseURL}notifications/stream/?${params}`);
+            source.addEventListener('notification', event => {
+                lastEventId = event.lastEventId;
+                const notification = JSON.parse(event.data);
+                setNotifications(previous => (
+                    previous.some(n => n.id === notification.id) ? previous : [notification, ...previous]
+                ));
+                if (!notification.is_read) setNotifUnread(count => count + 1);
+            });
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED && !closed) setTimeout(connect, 5000);
+            };
+        };
+
+        connect();
+        return () => {
+            closed = true;
+            if (source) source.close();
+        };
+    }, [profile]);
+
     useEffect(() => {
         function handleClick(e) {
             if (notifRef.current && !notifRef.current.contains(e.target)) setNotifOpen(false);
@@ -2,8 +2,11 @@ import React, { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
 import api from '../api';
 
+const BOOKS_PER_PAGE = 50;
+
 export default function AdminManageBooks() {
     const [books, setBooks] = useState([]);
+    const [nextUrl, setNextUrl] = useState(null);
     const [categories, setCategories] = useState([]);
     const [editId, setEditId] = useState(null);
     const [editData, setEditData] = useState({});
@@ -15,9 +18,13 @@ export default function AdminManageBooks() {
         fetchCategories();
     }, []);
 
-    const fetchBooks = async () => {
-        const res = await api.get("/admin/books/");
-        setBooks(res.data);
+    // Without a url this (re)loads the first page; with the next link it appends that page.
+    const fetchBooks = async (url = null) => {
+        const res = url
+            ? await api.getPage(url)
+            : await api.getPage("/admin/books/", { params: { page_size: BOOKS_PER_PAGE } });
+        setBooks((loaded) => (url ? [...loaded, ...res.data] : res.data));
+        setNextUrl(res.next);
     };
 
     const fetchCategories = async () => {
@@ -284,6 +291,13 @@ export default function AdminManageBooks() {
                     )}
                 </tbody>
             </table>
+            {nextUrl && (
+                <div className="text-center mb-3">
+                    <button className="btn btn-outline-primary" onClick={() => fetchBooks(nextUrl)}>
+                        Load more
+                    </button>
+                </div>
+            )}
             </div>
         </div>
     );
@@ -1,27 +1,35 @@
 import React, { useEffect, useState } from 'react';
 import api from '../api';
 
+const BORROWINGS_PER_PAGE = 50;
+
 function AdminManageBorrowingsPage() {
     const [borrowings, setBorrowings] = useState([]);
+    const [nextUrl, setNextUrl] = useState(null);
     const [status, setStatus] = useState('');
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
     const [success, setSuccess] = useState('');
     const [fineAmount, setFineAmount] = useState({});
 
-    const fetchBorrowings = () => {
+    // Without a url this (re)loads the first page; with the next link it appends that page.
+    const fetchBorrowings = (url = null) => {
         const token = localStorage.getItem('token');
         if (!token) {
             setError('You must be logged in as admin to manage borrowings.');
             setLoading(false);
             return;
         }
-        setLoading(true);
-        api.get('admin/borrowings/', {
-            params: status ? { status } : {}
-        })
+        if (!url) setLoading(true);
+        const request = url
+            ? api.getPage(url)
+            : api.getPage('admin/borrowings/', {
+                params: { page_size: BORROWINGS_PER_PAGE, ...(status ? { status } : {}) }
+            });
+        request
             .then(res => {
-                setBorrowings(res.data);
+                setBorrowings(loaded => (url ? [...loaded, ...res.data] : res.data));
+                setNextUrl(res.next);
                 setLoading(false);
             })
             .catch(() => {
@@ -52,6 +60,16 @@ function AdminManageBorrowingsPage() {
         }
     };
 
+    const handleRemindAllOverdue = async () => {
+        setError(''); setSuccess('');
+        try {
+            const res = await api.post('admin/borrowings/bulk-action/', { action: 'reminder', status: 'overdue' });
+            setSuccess(`Sent ${res.data.reminders_sent} reminders in ${res.data.elapsed_ms} ms.`);
+        } catch {
+            setError('Could not send reminders.');
+        }
+    };
+
     return (
         <div style={{ height: '100%', display: 'flex', flexDirection: 'column' }}>
             <div style={{ flexShrink: 0, marginBottom: '1rem' }}>
@@ -74,9 +92,17 @@ function AdminManageBorrowingsPage() {
                         </div>
                     </div>
                     <div className="col-md-6 text-end">
+                        <button
+                            className="btn btn-outline-warning btn-sm me-2"
+                            onClick={handleRemindAllOverdue}
+                            title="Send a reminder for every overdue borrowing"
+                        >
+                            <i className="fas fa-bell me-1"></i>
+                            Remind all overdue
+                        </button>
                         <button 
                             className="btn btn-outline-secondary btn-sm"
-                            onClick={fetchBorrowings}
+                            onClick={() => fetchBorrowings()}
                             title="Refresh data"
                         >
                             <i className="fas fa-sync-alt me-1"></i>
@@ -91,7 +117,7 @@ function AdminManageBorrowingsPage() {
                                 <div className="card-body">
                                     <div className="row text-center">
                                         <div className="col-md-3">
-                                            <h6 className="text-muted">Total Borrowings</h6>
+                                            <h6 className="text-muted">Loaded Borrowings</h6>
                                             <h5 className="mb-0">{borrowings.length}</h5>
                                         </div>
                                         <div className="col-md-3">
@@ -200,6 +226,13 @@ function AdminManageBorrowingsPage() {
                             ))}
                         </tbody>
                     </table>
+                    {nextUrl && (
+                        <div className="text-center mb-3">
+                            <button className="btn btn-outline-primary" onClick={() => fetchBorrowings(nextUrl)}>
+                                Load more
+                            </button>
+                        </div>
+                    )}
                 </div>
                 )}
             </div>
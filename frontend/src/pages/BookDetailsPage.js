@@ -72,7 +72,7 @@ function BookDetailsPage() {
 
     const loadReviews = (userId, username) => {
         // Fetch reviews for this specific book
-        api.get(`reviews/?book=${id}`).then(res => {
+        api.getAll(`reviews/?book=${id}`).then(res => {
             console.log('=== REVIEW DEBUGGING ===');
             console.log('Book ID:', id);
             console.log('Current User ID:', userId);
@@ -124,22 +124,10 @@ function BookDetailsPage() {
         })
         .catch(err => {
             console.error('Failed to fetch reviews:', err);
-            // Fallback: get all reviews and filter
-            api.get('reviews/').then(res => {
-                const bookReviews = res.data.filter(r => r.book === parseInt(id));
-                console.log('Fallback: filtered reviews:', bookReviews);
-                setReviews(bookReviews);
-                
-                // Find user's review in fallback data
-                if (userId) {
-                    const existingUserReview = bookReviews.find(review => 
-                        review.user === userId || review.user_name === username
-                    );
-                    setUserReview(existingUserReview || null);
-                } else {
-                    setUserReview(null);
-                }
-            });
+            // Downloading every review to filter them here would not be bounded;
+            // show none rather than fall back to that.
+            setReviews([]);
+            setUserReview(null);
         });
     };
 
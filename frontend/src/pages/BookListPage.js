@@ -9,83 +9,89 @@ function BookListPage() {
     const [categories, setCategories] = useState([]);
     const [selectedCategory, setSelectedCategory] = useState('');
     const [search, setSearch] = useState('');
-    const [currentPage, setCurrentPage] = useState(1);
-    const [totalPages, setTotalPages] = useState(1);
+    const [query, setQuery] = useState('');
+    // One server page at a time: cursor.url is the page link being shown for
+    // the list named by cursor.list (the first page when it is another list);
+    // nextUrl/prevUrl come from the response's Link header.
+    const [cursor, setCursor] = useState({ list: null, url: null, page: 1 });
+    const [nextUrl, setNextUrl] = useState(null);
+    const [prevUrl, setPrevUrl] = useState(null);
     const [loading, setLoading] = useState(true);
     const [borrowMsg, setBorrowMsg] = useState('');
     const navigate = useNavigate();
     const location = useLocation();
+    const typeParam = new URLSearchParams(location.search).get('type'); // 'top-rated' or 'most-popular'
+    const list = `${typeParam}|${selectedCategory}|${query}`;
+    const pageUrl = cursor.list === list ? cursor.url : null;
+    const currentPage = cursor.list === list ? cursor.page : 1;
 
     useEffect(() => {
         // Check for parameters in URL
-        const searchParams = new URLSearchParams(location.search);
-        const categoryParam = searchParams.get('category');
-        const typeParam = searchParams.get('type'); // 'top-rated' or 'most-popular'
-        
+        const categoryParam = new URLSearchParams(location.search).get('category');
         if (categoryParam) {
             setSelectedCategory(categoryParam);
         }
+    }, [location.search]);
 
-        setLoading(true);
-        
-        // Determine which API endpoint to use
-        let booksEndpoint = 'books/';
-        if (typeParam === 'top-rated') {
-            booksEndpoint = 'books/top-rated/';
-        } else if (typeParam === 'most-popular') {
-            booksEndpoint = 'books/most-popular/';
+    useEffect(() => {
+        api.get('categories/')
+            .then(res => setCategories(res.data))
+            .catch(() => setCategories([]));
+    }, []);
+
+    // Only search once the user stops typing
+    useEffect(() => {
+        const timer = setTimeout(() => setQuery(search.trim()), 300);
+        return () => clearTimeout(timer);
+    }, [search]);
+
+    useEffect(() => {
+        // Determine which API endpoint to use. Search results are ranked and
+        // capped by the server, so they come back as a single page.
+        let request;
+        if (query) {
+            request = api.getPage('search/', { params: { search: query } });
+        } else if (pageUrl) {
+            request = api.getPage(pageUrl);
+        } else {
+            let booksEndpoint = 'books/';
+            if (typeParam === 'top-rated') {
+                booksEndpoint = 'books/top-rated/';
+            } else if (typeParam === 'most-popular') {
+                booksEndpoint = 'books/most-popular/';
+            } else if (selectedCategory) {
+                booksEndpoint = `books/category/${selectedCategory}/`;
+            }
+            request = api.getPage(booksEndpoint, { params: { page_size: BOOKS_PER_PAGE } });
         }
-        
-        Promise.all([
-            api.get(booksEndpoint),
-            api.get('categories/')
-        ]).then(([booksRes, catRes]) => {
-            setBooks(booksRes.data);
-            setCategories(catRes.data);
-            // Don't set totalPages here - let it be calculated by the filteredBooks effect
+
+        let cancelled = false;
+        setLoading(true);
+        request.then(res => {
+            if (cancelled) return;
+            setBooks(res.data);
+            setNextUrl(res.next);
+            setPrevUrl(res.prev);
             setLoading(false);
         }).catch(() => {
+            if (cancelled) return;
             setBooks([]);
-            setCategories([]);
-            setTotalPages(1);
+            setNextUrl(null);
+            setPrevUrl(null);
             setLoading(false);
         });
-    }, [location.search]);
+        return () => { cancelled = true; };
+    }, [typeParam, selectedCategory, query, pageUrl]);
 
-    const filteredBooks = books.filter(book => {
-        let match = true;
-        if (selectedCategory) {
-            match = match && book.category === parseInt(selectedCategory);
-        }
-        if (search.trim()) {
-            match = match && (
-                book.title.toLowerCase().includes(search.toLowerCase()) ||
-                book.author.toLowerCase().includes(search.toLowerCase())
-            );
-        }
-        return match;
-    });
+    // The ranking lists and search results are not filtered by category on the
+    // server, so narrow the page that was loaded.
+    const filteredBooks = books.filter(book => (
+        !selectedCategory || book.category === parseInt(selectedCategory)
+    ));
 
-    // Update pagination whenever filtered books change
-    useEffect(() => {
-        const newTotalPages = Math.ceil(filteredBooks.length / BOOKS_PER_PAGE) || 1;
-        setTotalPages(newTotalPages);
-        // Reset to page 1 if current page is beyond the new total
-        if (currentPage > newTotalPages) {
-            setCurrentPage(1);
-        }
-    }, [filteredBooks.length, currentPage]);
-
-    // Also reset page when filters change
-    useEffect(() => {
-        setCurrentPage(1);
-    }, [selectedCategory, search]);
-
-    const paginatedBooks = filteredBooks.slice((currentPage - 1) * BOOKS_PER_PAGE, currentPage * BOOKS_PER_PAGE);
-
-    const handlePageChange = (page) => {
-        if (page >= 1 && page <= totalPages) {
-            setCurrentPage(page);
+    const handlePageChange = (url, step) => {
+        if (url) {
+            setCursor({ list, url, page: currentPage + step });
             window.scrollTo({ top: 0, behavior: 'smooth' });
         }
     };
@@ -99,9 +105,9 @@ function BookListPage() {
             await api.post(`borrow/${bookId}/`);
             setBorrowMsg('Book borrowed successfully!');
             
-            // Refresh books data to update available copies
-            api.get('books/').then(booksRes => {
-                setBooks(booksRes.data);
+            // Refresh only the borrowed book to update its available copies
+            api.get(`books/${bookId}/`).then(bookRes => {
+                setBooks(previous => previous.map(book => (book.id === bookId ? bookRes.data : book)));
             }).catch(err => {
                 console.error('Failed to refresh books data:', err);
             });
@@ -182,17 +188,17 @@ function BookListPage() {
                             {selectedCategory && categories.find(cat => cat.id === parseInt(selectedCategory)) && 
                                 ` in ${categories.find(cat => cat.id === parseInt(selectedCategory)).name}`
                             }
-                            {search && ` matching "${search}"`}
+                            {query && ` matching "${query}"`}
                         </p>
-                        {filteredBooks.length > BOOKS_PER_PAGE && (
+                        {(nextUrl || prevUrl) && (
                             <small className="text-muted">
-                                Page {currentPage} of {totalPages}
+                                Page {currentPage}
                             </small>
                         )}
                     </div>
                     
                     <div className="row row-cols-1 row-cols-md-4 g-4 mb-4">
-                        {paginatedBooks.map(book => (
+                        {filteredBooks.map(book => (
                             <div className="col" key={book.id}>
                                 <div className="card h-100 book-card" onClick={() => navigate(`/books/${book.id}`)} style={{ cursor: 'pointer' }}>
                                     {book.cover_image && <img src={book.cover_image} className="card-img-top"  style={{ height: '320px', objectFit: 'fill' }} fill alt={book.title} />}
@@ -225,22 +231,20 @@ function BookListPage() {
                                 </div>
                             </div>
                         ))}
-                        {paginatedBooks.length === 0 && <div className="text-center text-muted">No books found.</div>}
+                        {filteredBooks.length === 0 && <div className="text-center text-muted">No books found.</div>}
                     </div>
                     {/* Pagination - only show if there are multiple pages */}
-                    {totalPages > 1 && (
+                    {(nextUrl || prevUrl) && (
                         <nav aria-label="Book pagination">
                             <ul className="pagination justify-content-center">
-                                <li className={`page-item${currentPage === 1 ? ' disabled' : ''}`}>
-                                    <button className="page-link" onClick={() => handlePageChange(currentPage - 1)}>&laquo;</button>
+                                <li className={`page-item${prevUrl ? '' : ' disabled'}`}>
+                                    <button className="page-link" onClick={() => handlePageChange(prevUrl, -1)}>&laquo; Previous</button>
+                                </li>
+                                <li className="page-item active">
+                                    <span className="page-link">{currentPage}</span>
                                 </li>
-                                {Array.from({ length: totalPages }, (_, i) => (
-                                    <li key={i + 1} className={`page-item${currentPage === i + 1 ? ' active' : ''}`}>
-                                        <button className="page-link" onClick={() => handlePageChange(i + 1)}>{i + 1}</button>
-                                    </li>
-                                ))}
-                                <li className={`page-item${currentPage === totalPages ? ' disabled' : ''}`}>
-                                    <button className="page-link" onClick={() => handlePageChange(currentPage + 1)}>&raquo;</button>
+                                <li className={`page-item${nextUrl ? '' : ' disabled'}`}>
+                                    <button className="page-link" onClick={() => handlePageChange(nextUrl, 1)}>Next &raquo;</button>
                                 </li>
                             </ul>
                         </nav>
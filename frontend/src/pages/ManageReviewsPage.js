@@ -1,30 +1,39 @@
 import React, { useEffect, useState } from 'react';
 import api from '../api';
 
+const REVIEWS_PER_PAGE = 50;
+
 function ManageReviewsPage() {
     const [reviews, setReviews] = useState([]);
+    const [nextUrl, setNextUrl] = useState(null);
     const [bookQuery, setBookQuery] = useState('');
     const [ratingQuery, setRatingQuery] = useState('');
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
     const [success, setSuccess] = useState('');
 
-    const fetchReviews = () => {
+    // Without a url this (re)loads the first page; with the next link it appends that page.
+    const fetchReviews = (url = null) => {
         const token = localStorage.getItem('token');
         if (!token) {
             setError('You must be logged in as admin to manage reviews.');
             setLoading(false);
             return;
         }
-        setLoading(true);
-        api.get('admin/reviews/', {
-            params: {
-                book: bookQuery,
-                rating: ratingQuery
-            }
-        })
+        if (!url) setLoading(true);
+        const request = url
+            ? api.getPage(url)
+            : api.getPage('admin/reviews/', {
+                params: {
+                    book: bookQuery,
+                    rating: ratingQuery,
+                    page_size: REVIEWS_PER_PAGE
+                }
+            });
+        request
             .then(res => {
-                setReviews(res.data);
+                setReviews(loaded => (url ? [...loaded, ...res.data] : res.data));
+                setNextUrl(res.next);
                 setLoading(false);
             })
             .catch(() => {
@@ -165,6 +174,13 @@ function ManageReviewsPage() {
                             ))}
                         </tbody>
                     </table>
+                    {nextUrl && (
+                        <div className="text-center mb-3">
+                            <button className="btn btn-outline-primary" onClick={() => fetchReviews(nextUrl)}>
+                                Load more
+                            </button>
+                        </div>
+                    )}
                 </div>
                 )}
             </div>
@@ -9,7 +9,7 @@ function MyBorrowingsPage() {
     const [actionMessage, setActionMessage] = useState('');
 
     const fetchRecords = () => {
-        api.get('user_borrowings/')
+        api.getAll('user_borrowings/')
             .then(res => {
                 setRecords(res.data);
                 setLoading(false);
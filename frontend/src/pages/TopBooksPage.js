@@ -29,63 +29,51 @@ function TopBooksPage() {
     const [activeTab, setActiveTab] = useState('borrowings');
     const [limit, setLimit] = useState(10);
 
-    const fetchTopBooksByBorrowings = useCallback(async () => {
+    // Both rankings come from one /analytics/batch request, computed concurrently on the server.
+    const fetchTopBooks = useCallback(async () => {
+        setLoading(true);
+        setError(null);
+
         try {
-            const response = await fetch(`http://127.0.0.1:5001/analytics/top-books-by-borrowings?limit=${limit}`);
+            const response = await fetch('http://127.0.0.1:5001/analytics/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    metrics: [
+                        { metric: 'top-books-by-borrowings', limit },
+                        { metric: 'top-books-by-ratings', limit },
+                    ],
+                }),
+            });
             
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             
             const result = await response.json();
+            const [borrowings, ratings] = result.results;
             
-            if (result.success) {
-                setBorrowingsData(result.data);
+            if (borrowings.success) {
+                setBorrowingsData(borrowings.data);
             } else {
-                setError(result.error || 'Failed to fetch top books by borrowings');
+                setError(borrowings.data.error || 'Failed to fetch top books by borrowings');
             }
-        } catch (err) {
-            console.error('Error fetching borrowings data:', err);
-            setError('Unable to connect to analytics service.');
-        }
-    }, [limit]);
-
-    const fetchTopBooksByRatings = useCallback(async () => {
-        try {
-            const response = await fetch(`http://127.0.0.1:5001/analytics/top-books-by-ratings?limit=${limit}`);
-            
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            
-            const result = await response.json();
-            
-            if (result.success) {
-                setRatingsData(result.data);
+            if (ratings.success) {
+                setRatingsData(ratings.data);
             } else {
-                setError(result.error || 'Failed to fetch top books by ratings');
+                setError(ratings.data.error || 'Failed to fetch top books by ratings');
             }
         } catch (err) {
-            console.error('Error fetching ratings data:', err);
+            console.error('Error fetching top books data:', err);
             setError('Unable to connect to analytics service.');
+        } finally {
+            setLoading(false);
         }
     }, [limit]);
 
     useEffect(() => {
-        const fetchData = async () => {
-            setLoading(true);
-            setError(null);
-            
-            await Promise.all([
-                fetchTopBooksByBorrowings(),
-                fetchTopBooksByRatings()
-            ]);
-            
-            setLoading(false);
-        };
-
-        fetchData();
-    }, [limit, fetchTopBooksByBorrowings, fetchTopBooksByRatings]);
+        fetchTopBooks();
+    }, [fetchTopBooks]);
 
     const handleLimitChange = (event) => {
         setLimit(parseInt(event.target.value));
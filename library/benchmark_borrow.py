@@ -0,0 +1,305 @@
+"""
+Borrow/Return Benchmark
+Drives the borrow/return hot path with concurrent simulated users against a
+throwaway test database and reports latency percentiles, throughput, query
+counts per request and stock invariants as JSON, so runs can be diffed.
+
+Usage:
+    python benchmark_borrow.py                                  # SQLite, defaults
+    python benchmark_borrow.py --users 50 --iterations 40 --output bench.json
+    python benchmark_borrow.py --database postgres --pg-host localhost --pg-user postgres
+
+Exits non-zero when an invariant breaks, any request raises, or the success
+rate drops below --min-success-rate, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+import django
+
+# Setup Django
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library.settings')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the borrow/return API under concurrent load.")
+    parser.add_argument('--users', type=int, default=20, help="Concurrent simulated users (threads).")
+    parser.add_argument('--iterations', type=int, default=25, help="Borrow attempts per user.")
+    parser.add_argument('--books', type=int, default=30, help="Books in the catalog.")
+    parser.add_argument('--copies', type=int, default=3, help="Copies per book; keep low to force contention.")
+    parser.add_argument('--return-probability', type=float, default=0.5, help="Chance a user returns a book right after borrowing it.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', choices=['sqlite', 'postgres'], default='sqlite')
+    parser.add_argument('--pg-host', default=os.environ.get('BENCH_PG_HOST', 'localhost'))
+    parser.add_argument('--pg-port', default=os.environ.get('BENCH_PG_PORT', '5432'))
+    parser.add_argument('--pg-user', default=os.environ.get('BENCH_PG_USER', 'postgres'))
+    parser.add_argument('--pg-password', default=os.environ.get('BENCH_PG_PASSWORD', 'postgres'))
+    parser.add_argument('--pg-name', default=os.environ.get('BENCH_PG_NAME', 'library_bench'))
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+    parser.add_argument('--min-success-rate', type=float, default=0.99,
+                        help="Exit non-zero when fewer requests than this fraction complete without an exception or 5xx.")
+    return parser.parse_args()
+
+
+def configure_database(args):
+    """Point the default database at a disposable benchmark database before Django starts."""
+    from django.conf import settings
+
+    if args.database == 'postgres':
+        settings.DATABASES['default'] = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': args.pg_name,
+            'HOST': args.pg_host,
+            'PORT': args.pg_port,
+            'USER': args.pg_user,
+            'PASSWORD': args.pg_password,
+        }
+    else:
+        # A file (not in-memory) database so threads see each other's writes
+        # and wait on locks instead of failing immediately.
+        bench_file = os.path.join(tempfile.gettempdir(), 'library_bench.sqlite3')
+        settings.DATABASES['default'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': bench_file,
+            'OPTIONS': {'timeout': 30},
+            'TEST': {'NAME': bench_file},
+        }
+
+
+def seed(args):
+    """Create categories, books and token-authenticated users; returns (book ids, user tokens)."""
+    from django.contrib.auth.models import User
+    from rest_framework.authtoken.models import Token
+    from library_app.models import Book, BookCategory
+
+    category = BookCategory.objects.create(name='Benchmark')
+    Book.objects.bulk_create([
+        Book(
+            title=f"Benchmark Book {i}",
+            author=f"Author {i % 7}",
+            category=category,
+            total_copies=args.copies,
+            available_copies=args.copies,
+            isbn=f"{9000000000000 + i}",
+        )
+        for i in range(args.books)
+    ])
+    users = User.objects.bulk_create([User(username=f"bench_user_{i}") for i in range(args.users)])
+    tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+    book_ids = list(Book.objects.values_list('id', flat=True))
+    return book_ids, [(token.user_id, token.key) for token in tokens]
+
+
+class Recorder:
+    """Thread-safe collection of per-endpoint timings, statuses and query counts."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+
+    def timed(self, endpoint, call):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        started = time.perf_counter()
+        try:
+            with CaptureQueriesContext(connection) as captured:
+                response = call()
+        except Exception as e:
+            with self.lock:
+                self.errors[f"{endpoint}: {type(e).__name__}: {e}"] += 1
+            return None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.latencies[endpoint].append(elapsed_ms)
+            self.queries[endpoint].append(len(captured.captured_queries))
+            self.statuses[endpoint][response.status_code] += 1
+        return response
+
+
+def simulate_user(args, user_id, token, book_ids, recorder, start_barrier):
+    from django.db import connection
+    from rest_framework.test import APIClient
+    from library_app.models import BorrowRecord
+
+    rng = random.Random(args.seed + user_id)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+    start_barrier.wait()
+
+    try:
+        for _ in range(args.iterations):
+            recorder.timed('GET /api/books/', lambda: client.get('/api/books/'))
+            term = f"Author {rng.randrange(7)}"
+            recorder.timed('GET /api/search/', lambda: client.get('/api/search/', {'search': term}))
+
+            book_id = rng.choice(book_ids)
+            response = recorder.timed('POST /api/borrow/<id>/', lambda: client.post(f'/api/borrow/{book_id}/'))
+            if response is None or response.status_code != 200:
+                continue
+
+            if rng.random() < args.return_probability:
+                # Harness bookkeeping, outside the timed request.
+                record_id = (
+                    BorrowRecord.objects
+                    .filter(user_id=user_id, book_id=book_id, is_returned=False)
+                    .values_list('id', flat=True)
+                    .first()
+                )
+                if record_id:
+                    recorder.timed('POST /api/return/<id>/', lambda: client.post(f'/api/return/{record_id}/'))
+    finally:
+        connection.close()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index], 3)
+
+
+def check_invariants():
+    from django.db.models import Count, F, Q
+    from library_app.models import Book, BorrowRecord
+
+    books = Book.objects.annotate(
+        active_borrows=Count('borrowrecord', filter=Q(borrowrecord__is_returned=False))
+    )
+    duplicate_active = (
+        BorrowRecord.objects.filter(is_returned=False)
+        .values('user_id', 'book_id')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+        .count()
+    )
+    invariants = {
+        'negative_available_copies': Book.objects.filter(available_copies__lt=0).count(),
+        'available_exceeds_total': Book.objects.filter(available_copies__gt=F('total_copies')).count(),
+        'stock_mismatch': books.exclude(total_copies=F('available_copies') + F('active_borrows')).count(),
+        'active_counter_mismatch': books.exclude(active_borrow_count=F('active_borrows')).count(),
+        'double_active_borrows': duplicate_active,
+    }
+    invariants['ok'] = not any(invariants.values())
+    return invariants
+
+
+def build_report(args, recorder, wall_seconds):
+    from django.db import connection
+
+    endpoints = {}
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        queries = recorder.queries[endpoint]
+        endpoints[endpoint] = {
+            'requests': len(latencies),
+            'requests_per_second': round(len(latencies) / wall_seconds, 2),
+            'status_codes': {str(code): n for code, n in sorted(recorder.statuses[endpoint].items())},
+            'latency_ms': {
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'mean': round(statistics.fmean(latencies), 3),
+                'max': round(max(latencies), 3),
+            },
+            'queries_per_request': {
+                'mean': round(statistics.fmean(queries), 2),
+                'max': max(queries),
+            },
+        }
+
+    total_requests = sum(len(values) for values in recorder.latencies.values())
+    server_errors = sum(
+        n for statuses in recorder.statuses.values() for code, n in statuses.items() if code >= 500
+    )
+    attempted = total_requests + sum(recorder.errors.values())
+    success_rate = round((total_requests - server_errors) / attempted, 4) if attempted else 0.0
+    return {
+        'config': {
+            'database': connection.vendor,
+            'users': args.users,
+            'iterations': args.iterations,
+            'books': args.books,
+            'copies': args.copies,
+            'return_probability': args.return_probability,
+            'seed': args.seed,
+        },
+        'wall_seconds': round(wall_seconds, 3),
+        'total_requests': total_requests,
+        'requests_per_second': round(total_requests / wall_seconds, 2),
+        'success_rate': success_rate,
+        'endpoints': endpoints,
+        'errors': dict(recorder.errors),
+        'invariants': check_invariants(),
+    }
+
+
+def main():
+    args = parse_args()
+    configure_database(args)
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        book_ids, users = seed(args)
+        recorder = Recorder()
+        barrier = threading.Barrier(len(users) + 1)
+        threads = [
+            threading.Thread(target=simulate_user, args=(args, user_id, token, book_ids, recorder, barrier))
+            for user_id, token in users
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - started
+
+        report = build_report(args, recorder, wall_seconds)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(output)
+    return 0 if passed(args, report) else 1
+
+
+def passed(args, report):
+    """A run fails on broken invariants, any request that raised, or too few successful requests."""
+    failures = []
+    if not report['invariants']['ok']:
+        failures.append("stock invariants violated")
+    if report['errors']:
+        failures.append(f"{sum(report['errors'].values())} requests raised")
+    if report['success_rate'] < args.min_success_rate:
+        failures.append(f"success rate {report['success_rate']} below {args.min_success_rate}")
+    for failure in failures:
+        print(f"Benchmark failed: {failure}", file=sys.stderr)
+    return not failures
+
+
+if __name__ == '__main__':
+    sys.exit(main())
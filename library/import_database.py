@@ -18,6 +18,7 @@ django.setup()
 from django.contrib.auth.models import User
 from django.utils import timezone
 from library_app.models import BookCategory, Book, UserProfile, BorrowRecord, Review, Notification
+from library_app.signals import deferred_analytics_sync
 
 def find_export_files():
     """Find the latest export files"""
@@ -380,12 +381,15 @@ def main():
         # Import data in correct order
         print(f"\n🗄️ Starting database import...")
         
-        users = import_users(data['users'])
-        categories = import_categories(data['categories'])
-        books = import_books(data['books'], categories)
-        borrowings = import_borrowings(data['borrowings'], users, books)
-        reviews = import_reviews(data['reviews'], users, books)
-        notifications = import_notifications(data['notifications'], users)
+        # Coalesce the import's analytics sync work into one outbox insert; no
+        # transaction is held across the import, so rows commit as they load
+        with deferred_analytics_sync():
+            users = import_users(data['users'])
+            categories = import_categories(data['categories'])
+            books = import_books(data['books'], categories)
+            borrowings = import_borrowings(data['borrowings'], users, books)
+            reviews = import_reviews(data['reviews'], users, books)
+            notifications = import_notifications(data['notifications'], users)
         
         # Show summary
         show_import_summary()
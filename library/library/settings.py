@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Add CORS middleware (must be first)
+    'library_api.instrumentation.RequestMetricsMiddleware',  # no-op unless REQUEST_METRICS_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +58,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'library_app.signals.AnalyticsSyncBatchMiddleware',
 ]
 
 ROOT_URLCONF = 'library.urls'
@@ -72,9 +74,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                'library_app.context_processors.profile_context',
-                'library_app.context_processors.unread_notifications',
-                'library_app.context_processors.notifications_filter',
+                'library_app.context_processors.user_menu',
             ],
         },
     },
@@ -118,8 +118,13 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Change to AllowAny to allow login/signup
-    ]
+    ],
+    # List endpoints return one page of PAGE_SIZE items (clients may ask for up
+    # to API_MAX_PAGE_SIZE with ?page_size=); further pages are in the Link header.
+    'DEFAULT_PAGINATION_CLASS': 'library_api.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
+API_MAX_PAGE_SIZE = 200
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -148,14 +153,100 @@ import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache backend for the public home page responses. 'locmem' is per process;
+# use 'file' or 'redis' (needs the redis package) when running several workers.
+CACHE_BACKEND = os.environ.get('LIBRARY_CACHE_BACKEND', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'library-responses',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache'),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('LIBRARY_CACHE_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+CACHES = {'default': CACHE_BACKENDS[CACHE_BACKEND]}
+
+# Seconds each cached endpoint stays fresh (0 disables caching for it). Writes
+# to books, reviews, borrowings and categories expire dependent entries early.
+RESPONSE_CACHE_TTLS = {
+    'home_top_rated': 60,
+    'home_most_borrowed': 60,
+    'home_categories_with_books': 300,
+    'home_stats': 30,
+}
+RESPONSE_CACHE_STALE_SECONDS = 300  # stale entries served while one request recomputes
+RESPONSE_CACHE_LOCK_SECONDS = 10
+
+# Unread notifications listed in the navbar menu
+NOTIFICATION_MENU_SIZE = 5
+
+# /api/notifications/stream/ (server-sent events, served under ASGI)
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = 15
+NOTIFICATION_STREAM_RETRY_MS = 5000  # client reconnect delay
+NOTIFICATION_STREAM_TOKEN_MAX_AGE = 300  # seconds a signed ?token= from notifications/stream/token/ is accepted
+
+# Per-route query count / latency metrics, served at /api/admin/metrics/
+REQUEST_METRICS_ENABLED = False
+
+# Book search uses SQLite FTS5 / PostgreSQL tsvector indexes created after
+# migrate (rebuild with `python manage.py rebuild_search_index`).
+BOOK_SEARCH_MAX_RESULTS = 200  # ranked matches returned per query
+
 ENABLE_ANALYTICS_SYNC = True  
 
+# How library changes reach the analytics database:
+#   'outbox'      - post_save signals queue AnalyticsOutbox rows (drain_analytics_outbox)
+#   'incremental' - a scheduled analytics_incremental_sync pulls rows by updated_at watermark
+ANALYTICS_SYNC_MODE = 'outbox'
+ANALYTICS_INCREMENTAL_CHUNK_SIZE = 1000
+# Rows younger than this wait for the next pass. A transaction that commits
+# later than this after stamping updated_at can be missed; analytics_backfill
+# reconciles those.
+ANALYTICS_INCREMENTAL_SETTLE_SECONDS = 2
+
 ANALYTICS_DB_HOST = 'localhost'
 ANALYTICS_DB_PORT = '5432'
 ANALYTICS_DB_NAME = 'analytics_db'
 ANALYTICS_DB_USER = 'postgres'
 ANALYTICS_DB_PASSWORD = 'postgres'
 
+# Connection pool used by the analytics sync handler
+ANALYTICS_DB_POOL_MIN = 1
+ANALYTICS_DB_POOL_MAX = 5
+ANALYTICS_DB_POOL_MAX_IDLE = 300  # seconds before an idle connection is recycled
+ANALYTICS_DB_POOL_HEALTH_CHECK_AFTER = 30  # seconds idle before a SELECT 1 check
+ANALYTICS_DB_POOL_ACQUIRE_TIMEOUT = 10  # seconds to wait for a free connection
+
+# Analytics changes are queued in the AnalyticsOutbox table and shipped by
+# `python manage.py drain_analytics_outbox` (or the in-process worker thread
+# when ANALYTICS_OUTBOX_AUTOSTART is on).
+ANALYTICS_OUTBOX_AUTOSTART = False
+ANALYTICS_OUTBOX_BATCH_SIZE = 500
+ANALYTICS_OUTBOX_POLL_INTERVAL = 5  # seconds
+ANALYTICS_OUTBOX_BACKOFF_BASE = 2  # seconds, doubled per failed attempt
+ANALYTICS_OUTBOX_BACKOFF_MAX = 300  # seconds
+ANALYTICS_OUTBOX_CLAIM_SECONDS = 300  # lease on a claimed batch before another drainer may take it
+ANALYTICS_OUTBOX_MAX_ATTEMPTS = 10  # failures before a row is marked dead (requeue with --requeue-dead)
+
+# After each synced batch, ask the Flask analytics service to drop cached
+# results that read the changed tables. Leave the URL empty to rely on the
+# service's ANALYTICS_CACHE_TIMEOUT alone; the token must match its
+# ANALYTICS_CACHE_INVALIDATE_TOKEN.
+ANALYTICS_CACHE_INVALIDATE_URL = os.environ.get('ANALYTICS_CACHE_INVALIDATE_URL', '')
+ANALYTICS_CACHE_INVALIDATE_TOKEN = os.environ.get('ANALYTICS_CACHE_INVALIDATE_TOKEN', '')
+ANALYTICS_CACHE_INVALIDATE_TIMEOUT = 2  # seconds
+
+# The top-books materialized views are refreshed (CONCURRENTLY) by the sync
+# once this many synced borrowings/reviews are missing from them, and by
+# `python manage.py refresh_analytics_views` on a schedule. 0 leaves it to the command.
+ANALYTICS_VIEW_REFRESH_CHANGES = 500
+
 # CORS Configuration for React Frontend
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -164,6 +255,9 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Pagination links for list endpoints
+CORS_EXPOSE_HEADERS = ['Link']
+
 CORS_ALLOW_ALL_ORIGINS = False  # Set to True only for development
 
 # CORS Headers that are allowed
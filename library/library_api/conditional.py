@@ -0,0 +1,76 @@
+import functools
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from library_app.models import Book, BookCategory
+
+
+def table_version(queryset):
+    """
+    Version of a set of rows: the newest ``updated_at`` plus the row count,
+    so deletes change it too. Both come from indexes.
+    """
+    version = queryset.order_by().aggregate(last_modified=Max('updated_at'), rows=Count('pk'))
+    return version['last_modified'], version['rows']
+
+
+def row_version(queryset, **lookup):
+    """Version of a single row, or None when it does not exist."""
+    last_modified = queryset.filter(**lookup).values_list('updated_at', flat=True).first()
+    return None if last_modified is None else (last_modified,)
+
+
+def conditional_get(get_version):
+    """
+    Answer conditional GETs from a cheap version lookup, before the view
+    queries or serializes anything.
+
+    ``get_version(request, **url_kwargs)`` returns a tuple whose first item
+    is the last-modified datetime, or None when the resource is missing (the
+    view then runs and returns its usual 404). The strong ETag also covers
+    the full path and Accept header, since pages, filters and renderers
+    change the body.
+
+        @conditional_get(lambda request, **kwargs: table_version(Book.objects.all()))
+    """
+    def version(request, *args, **kwargs):
+        if not hasattr(request, '_resource_version'):
+            request._resource_version = get_version(request, **kwargs)
+        return request._resource_version
+
+    def etag(request, *args, **kwargs):
+        current = version(request, *args, **kwargs)
+        if current is None:
+            return None
+        key = repr((request.get_full_path(), request.META.get('HTTP_ACCEPT', ''), current))
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    def last_modified(request, *args, **kwargs):
+        current = version(request, *args, **kwargs)
+        return current[0] if current else None
+
+    def decorator(get):
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(get)
+
+        @functools.wraps(get)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # Let browsers keep the body but revalidate on every request, so
+            # the frontend's repeat fetches become cheap 304s transparently.
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+
+    return method_decorator(decorator, name='get')
+
+
+books_version = conditional_get(lambda request, **kwargs: table_version(Book.objects.all()))
+book_version = conditional_get(lambda request, id, **kwargs: row_version(Book.objects.all(), pk=id))
+categories_version = conditional_get(lambda request, **kwargs: table_version(BookCategory.objects.all()))
+category_books_version = conditional_get(
+    lambda request, category_id, **kwargs: table_version(Book.objects.filter(category_id=category_id))
+)
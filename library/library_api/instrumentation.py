@@ -0,0 +1,222 @@
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # seconds
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = threading.local()
+
+
+class QueryCounter:
+    """``connection.execute_wrapper`` that counts statements and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class count_queries:
+    """
+    Count statements on every configured database for the duration of a block.
+
+        with count_queries() as counter:
+            client.get(url)
+        counter.count
+    """
+
+    def __enter__(self):
+        self.counter = QueryCounter()
+        self._wrappers = [connections[alias].execute_wrapper(self.counter) for alias in connections]
+        for wrapper in self._wrappers:
+            wrapper.__enter__()
+        return self.counter
+
+    def __exit__(self, *exc_info):
+        for wrapper in reversed(self._wrappers):
+            wrapper.__exit__(*exc_info)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.response_bytes = 0
+        self.budget_exceeded = 0
+
+
+class MetricsRegistry:
+    """Per-route aggregates for this process, since startup or the last reset."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = defaultdict(RouteMetrics)
+
+    def record(self, route, seconds, queries, db_seconds, serializer_seconds, response_bytes, over_budget):
+        with self.lock:
+            metrics = self.routes[route]
+            metrics.requests += 1
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(queries)
+            metrics.db_seconds += db_seconds
+            metrics.serializer_seconds += serializer_seconds
+            metrics.response_bytes += response_bytes
+            metrics.budget_exceeded += over_budget
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+    def summary(self):
+        with self.lock:
+            return {
+                route: {
+                    'requests': m.requests,
+                    'mean_ms': round(m.latency.sum / m.requests * 1000, 3),
+                    'mean_queries': round(m.queries.sum / m.requests, 2),
+                    'mean_db_ms': round(m.db_seconds / m.requests * 1000, 3),
+                    'mean_serializer_ms': round(m.serializer_seconds / m.requests * 1000, 3),
+                    'mean_response_bytes': round(m.response_bytes / m.requests),
+                    'budget_exceeded': m.budget_exceeded,
+                }
+                for route, m in sorted(self.routes.items())
+            }
+
+    def prometheus(self):
+        """Render the aggregates in the Prometheus text exposition format."""
+        lines = []
+
+        def histogram(name, help_text, attribute):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for route, m in sorted(self.routes.items()):
+                h = getattr(m, attribute)
+                cumulative = 0
+                for bound, count in zip(h.buckets + ('+Inf',), h.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{route="{route}"}} {h.sum}')
+                lines.append(f'{name}_count{{route="{route}"}} {m.requests}')
+
+        def counter(name, help_text, attribute):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for route, m in sorted(self.routes.items()):
+                lines.append(f'{name}{{route="{route}"}} {getattr(m, attribute)}')
+
+        with self.lock:
+            histogram('library_request_duration_seconds', "Request latency.", 'latency')
+            histogram('library_request_queries', "SQL statements per request.", 'queries')
+            counter('library_request_db_seconds_total', "Time spent in SQL.", 'db_seconds')
+            counter('library_request_serializer_seconds_total', "Time spent building serializer data.", 'serializer_seconds')
+            counter('library_response_bytes_total', "Response body bytes.", 'response_bytes')
+            counter('library_query_budget_exceeded_total', "Requests over their declared query budget.", 'budget_exceeded')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _install_serializer_timer():
+    """
+    Time ``serializer.data`` on the request being measured. Nested serializers
+    go through the same property, so only the outermost call is counted; the
+    time includes any queries the serializer triggers.
+    """
+    base = serializers.BaseSerializer
+    if getattr(base, '_metrics_timed', False):
+        return
+    original = base.data.fget
+
+    def timed_data(self):
+        metrics = getattr(_current, 'metrics', None)
+        if metrics is None or metrics['depth']:
+            return original(self)
+        metrics['depth'] += 1
+        started = time.perf_counter()
+        try:
+            return original(self)
+        finally:
+            metrics['serializer_seconds'] += time.perf_counter() - started
+            metrics['depth'] -= 1
+
+    base.data = property(timed_data)
+    base._metrics_timed = True
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+class RequestMetricsMiddleware:
+    """
+    Opt-in (``REQUEST_METRICS_ENABLED``) per-request instrumentation: query
+    count and DB time via ``connection.execute_wrapper``, serializer time,
+    latency and response size, aggregated per URL name in ``registry`` and
+    served by ``MetricsAPIView``. Requests over the query budget declared in
+    ``library_api.urls.QUERY_BUDGETS`` are logged and counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _install_serializer_timer()
+
+    def __call__(self, request):
+        from .urls import QUERY_BUDGETS
+
+        _current.metrics = {'depth': 0, 'serializer_seconds': 0.0}
+        started = time.perf_counter()
+        try:
+            with count_queries() as queries:
+                response = self.get_response(request)
+        finally:
+            metrics = _current.metrics
+            _current.metrics = None
+        seconds = time.perf_counter() - started
+
+        route = route_name(request)
+        budget = QUERY_BUDGETS.get(route)
+        over_budget = budget is not None and queries.count > budget
+        if over_budget:
+            logger.warning(f"{route} ran {queries.count} queries, over its budget of {budget}")
+        response_bytes = 0 if response.streaming else len(response.content)
+        registry.record(
+            route, seconds, queries.count, queries.seconds,
+            metrics['serializer_seconds'], response_bytes, over_budget,
+        )
+        return response
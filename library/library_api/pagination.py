@@ -0,0 +1,119 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a fixed ordering.
+
+    Views declare ``keyset_ordering``, a tuple of model fields ending in a
+    unique tiebreaker such as ``('-created_at', '-id')``, ideally backed by a
+    matching index. A page is fetched with ``WHERE (ordering) > (cursor)
+    ORDER BY ordering LIMIT n``, so page 1000 costs the same as page 1.
+
+    The response body stays a plain list, as before pagination existed. The
+    next/previous pages are advertised in an RFC 8288 ``Link`` header, so
+    clients that only want the first page need no changes.
+    """
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.model = queryset.model
+        page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        order = [self._flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._seek(order, cursor['values']))
+
+        rows = list(queryset.order_by(*order)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        # Walking backwards, there is always a next page: the one we came from.
+        self.has_next = True if reverse else has_more
+        self.has_previous = has_more if reverse else cursor is not None
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def get_paginated_response(self, data):
+        links = []
+        if self.page and self.has_next:
+            links.append(f'<{self.get_next_link()}>; rel="next"')
+        if self.page and self.has_previous:
+            links.append(f'<{self.get_previous_link()}>; rel="prev"')
+        headers = {'Link': ', '.join(links)} if links else None
+        return Response(data, headers=headers)
+
+    def get_next_link(self):
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        return self._link(self.page[0], reverse=True)
+
+    def _link(self, row, reverse):
+        values = [getattr(row, field.lstrip('-')) for field in self.ordering]
+        # str() keeps full microsecond precision, which the seek comparison needs.
+        payload = json.dumps({'v': values, 'r': reverse}, default=str)
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = payload['v']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            fields = [self.model._meta.get_field(field.lstrip('-')) for field in self.ordering]
+            return {
+                'values': [field.to_python(value) for field, value in zip(fields, values)],
+                'reverse': bool(payload.get('r')),
+            }
+        except (TypeError, KeyError, ValueError, ValidationError) as e:
+            raise NotFound(self.invalid_cursor_message) from e
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _seek(order, values):
+        """Rows strictly after ``values`` in ``order``: (a > x) OR (a = x AND b > y) OR ..."""
+        condition = Q()
+        for i, field in enumerate(order):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[i]})
+            for previous, value in zip(order[:i], values[:i]):
+                clause &= Q(**{previous.lstrip('-'): value})
+            condition |= clause
+        return condition
@@ -106,7 +106,7 @@ class BookAdminSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_borrowed_count(self, obj):
-        return obj.borrowrecord_set.filter(is_returned=False).count()
+        return obj.active_borrow_count
     
     def create(self, validated_data):
         if not validated_data.get('isbn'):
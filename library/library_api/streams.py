@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+from library_app.models import Notification
+from library_app.notification_stream import broker, notification_payload
+
+
+CATCH_UP_LIMIT = 50
+
+STREAM_TOKEN_SALT = 'library_api.notification_stream'
+
+
+def stream_token(user):
+    """
+    A short-lived signed token for ``?token=``. EventSource cannot send
+    headers, and the query string ends up in access and proxy logs, so the
+    stream never accepts the account's API token there.
+    """
+    return signing.TimestampSigner(salt=STREAM_TOKEN_SALT).sign(str(user.pk))
+
+
+async def stream_user(request):
+    """The caller's user: a signed ``?token=`` from ``stream_token`` or the session."""
+    key = request.GET.get('token')
+    if key:
+        try:
+            user_id = signing.TimestampSigner(salt=STREAM_TOKEN_SALT).unsign(
+                key, max_age=getattr(settings, 'NOTIFICATION_STREAM_TOKEN_MAX_AGE', 300),
+            )
+        except signing.BadSignature:
+            return None
+        return await get_user_model().objects.filter(pk=user_id, is_active=True).afirst()
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+async def notifications_since(user_id, last_id):
+    queryset = Notification.objects.filter(user_id=user_id, id__gt=last_id).order_by('id')[:CATCH_UP_LIMIT]
+    return [notification_payload(notification) async for notification in queryset]
+
+
+def sse_event(payload):
+    return f"id: {payload['id']}\nevent: notification\ndata: {json.dumps(payload)}\n\n"
+
+
+async def notification_events(user_id, last_id, long_poll):
+    """
+    Yield new notifications for ``user_id`` after ``last_id`` as SSE events.
+
+    Each heartbeat also re-reads the database, which delivers notifications
+    published by other worker processes or dropped from a full queue. With
+    ``long_poll`` the stream ends as soon as it has sent events, or after one
+    quiet heartbeat, and the client's EventSource reconnects, carrying on from
+    its Last-Event-ID.
+    """
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 15)
+    queue = broker.subscribe(user_id)
+    try:
+        yield f"retry: {getattr(settings, 'NOTIFICATION_STREAM_RETRY_MS', 5000)}\n\n"
+        while True:
+            events = await notifications_since(user_id, last_id)
+            for payload in events:
+                last_id = payload['id']
+                yield sse_event(payload)
+            if long_poll and events:
+                return
+            try:
+                payload = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if long_poll:
+                    return
+                yield ": heartbeat\n\n"
+                continue
+            if payload['id'] > last_id:
+                last_id = payload['id']
+                yield sse_event(payload)
+                if long_poll:
+                    return
+    finally:
+        broker.unsubscribe(user_id, queue)
+
+
+async def notification_stream(request):
+    """
+    Server-sent events carrying the caller's new notifications.
+
+    Needs an ASGI server (``uvicorn library.asgi:application``) to hold the
+    connection open; under WSGI each request degrades to a long poll.
+    """
+    if request.method != 'GET':
+        return HttpResponse(status=405, headers={'Allow': 'GET'})
+    user = await stream_user(request)
+    if user is None:
+        return HttpResponse(status=401)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_event_id)
+    except (TypeError, ValueError):
+        # A fresh connection only wants what arrives from now on.
+        latest = await Notification.objects.filter(user=user).order_by('-id').values_list('id', flat=True).afirst()
+        last_id = latest or 0
+
+    response = StreamingHttpResponse(
+        notification_events(user.pk, last_id, long_poll=not isinstance(request, ASGIRequest)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # keep nginx from buffering the stream
+    return response
@@ -0,0 +1,24 @@
+from django.urls import reverse
+
+from .instrumentation import count_queries
+from .urls import QUERY_BUDGETS
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin that fails when a request runs more SQL statements than
+    the budget declared for its URL name in ``library_api.urls.QUERY_BUDGETS``.
+    """
+
+    def assertWithinQueryBudget(self, url_name, args=None, method='get', client=None, **request_kwargs):
+        budget = QUERY_BUDGETS.get(url_name)
+        if budget is None:
+            self.fail(f"No query budget declared for {url_name!r} in library_api.urls.QUERY_BUDGETS")
+        client = client or self.client
+        with count_queries() as queries:
+            response = getattr(client, method)(reverse(url_name, args=args), **request_kwargs)
+        self.assertLessEqual(
+            queries.count, budget,
+            f"{url_name} ran {queries.count} queries, over its budget of {budget}",
+        )
+        return response
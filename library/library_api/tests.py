@@ -1,3 +1,779 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from library_app.models import Book, BookCategory
+
+from .testing import QueryBudgetMixin
+
+
+@override_settings(RESPONSE_CACHE_TTLS={})
+class CategoriesWithBooksQueryCountTests(TestCase):
+    """The home page category strip must not issue queries per category or per book."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('api_categories_with_books')
+
+    def add_categories(self, count, books_each=6):
+        start = BookCategory.objects.count()
+        for i in range(start, start + count):
+            category = BookCategory.objects.create(name=f"Category {i}")
+            for j in range(books_each):
+                Book.objects.create(
+                    title=f"Book {i}-{j}",
+                    author="Author",
+                    isbn=f"{i:06d}{j:07d}",
+                    category=category,
+                    total_copies=2,
+                    available_copies=2,
+                )
+
+    def test_query_count_is_constant_as_categories_grow(self):
+        self.add_categories(2)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()), 2)
+
+        self.add_categories(8)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()), 10)
+
+    def test_returns_first_four_books_and_totals(self):
+        self.add_categories(1)
+        category = self.client.get(self.url).json()[0]
+        expected = list(
+            Book.objects.filter(category_id=category['id']).order_by('id').values_list('id', flat=True)[:4]
+        )
+        self.assertEqual(category['total_books'], 6)
+        self.assertEqual([book['id'] for book in category['books']], expected)
+
+
+@override_settings(RESPONSE_CACHE_TTLS={})
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every GET endpoint with a declared budget stays within it as data grows."""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from library_app.models import BorrowRecord, Notification, Review, UserProfile
+
+        self.admin = User.objects.create_user(username='admin', password='x')
+        self.reader = User.objects.create_user(username='reader', password='x')
+        for user in (self.admin, self.reader):
+            UserProfile.objects.create(user=user, full_name=user.username, address='-', phone='0')
+
+        self.category = BookCategory.objects.create(name="Fiction")
+        for i in range(12):
+            book = Book.objects.create(
+                title=f"Book {i}", author=f"Author {i}", isbn=f"{i:013d}",
+                category=self.category, total_copies=3, available_copies=3,
+            )
+            BorrowRecord.objects.create(user=self.reader, book=book)
+            Review.objects.create(user=self.reader, book=book, rating=1 + i % 5)
+            Notification.objects.create(user=self.reader, message=f"Note {i}")
+        self.book = book
+
+    def client_for(self, user):
+        from rest_framework.authtoken.models import Token
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.get(user=user).key}")
+        return client
+
+    def test_public_and_user_endpoints(self):
+        client = self.client_for(self.reader)
+        for url_name, args in [
+            ('api_books', None),
+            ('api_book_detail', [self.book.id]),
+            ('api_books_by_category', [self.category.id]),
+            ('api_categories', None),
+            ('api_my_borrowings', None),
+            ('api_borrowings', None),
+            ('api_reviews', None),
+            ('api_notifications', None),
+            ('api_notifications_unread_count', None),
+            ('api_my_profile', None),
+            ('api_top_rated_books', None),
+            ('api_most_borrowed_books', None),
+            ('api_categories_with_books', None),
+            ('api_home_stats', None),
+            ('api_books_top_rated', None),
+            ('api_books_most_popular', None),
+        ]:
+            with self.subTest(url_name=url_name):
+                response = self.assertWithinQueryBudget(url_name, args, client=client)
+                self.assertEqual(response.status_code, 200)
+
+        response = self.assertWithinQueryBudget('api_search_books', client=client, data={'search': 'book'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_endpoints(self):
+        client = self.client_for(self.admin)
+        for url_name in ['api_admin_dashboard', 'api_admin_reviews', 'api_admin_borrowings', 'admin-books-list']:
+            with self.subTest(url_name=url_name):
+                response = self.assertWithinQueryBudget(url_name, client=client)
+                self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ENABLE_ANALYTICS_SYNC=False)
+class BulkBorrowingActionTests(QueryBudgetMixin, TestCase):
+    """Bulk reminders and fines cost the same handful of queries for 5 or 500 loans."""
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.contrib.auth.models import User
+        from django.utils import timezone
+        from rest_framework.authtoken.models import Token
+        from library_app.models import BorrowRecord, UserProfile
+
+        self.admin = User.objects.create_user(username='admin', password='x')
+        readers = [User.objects.create_user(username=f'reader{i}', password='x') for i in range(5)]
+        for user in [self.admin] + readers:
+            UserProfile.objects.create(user=user, full_name=user.username, address='-', phone='0')
+        category = BookCategory.objects.create(name="Fiction")
+        books = Book.objects.bulk_create([
+            Book(title=f"Book {i}", author="Author", isbn=f"{i:013d}", category=category,
+                 total_copies=5, available_copies=5)
+            for i in range(100)
+        ])
+        past_due = timezone.now() - timedelta(days=3)
+        BorrowRecord.objects.bulk_create([
+            BorrowRecord(user=user, book=book, due_date=past_due) for user in readers for book in books
+        ])
+        self.ids = list(BorrowRecord.objects.order_by('id').values_list('id', flat=True))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.get(user=self.admin).key}")
+
+    def post(self, **data):
+        return self.assertWithinQueryBudget(
+            'api_admin_borrowing_bulk_action', method='post', data=data, format='json',
+        )
+
+    def test_reminders(self):
+        from library_app.models import Notification, UserProfile
+
+        self.assertEqual(self.post(action='reminder', borrow_ids=self.ids[:5]).data['reminders_sent'], 5)
+        self.assertEqual(self.post(action='reminder', status='overdue').data['reminders_sent'], 500)
+        self.assertEqual(Notification.objects.count(), 505)
+        self.assertEqual(sum(UserProfile.objects.values_list('unread_notifications', flat=True)), 505)
+
+    def test_fines(self):
+        from library_app.models import BorrowRecord
+
+        response = self.post(action='fine', status='overdue', fine_amount='25.5')
+        self.assertEqual(response.data['fines_updated'], 500)
+        self.assertEqual(BorrowRecord.objects.filter(fine=Decimal('25.50')).count(), 500)
+
+        response = self.post(action='fine', borrow_ids=self.ids[:3], fine_amount=-1)
+        self.assertEqual(response.status_code, 400)
+        for amount in ('NaN', 'sNaN', 'Infinity', 'abc'):
+            with self.subTest(fine_amount=amount):
+                response = self.post(action='fine', borrow_ids=self.ids[:3], fine_amount=amount)
+                self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ENABLE_ANALYTICS_SYNC=False, NOTIFICATION_STREAM_HEARTBEAT_SECONDS=5)
+class NotificationStreamTests(QueryBudgetMixin, TestCase):
+    """The stream accepts only signed stream tokens, and a WSGI long poll ends once it has sent events."""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from rest_framework.authtoken.models import Token
+        from library_app.models import UserProfile
+
+        self.user = User.objects.create_user(username='reader', password='x')
+        UserProfile.objects.create(user=self.user, full_name='Reader', address='-', phone='0')
+        self.api_token = Token.objects.get(user=self.user).key
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.api_token}")
+
+    def stream(self, token, **params):
+        return self.client_class().get(reverse('api_notifications_stream'), {'token': token, **params})
+
+    def test_stream_token(self):
+        response = self.assertWithinQueryBudget('api_notifications_stream_token', method='post')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.stream(response.data['token']).status_code, 200)
+        self.assertEqual(self.stream(self.api_token).status_code, 401)
+        with override_settings(NOTIFICATION_STREAM_TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.stream(response.data['token']).status_code, 401)
+
+    def test_long_poll_returns_pending_events_without_waiting(self):
+        import time
+        from library_app.models import Notification
+
+        token = self.client.post(reverse('api_notifications_stream_token')).data['token']
+        first = Notification.objects.create(user=self.user, message="Due soon")
+        Notification.objects.create(user=self.user, message="Overdue")
+
+        started = time.monotonic()
+        response = self.stream(token, last_event_id=first.id - 1)
+        body = b''.join(response).decode()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(body.count('event: notification'), 2)
+
+
+@override_settings(ENABLE_ANALYTICS_SYNC=True, ANALYTICS_SYNC_MODE='outbox', ANALYTICS_OUTBOX_MAX_ATTEMPTS=2)
+class OutboxDrainerTests(TestCase):
+    """A failing row is isolated from its batch and marked dead after the attempt cap."""
+
+    class Handler:
+        def __init__(self, bad_id):
+            self.bad_id = bad_id
+            self.shipped = []
+
+        def ensure_tables_exist(self):
+            pass
+
+        def sync_instances(self, instances):
+            books = instances.get('book', [])
+            if any(book.pk == self.bad_id for book in books):
+                raise ValueError("bad row")
+            self.shipped.extend(book.pk for book in books)
+
+    def test_bad_row_is_isolated_then_dead(self):
+        from library_app.models import AnalyticsOutbox
+        from library_app.outbox import OutboxDrainer
+
+        category = BookCategory.objects.create(name="Fiction")
+        AnalyticsOutbox.objects.all().delete()
+        books = [
+            Book.objects.create(title=f"Book {i}", author="A", isbn=f"{i:013d}", category=category,
+                                total_copies=1, available_copies=1)
+            for i in range(4)
+        ]
+        handler = self.Handler(bad_id=books[1].pk)
+        drainer = OutboxDrainer(handler=handler)
+
+        self.assertEqual(drainer.drain_once(), 3)
+        self.assertEqual(sorted(handler.shipped), sorted(b.pk for b in books if b.pk != books[1].pk))
+        bad = AnalyticsOutbox.objects.get()
+        self.assertEqual((bad.object_id, bad.attempts, bad.dead_at), (books[1].pk, 1, None))
+
+        # Claimed or backing off, the row is not due again until its time comes.
+        self.assertEqual(drainer.claim(), [])
+        AnalyticsOutbox.objects.update(next_attempt_at=bad.created_at)
+        self.assertEqual(drainer.drain_once(), 0)
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, 2)
+        self.assertIsNotNone(bad.dead_at)
+
+        AnalyticsOutbox.objects.update(next_attempt_at=bad.created_at)
+        self.assertEqual(drainer.claim(), [])
+
+
+@override_settings(ENABLE_ANALYTICS_SYNC=False)
+class DenormalizedCounterTests(TestCase):
+    """Book rating aggregates and unread notification counters track every kind of change."""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from library_app.models import UserProfile
+
+        self.users = [User.objects.create_user(username=f'reader{i}', password='x') for i in range(2)]
+        for user in self.users:
+            UserProfile.objects.create(user=user, full_name=user.username, address='-', phone='0')
+        category = BookCategory.objects.create(name="Fiction")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", author="A", isbn=f"{i:013d}", category=category,
+                                total_copies=1, available_copies=1)
+            for i in range(2)
+        ]
+
+    def assertRatings(self, *expected):
+        """``expected`` holds (rating_sum, rating_count) per book, checked against a recount too."""
+        from library_app.services import recount_book_rating
+
+        for book, (rating_sum, rating_count) in zip(self.books, expected):
+            book.refresh_from_db()
+            self.assertEqual((book.rating_sum, book.rating_count), (rating_sum, rating_count), book.title)
+            self.assertEqual(book.rating_average, rating_sum / rating_count if rating_count else None)
+        self.assertEqual(recount_book_rating(), 0)
+
+    def assertUnread(self, *expected):
+        from library_app.models import UserProfile
+        from library_app.services import recount_unread_notifications
+
+        for user, unread in zip(self.users, expected):
+            self.assertEqual(UserProfile.objects.get(user=user).unread_notifications, unread, user.username)
+        self.assertEqual(recount_unread_notifications(), 0)
+
+    def test_book_rating_aggregates(self):
+        from library_app.models import Review
+
+        first = Review.objects.create(user=self.users[0], book=self.books[0], rating=4)
+        Review.objects.create(user=self.users[1], book=self.books[0], rating=2)
+        self.assertRatings((6, 2), (0, 0))
+
+        first.rating = 5
+        first.save()
+        self.assertRatings((7, 2), (0, 0))
+
+        first.book = self.books[1]
+        first.save()
+        self.assertRatings((2, 1), (5, 1))
+
+        first.delete()
+        self.assertRatings((2, 1), (0, 0))
+
+    def test_book_rating_aggregates_with_deferred_fields(self):
+        from library_app.models import Review
+
+        review = Review.objects.create(user=self.users[0], book=self.books[0], rating=4)
+
+        deferred = Review.objects.only('id', 'content').get(pk=review.pk)
+        deferred.content = "Edited"
+        deferred.save()
+        self.assertRatings((4, 1), (0, 0))
+
+        deferred = Review.objects.only('id', 'book').get(pk=review.pk)
+        deferred.book = self.books[1]
+        deferred.save()
+        self.assertRatings((0, 0), (4, 1))
+
+        Review.objects.defer('rating').get(pk=review.pk).delete()
+        self.assertRatings((0, 0), (0, 0))
+
+        Review.objects.create(user=self.users[0], book=self.books[0], rating=3)
+        Review.objects.only('id', 'book').filter(book=self.books[0]).delete()
+        self.assertRatings((0, 0), (0, 0))
+
+    def test_migrate_backfills_counters_it_just_added(self):
+        from django.db import migrations, models
+        from library_app.models import BorrowRecord, Notification, Review, UserProfile
+        from library_app.services import backfill_counters
+
+        Review.objects.create(user=self.users[0], book=self.books[0], rating=4)
+        BorrowRecord.objects.create(user=self.users[0], book=self.books[0])
+        Notification.objects.create(user=self.users[1], message="One")
+        # What a column added by migrate looks like on existing rows.
+        Book.objects.update(rating_sum=0, rating_count=0, rating_average=None, borrow_count=0)
+        UserProfile.objects.update(unread_notifications=0)
+
+        unrelated = migrations.Migration('0099_unrelated', 'library_app')
+        unrelated.operations = [migrations.AddField('book', 'subtitle', models.CharField(max_length=10, default=''))]
+        backfill_counters(sender=None, plan=[(unrelated, False)], verbosity=0)
+        self.books[0].refresh_from_db()
+        self.assertEqual((self.books[0].rating_count, self.books[0].borrow_count), (0, 0))
+
+        added = migrations.Migration('0099_counters', 'library_app')
+        added.operations = [
+            migrations.AddField('book', 'rating_count', models.PositiveIntegerField(default=0)),
+            migrations.AddField('book', 'borrow_count', models.PositiveIntegerField(default=0)),
+            migrations.AddField('userprofile', 'unread_notifications', models.PositiveIntegerField(default=0)),
+        ]
+        backfill_counters(sender=None, plan=[(added, False)], verbosity=0)
+        self.books[0].refresh_from_db()
+        self.assertEqual(self.books[0].borrow_count, 1)
+        self.assertUnread(0, 1)
+        self.assertRatings((4, 1), (0, 0))
+
+    def test_unread_notification_counters(self):
+        from library_app.models import Notification
+
+        first = Notification.objects.create(user=self.users[0], message="One")
+        Notification.objects.create(user=self.users[0], message="Two", is_read=True)
+        self.assertUnread(1, 0)
+
+        first.is_read = True
+        first.save()
+        self.assertUnread(0, 0)
+
+        first.is_read = False
+        first.user = self.users[1]
+        first.save()
+        self.assertUnread(0, 1)
+
+        deferred = Notification.objects.only('id', 'user').get(pk=first.pk)
+        deferred.user = self.users[0]
+        deferred.save()
+        self.assertUnread(1, 0)
+
+        first.refresh_from_db()
+        first.delete()
+        Notification.objects.defer('is_read').filter(user=self.users[0]).delete()
+        self.assertUnread(0, 0)
+
+
+@override_settings(ENABLE_ANALYTICS_SYNC=False)
+class BorrowServiceTests(TestCase):
+    """Borrowing and returning keep stock, counters and fines consistent, including on refusal."""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from library_app.models import UserProfile
+
+        self.users = [User.objects.create_user(username=f'reader{i}', password='x') for i in range(2)]
+        for user in self.users:
+            UserProfile.objects.create(user=user, full_name=user.username, address='-', phone='0')
+        self.category = BookCategory.objects.create(name="Fiction")
+
+    def make_book(self, copies):
+        return Book.objects.create(title="Book", author="A", isbn="0000000000001", category=self.category,
+                                   total_copies=copies, available_copies=copies)
+
+    def assertStock(self, book, available, active):
+        book.refresh_from_db()
+        self.assertEqual((book.available_copies, book.active_borrow_count), (available, active))
+
+    def test_last_copy_is_not_oversold(self):
+        from library_app.models import BorrowRecord
+        from library_app.services import BorrowError, borrow_book
+
+        book = self.make_book(copies=1)
+        borrow_book(self.users[0], book.pk)
+        with self.assertRaisesMessage(BorrowError, "No copies available"):
+            borrow_book(self.users[1], book.pk)
+        self.assertStock(book, available=0, active=1)
+        self.assertEqual(BorrowRecord.objects.filter(book=book).count(), 1)
+
+    def test_second_active_borrow_is_rejected_and_rolled_back(self):
+        from library_app.models import BorrowRecord
+        from library_app.services import BorrowError, borrow_book
+
+        # Copies remain, so the copy is taken before the unique_active_borrow
+        # constraint refuses the second record; both must be undone.
+        book = self.make_book(copies=3)
+        borrow_book(self.users[0], book.pk)
+        with self.assertRaisesMessage(BorrowError, "already borrowed"):
+            borrow_book(self.users[0], book.pk)
+        self.assertStock(book, available=2, active=1)
+        book.refresh_from_db()
+        self.assertEqual(book.borrow_count, 1)
+        self.assertEqual(BorrowRecord.objects.filter(book=book).count(), 1)
+
+    def test_double_return_is_rejected(self):
+        from library_app.services import BorrowError, borrow_book, return_book
+
+        book = self.make_book(copies=2)
+        record = borrow_book(self.users[0], book.pk)
+        return_book(record)
+        with self.assertRaisesMessage(BorrowError, "Already returned"):
+            return_book(record)
+        self.assertStock(book, available=2, active=0)
+
+    def test_fine_is_recorded_at_return(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from library_app.models import BorrowRecord, Notification
+        from library_app.services import borrow_book, return_book
+
+        book = self.make_book(copies=1)
+        on_time = return_book(borrow_book(self.users[0], book.pk))
+        self.assertEqual(on_time.fine, Decimal('0.00'))
+
+        record = borrow_book(self.users[1], book.pk)
+        BorrowRecord.objects.filter(pk=record.pk).update(due_date=timezone.now() - timedelta(days=3, hours=1))
+        record.refresh_from_db()
+        return_book(record)
+        record.refresh_from_db()
+        self.assertTrue(record.is_returned)
+        self.assertEqual(record.fine, BorrowRecord.DEFAULT_FINE_PER_DAY * 3)
+        self.assertEqual(Notification.objects.filter(user=self.users[1]).count(), 1)
+        self.assertFalse(Notification.objects.filter(user=self.users[0]).exists())
+
+
+@override_settings(RESPONSE_CACHE_TTLS={})
+class KeysetPaginationTests(TestCase):
+    """Cursor pages advertise their neighbours, reject forged cursors and never skip or repeat a row."""
+
+    def setUp(self):
+        category = BookCategory.objects.create(name="Fiction")
+        # Heavy ties on the leading sort key; only the id tiebreaker orders them.
+        Book.objects.bulk_create([
+            Book(title=f"Book {i}", author="A", isbn=f"{i:013d}", category=category,
+                 total_copies=1, available_copies=1, borrow_count=1 + i % 3)
+            for i in range(10)
+        ])
+        self.client = APIClient()
+
+    def links(self, response):
+        import re
+        return {rel: url for url, rel in re.findall(r'<([^>]+)>; rel="(\w+)"', response.get('Link', ''))}
+
+    def test_walks_forward_and_back_through_ties(self):
+        expected = list(Book.objects.order_by('-borrow_count', 'id').values_list('id', flat=True))
+        response = self.client.get(reverse('api_books_most_popular'), {'page_size': 3})
+        self.assertNotIn('prev', self.links(response))
+
+        pages = [[book['id'] for book in response.json()]]
+        while 'next' in self.links(response):
+            response = self.client.get(self.links(response)['next'])
+            pages.append([book['id'] for book in response.json()])
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+        for page in reversed(pages[:-1]):
+            response = self.client.get(self.links(response)['prev'])
+            self.assertEqual([book['id'] for book in response.json()], page)
+            self.assertIn('next', self.links(response))
+        self.assertNotIn('prev', self.links(response))
+
+    def test_tampered_cursor_is_not_found(self):
+        import base64
+        url = reverse('api_books_most_popular')
+        wrong_arity = base64.urlsafe_b64encode(b'{"v": [1], "r": false}').decode()
+        wrong_type = base64.urlsafe_b64encode(b'{"v": ["many", 1], "r": false}').decode()
+        for cursor in ('not-base64!', wrong_arity, wrong_type):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404)
+
+    def test_page_size_is_clamped(self):
+        from django.conf import settings
+        from library_api.pagination import KeysetPagination
+
+        self.assertEqual(KeysetPagination.max_page_size, settings.API_MAX_PAGE_SIZE)
+        url = reverse('api_books_most_popular')
+        with mock.patch.object(KeysetPagination, 'max_page_size', 4):
+            response = self.client.get(url, {'page_size': 1000})
+            self.assertEqual(len(response.json()), 4)
+            self.assertIn('next', self.links(response))
+            self.assertEqual(len(self.client.get(url, {'page_size': 0}).json()), 1)
+
+
+@override_settings(ENABLE_ANALYTICS_SYNC=True, ANALYTICS_SYNC_MODE='incremental', ANALYTICS_INCREMENTAL_SETTLE_SECONDS=0)
+class IncrementalUserSyncTests(TestCase):
+    """The incremental pull sees new users with or without a profile, and User-only edits."""
+
+    class Handler:
+        def __init__(self):
+            self.shipped = []
+
+        def ensure_tables_exist(self):
+            pass
+
+        def sync_instances(self, batch):
+            self.shipped += [obj.pk for obj in batch.get('user', [])]
+
+    def test_users_and_user_only_edits(self):
+        from django.contrib.auth.models import User
+        from library_app.incremental_sync import IncrementalSync
+        from library_app.models import UserProfile
+
+        handler = self.Handler()
+        sync = IncrementalSync(handler=handler)
+        bare = User.objects.create_user(username='bare', password='x')
+        reader = User.objects.create_user(username='reader', password='x')
+        UserProfile.objects.create(user=reader, full_name='Reader', address='-', phone='0')
+        self.assertEqual(sync.sync_table('user')['rows'], 2)
+        self.assertEqual(sorted(handler.shipped), [bare.pk, reader.pk])
+
+        handler.shipped.clear()
+        reader.email = 'reader@example.com'
+        reader.save()
+        sync.sync_table('user')
+        self.assertEqual(handler.shipped, [reader.pk])
+
+
+@override_settings(ENABLE_ANALYTICS_SYNC=False, RESPONSE_CACHE_TTLS={})
+class ConditionalGetTests(TestCase):
+    """Catalog reads revalidate against updated_at; writes that skip it are not seen."""
+
+    def setUp(self):
+        category = BookCategory.objects.create(name="Fiction")
+        self.book = Book.objects.create(title="Book", author="A", isbn="0000000000001", category=category,
+                                        total_copies=1, available_copies=1)
+        self.client = APIClient()
+        self.urls = [reverse('api_books'), reverse('api_book_detail', args=[self.book.pk])]
+
+    def test_matching_etag_is_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                with self.assertNumQueries(1):
+                    again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(again.status_code, 304)
+
+    def test_unchanged_since_last_modified_is_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                again = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(again.status_code, 304)
+
+    def test_save_changes_the_etag(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        self.book.title = "Renamed"
+        self.book.save()
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                self.assertIn("Renamed", response.content.decode())
+
+    def test_update_without_updated_at_stays_stale(self):
+        # Documented limitation: the version is updated_at, so an update()
+        # that does not set it is invisible until the next stamped write.
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Book.objects.filter(pk=self.book.pk).update(title="Renamed")
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+@override_settings(ENABLE_ANALYTICS_SYNC=False)
+class OverdueFineJobTests(TestCase):
+    """The nightly fines job charges per whole day, caps, is idempotent per day and covers every chunk."""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.utils import timezone
+        from library_app.models import UserProfile
+
+        self.user = User.objects.create_user(username='reader', password='x')
+        UserProfile.objects.create(user=self.user, full_name='Reader', address='-', phone='0')
+        self.category = BookCategory.objects.create(name="Fiction")
+        self.now = timezone.now()
+
+    def loan(self, overdue, **extra):
+        from library_app.models import BorrowRecord
+
+        book = Book.objects.create(title="Book", author="A", isbn=f"{Book.objects.count():013d}",
+                                   category=self.category, total_copies=1, available_copies=0)
+        return BorrowRecord.objects.create(user=self.user, book=book, due_date=self.now - overdue, **extra)
+
+    def fines(self, records):
+        from library_app.models import BorrowRecord
+        return [BorrowRecord.objects.get(pk=record.pk).fine for record in records]
+
+    def test_accrues_per_whole_day_and_caps(self):
+        from datetime import timedelta
+        from library_app.fines import MAX_FINE, assess_overdue_fines
+
+        records = [
+            self.loan(timedelta(hours=12)),
+            self.loan(timedelta(days=1, hours=1)),
+            self.loan(timedelta(days=3, hours=23)),
+            self.loan(timedelta(days=10000)),
+        ]
+        summary = assess_overdue_fines(now=self.now)
+        self.assertEqual(summary['loans'], 3)
+        self.assertEqual(self.fines(records), [Decimal('0.00'), Decimal('10.00'), Decimal('30.00'), MAX_FINE])
+
+    def test_same_day_rerun_changes_nothing_and_reminds_once(self):
+        from datetime import timedelta
+        from library_app.fines import assess_overdue_fines
+        from library_app.models import Notification, UserProfile
+
+        records = [self.loan(timedelta(days=2, hours=1)), self.loan(timedelta(days=5, hours=1))]
+        self.assertEqual(assess_overdue_fines(now=self.now)['reminders'], 2)
+        rerun = assess_overdue_fines(now=self.now + timedelta(hours=1))
+        self.assertEqual((rerun['loans'], rerun['reminders']), (0, 0))
+        self.assertEqual(self.fines(records), [Decimal('20.00'), Decimal('50.00')])
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(UserProfile.objects.get(user=self.user).unread_notifications, 2)
+
+        next_day = assess_overdue_fines(now=self.now + timedelta(days=1))
+        self.assertEqual((next_day['loans'], next_day['reminders']), (2, 2))
+        self.assertEqual(next_day['total_increase'], Decimal('20.00'))
+        self.assertEqual(self.fines(records), [Decimal('30.00'), Decimal('60.00')])
+
+    def test_keyset_chunks_cover_every_overdue_loan(self):
+        from datetime import timedelta
+        from library_app.fines import assess_overdue_fines
+        from library_app.models import BorrowRecord
+
+        # Several loans share a due_date, so chunk boundaries fall inside ties.
+        records = [self.loan(timedelta(days=2 + i // 3, hours=1)) for i in range(7)]
+        summary = assess_overdue_fines(now=self.now, batch_size=2)
+        self.assertEqual(summary['loans'], 7)
+        self.assertEqual(summary['reminders'], 7)
+        self.assertFalse(BorrowRecord.objects.filter(pk__in=[r.pk for r in records], fine=0).exists())
+        self.assertEqual(assess_overdue_fines(now=self.now, batch_size=2)['loans'], 0)
+
+
+@override_settings(ENABLE_ANALYTICS_SYNC=False, RESPONSE_CACHE_TTLS={'home_stats': 60})
+class ResponseCacheTests(TestCase):
+    """Cached home endpoints expire on writes and serve the stale copy while one request refreshes."""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.category = BookCategory.objects.create(name="Fiction")
+        self.client = APIClient()
+
+    def test_write_bumps_version_and_next_get_misses(self):
+        url = reverse('api_home_stats')
+        self.assertEqual(self.client.get(url).json()['total_books'], 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()['total_books'], 0)
+
+        # The bump waits for the write's transaction to commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title="Book", author="A", isbn="0000000000001", category=self.category,
+                                total_copies=1, available_copies=1)
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.get(url).json()['total_books'], 1)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        from django.core.cache import cache
+        from library_app.response_cache import LOCK_KEY, bump_cache_version, get_or_compute
+
+        self.assertEqual(get_or_compute('stats', lambda: 'old', 60, ('books',)), 'old')
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_cache_version('books')
+
+        # Another request already holds the refresh lock.
+        cache.add(LOCK_KEY.format('stats'), 1)
+        self.assertEqual(get_or_compute('stats', lambda: self.fail("recomputed twice"), 60, ('books',)), 'old')
+
+        cache.delete(LOCK_KEY.format('stats'))
+        self.assertEqual(get_or_compute('stats', lambda: 'new', 60, ('books',)), 'new')
+        self.assertEqual(get_or_compute('stats', lambda: self.fail("entry not stored"), 60, ('books',)), 'new')
+
+
+@override_settings(ENABLE_ANALYTICS_SYNC=False, RESPONSE_CACHE_TTLS={})
+class BookSearchTests(TestCase):
+    """Indexed book search matches word prefixes, ranks title hits first and degrades safely."""
+
+    def setUp(self):
+        category = BookCategory.objects.create(name="Fiction")
+        for i, (title, author) in enumerate([
+            ("Harry Potter", "J. K. Rowling"),
+            ("The Potter's Field", "Ellis Peters"),
+            ("Dune", "Frank Herbert"),
+            ("Emma", "Harriet Potter"),
+        ]):
+            Book.objects.create(title=title, author=author, isbn=f"{i:013d}", category=category,
+                                total_copies=1, available_copies=1)
+        self.client = APIClient()
+        self.url = reverse('api_search_books')
+
+    def titles(self, term):
+        response = self.client.get(self.url, {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [book['title'] for book in response.json()]
+
+    def test_prefixes_of_every_token_match(self):
+        self.assertEqual(self.titles("harr pot")[0], "Harry Potter")
+        self.assertCountEqual(self.titles("harr pot"), ["Harry Potter", "Emma"])
+        self.assertEqual(self.titles("dun"), ["Dune"])
+        self.assertEqual(self.titles("dune zzz"), [])
+
+    def test_title_matches_rank_above_author_matches(self):
+        titles = self.titles("potter")
+        self.assertCountEqual(titles, ["Harry Potter", "The Potter's Field", "Emma"])
+        self.assertEqual(titles[-1], "Emma")
+
+    def test_terms_without_words(self):
+        # Punctuation never reaches the MATCH syntax; nothing usable matches nothing.
+        self.assertEqual(self.titles('"*) OR ('), [])
+        self.assertEqual(len(self.titles("   ")), 4)
+
+    def test_falls_back_to_icontains_without_an_index(self):
+        from library_app import search
+
+        with mock.patch.dict(search._available, {'default': False}):
+            self.assertEqual(self.titles("otter's"), ["The Potter's Field"])
+            self.assertEqual(self.titles("harr pot"), [])
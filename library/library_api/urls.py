@@ -3,15 +3,16 @@ from .views import (
     BookListAPIView, BookDetailAPIView, CategoryListAPIView,
     BorrowRecordListAPIView, BorrowBookAPIView, ReturnBookAPIView,
     ReviewListCreateAPIView, ReviewDeleteAPIView, ReviewUpdateAPIView, UserProfileAPIView, LoginAPIView,
-    NotificationListAPIView, MarkAllNotificationsReadAPIView,
+    NotificationListAPIView, MarkAllNotificationsReadAPIView, UnreadNotificationCountAPIView, NotificationStreamTokenAPIView,
     BookAdminViewSet, BookCategoryAdminViewSet, SignupAPIView, AdminDashboardAPIView,
     SearchBooksAPIView, BooksByCategoryAPIView, MyBorrowingsAPIView,
     ReviewListAdminAPIView, ReviewDeleteAdminAPIView,
-    AdminBorrowingListAPIView, AdminBorrowingActionAPIView,
+    AdminBorrowingListAPIView, AdminBorrowingActionAPIView, AdminBorrowingBulkActionAPIView,
     TopRatedBooksAPIView, MostBorrowedBooksAPIView, CategoriesWithBooksAPIView, HomePageStatsAPIView,
-    TopRatedBooksListAPIView, MostPopularBooksListAPIView
+    TopRatedBooksListAPIView, MostPopularBooksListAPIView, MetricsAPIView
 )
 from rest_framework.routers import DefaultRouter
+from .streams import notification_stream
 
 router = DefaultRouter()
 router.register(r'admin/books', BookAdminViewSet, basename='admin-books')
@@ -34,12 +35,17 @@ urlpatterns = [
     path('reviews/<int:id>/delete/', ReviewDeleteAPIView.as_view(), name='api_delete_review'),
     path('profile/', UserProfileAPIView.as_view(), name='api_my_profile'),
     path('notifications/', NotificationListAPIView.as_view(), name='api_notifications'),
+    path('notifications/unread-count/', UnreadNotificationCountAPIView.as_view(), name='api_notifications_unread_count'),
+    path('notifications/stream/', notification_stream, name='api_notifications_stream'),
+    path('notifications/stream/token/', NotificationStreamTokenAPIView.as_view(), name='api_notifications_stream_token'),
     path('notifications/mark_all_read/', MarkAllNotificationsReadAPIView.as_view(), name='api_mark_all_notifications_read'),
     path('admin/dashboard/', AdminDashboardAPIView.as_view(), name='api_admin_dashboard'),
     path('admin/reviews/', ReviewListAdminAPIView.as_view(), name='api_admin_reviews'),
     path('admin/reviews/<int:review_id>/delete/', ReviewDeleteAdminAPIView.as_view(), name='api_admin_review_delete'),
     path('admin/borrowings/', AdminBorrowingListAPIView.as_view(), name='api_admin_borrowings'),
     path('admin/borrowings/action/', AdminBorrowingActionAPIView.as_view(), name='api_admin_borrowing_action'),
+    path('admin/borrowings/bulk-action/', AdminBorrowingBulkActionAPIView.as_view(), name='api_admin_borrowing_bulk_action'),
+    path('admin/metrics/', MetricsAPIView.as_view(), name='api_admin_metrics'),
     
     # Home page endpoints
     path('home/top-rated/', TopRatedBooksAPIView.as_view(), name='api_top_rated_books'),
@@ -53,3 +59,33 @@ urlpatterns = [
 ]
 
 urlpatterns += router.urls
+
+# Maximum SQL statements per GET, by URL name, for a token-authenticated
+# request (token lookup included) and independent of how many rows exist.
+# Enforced by tests through library_api.testing.QueryBudgetMixin and logged
+# by RequestMetricsMiddleware.
+QUERY_BUDGETS = {
+    'api_books': 3,
+    'api_book_detail': 3,
+    'api_search_books': 4,
+    'api_books_by_category': 3,
+    'api_categories': 3,
+    'api_my_borrowings': 2,
+    'api_borrowings': 2,
+    'api_reviews': 2,
+    'api_notifications': 2,
+    'api_notifications_unread_count': 2,
+    'api_notifications_stream_token': 1,
+    'api_my_profile': 2,
+    'api_top_rated_books': 2,
+    'api_most_borrowed_books': 2,
+    'api_categories_with_books': 3,
+    'api_home_stats': 5,
+    'api_books_top_rated': 2,
+    'api_books_most_popular': 2,
+    'api_admin_dashboard': 7,
+    'api_admin_reviews': 3,
+    'api_admin_borrowings': 3,
+    'api_admin_borrowing_bulk_action': 10,  # 500 reminders; SQLite splits bulk_create by its parameter limit
+    'admin-books-list': 3,
+}
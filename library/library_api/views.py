@@ -1,7 +1,12 @@
+import time
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import generics, permissions, viewsets, status, filters
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from library_app.models import Book, BorrowRecord, BookCategory, Review, UserProfile, Notification
+from library_app import fines, services
+from library_app.response_cache import cache_response
 from .serializers import BookSerializer, BorrowRecordSerializer, BookCategorySerializer, ReviewSerializer, UserProfileSerializer, NotificationSerializer, BookAdminSerializer, BookCategoryAdminSerializer, UserSignupSerializer
 from .serializers import BorrowRecordAdminSerializer, ReviewAdminSerializer, BorrowRecordUserSerializer
 
@@ -9,8 +14,12 @@ from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from .permissions import IsAdminUserProfile
+from .filters import FullTextSearchFilter
+from .conditional import books_version, book_version, categories_version, category_books_version
+from .streams import stream_token
 
 class AdminBookCreateAPIView(generics.CreateAPIView):
     queryset = Book.objects.all()
@@ -48,10 +57,13 @@ class SignupAPIView(APIView):
     
 
 # User Views
+@books_version
 class BookListAPIView(generics.ListAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    keyset_ordering = ('id',)
 
+@book_version
 class BookDetailAPIView(generics.RetrieveAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
@@ -60,89 +72,91 @@ class BookDetailAPIView(generics.RetrieveAPIView):
 
 class SearchBooksAPIView(generics.ListAPIView):
     serializer_class = BookSerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'author']
+    filter_backends = [FullTextSearchFilter]
+    pagination_class = None  # ranked by relevance and already capped at BOOK_SEARCH_MAX_RESULTS
     queryset = Book.objects.all()
 
+@category_books_version
 class BooksByCategoryAPIView(generics.ListAPIView):
     serializer_class = BookSerializer
+    keyset_ordering = ('id',)
     def get_queryset(self):
         category_id = self.kwargs['category_id']
         return Book.objects.filter(category_id=category_id)
     
+@categories_version
 class CategoryListAPIView(generics.ListAPIView):
     queryset = BookCategory.objects.all()
     serializer_class = BookCategorySerializer
+    pagination_class = None  # small lookup table used to fill dropdowns
 
 class TopRatedBooksListAPIView(generics.ListAPIView):
     """Get all top-rated books ordered by rating"""
     serializer_class = BookSerializer
     permission_classes = []
+    keyset_ordering = ('-rating_average', '-rating_count', 'id')
     
     def get_queryset(self):
-        from django.db.models import Avg, Count
-        return Book.objects.annotate(
-            avg_rating=Avg('reviews__rating'),
-            review_count=Count('reviews')
-        ).filter(
-            review_count__gt=0  # Only books with at least 1 review
-        ).order_by('-avg_rating', '-review_count')
+        # Stored aggregates, sorted straight off book_rating_idx
+        return Book.objects.filter(
+            rating_count__gt=0  # Only books with at least 1 review
+        ).order_by('-rating_average', '-rating_count')
 
 class MostPopularBooksListAPIView(generics.ListAPIView):
     """Get all books ordered by borrow count"""
     serializer_class = BookSerializer
     permission_classes = []
+    keyset_ordering = ('-borrow_count', 'id')
     
     def get_queryset(self):
-        from django.db.models import Count
-        return Book.objects.annotate(
-            borrow_count=Count('borrowrecord')
-        ).filter(
+        # Stored counter, sorted straight off book_popularity_idx
+        return Book.objects.filter(
             borrow_count__gt=0  # Only books that have been borrowed
-        ).order_by('-borrow_count')
+        ).order_by('-borrow_count', 'id')
 
 
 class BorrowRecordListAPIView(generics.ListAPIView):
     queryset = BorrowRecord.objects.all()
     serializer_class = BorrowRecordSerializer
     permission_classes = [IsAuthenticated]
+    keyset_ordering = ('-borrow_date', '-id')
     
 class BorrowBookAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, book_id):
-        book = Book.objects.get(id=book_id)
-        user = request.user
-
-        if BorrowRecord.objects.filter(user=user, book=book, is_returned=False).exists():
-            return Response({'error': 'You have already borrowed this book and not returned it yet.'}, status=400)
-
-        if book.available_copies <= 0:
-            return Response({'error': 'No copies available'}, status=400)
-
-        BorrowRecord.objects.create(user=user, book=book)
-        book.borrow()
-        return Response({'message': f'Borrowed {book.title}'})
+        try:
+            record = services.borrow_book(request.user, book_id)
+        except Book.DoesNotExist:
+            return Response({'error': 'Book not found'}, status=404)
+        except services.BorrowError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response({'message': f'Borrowed {record.book.title}'})
 
 
 class ReturnBookAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, record_id):
-        record = BorrowRecord.objects.get(id=record_id, user=request.user)
-        record.return_book()
+        record = get_object_or_404(BorrowRecord.objects.select_related('book'), id=record_id, user=request.user)
+        try:
+            services.return_book(record)
+        except services.BorrowError as e:
+            return Response({'error': str(e)}, status=400)
         return Response({'message': f'Returned {record.book.title}'})
 
 class MyBorrowingsAPIView(generics.ListAPIView):
     serializer_class = BorrowRecordUserSerializer
     permission_classes = [IsAuthenticated]
+    keyset_ordering = ('-borrow_date', '-id')
     def get_queryset(self):
-        return BorrowRecord.objects.filter(user=self.request.user).order_by('-borrow_date')
+        return BorrowRecord.objects.filter(user=self.request.user).select_related('book').order_by('-borrow_date')
 
 class ReviewListCreateAPIView(generics.ListCreateAPIView):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    keyset_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         queryset = Review.objects.select_related('user', 'book').order_by('-created_at')
@@ -182,20 +196,42 @@ class UserProfileAPIView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return UserProfile.objects.get(user=self.request.user)
+        return UserProfile.objects.select_related('user').get(user=self.request.user)
 
 class NotificationListAPIView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user).order_by('-created_at')
 
+class UnreadNotificationCountAPIView(APIView):
+    """The caller's unread notification count, read from the maintained profile counter."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        unread_count = (
+            UserProfile.objects.filter(user=request.user)
+            .values_list('unread_notifications', flat=True)
+            .first()
+        )
+        return Response({'unread_count': unread_count or 0})
+
+
+class NotificationStreamTokenAPIView(APIView):
+    """A short-lived signed token for ``notifications/stream/?token=``."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return Response({'token': stream_token(request.user)})
+
+
 class MarkAllNotificationsReadAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        services.mark_all_notifications_read(request.user)
         return Response({'status': 'success'})
 
 
@@ -218,10 +254,12 @@ class BookAdminViewSet(viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookAdminSerializer
     permission_classes = [IsAdminUserProfile]
+    keyset_ordering = ('id',)
 
 class AdminBorrowingListAPIView(generics.ListAPIView):
     serializer_class = BorrowRecordAdminSerializer
     permission_classes = [IsAdminUserProfile]
+    keyset_ordering = ('-borrow_date', '-id')
     def get_queryset(self):
         queryset = BorrowRecord.objects.select_related('user', 'book').all()
         status_param = self.request.query_params.get('status')
@@ -242,8 +280,8 @@ class AdminBorrowingActionAPIView(APIView):
         record = get_object_or_404(BorrowRecord, id=borrow_id)
         if action == 'reminder':
             Notification.objects.create(
-                user=record.user,
-                message=f"Reminder: Please return '{record.book.title}' by {record.due_date.strftime('%b %d, %Y') if record.due_date else 'ASAP'}."
+                user_id=record.user_id,
+                message=fines.return_reminder_message(record.book.title, record.due_date),
             )
             return Response({'status': 'reminder sent'})
         elif action == 'fine':
@@ -264,10 +302,58 @@ class AdminBorrowingActionAPIView(APIView):
                 return Response({'error': str(e)}, status=400)
         return Response({'error': 'Invalid action'}, status=400)
 
+class AdminBorrowingBulkActionAPIView(APIView):
+    """
+    Send reminders or set fines on many borrowings at once.
+
+    Body: ``action`` ('reminder' or 'fine'), then either ``borrow_ids`` (a
+    list) or ``status`` ('overdue' or 'unreturned'), plus ``fine_amount`` for
+    'fine'. The work is a handful of set-based queries however many records
+    match; the response summarises it.
+    """
+    permission_classes = [IsAdminUserProfile]
+
+    def post(self, request):
+        started = time.perf_counter()
+        action = request.data.get('action')
+        borrow_ids = request.data.get('borrow_ids')
+        status_param = request.data.get('status')
+
+        if borrow_ids is not None:
+            if not isinstance(borrow_ids, list) or not all(isinstance(pk, int) for pk in borrow_ids):
+                return Response({'error': 'borrow_ids must be a list of ids.'}, status=400)
+            records = BorrowRecord.objects.filter(pk__in=borrow_ids)
+        elif status_param == 'overdue':
+            records = BorrowRecord.objects.filter(is_returned=False, due_date__lt=timezone.now())
+        elif status_param == 'unreturned':
+            records = BorrowRecord.objects.filter(is_returned=False)
+        else:
+            return Response({'error': "Give borrow_ids or a status of 'overdue' or 'unreturned'."}, status=400)
+
+        if action == 'reminder':
+            reminders = fines.send_return_reminders(records)
+            summary = {'action': action, 'reminders_sent': reminders}
+        elif action == 'fine':
+            try:
+                fine_amount = Decimal(str(request.data.get('fine_amount'))).quantize(Decimal('0.01'))
+            except InvalidOperation:
+                return Response({'error': 'fine_amount must be a number.'}, status=400)
+            if not fine_amount.is_finite() or not 0 <= fine_amount <= fines.MAX_FINE:
+                return Response({'error': f'Fine must be between 0 and {fines.MAX_FINE}.'}, status=400)
+            updated = fines.set_fines(records, fine_amount)
+            summary = {'action': action, 'fines_updated': updated, 'fine_amount': fine_amount}
+        else:
+            return Response({'error': 'Invalid action'}, status=400)
+
+        summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return Response(summary)
+
+
 class BookCategoryAdminViewSet(viewsets.ModelViewSet):
     queryset = BookCategory.objects.all()
     serializer_class = BookCategoryAdminSerializer
     permission_classes = [IsAdminUserProfile]
+    pagination_class = None
     
     def destroy(self, request, *args, **kwargs):
         category = self.get_object()
@@ -280,6 +366,7 @@ class BookCategoryAdminViewSet(viewsets.ModelViewSet):
 class ReviewListAdminAPIView(generics.ListAPIView):
     serializer_class = ReviewAdminSerializer
     permission_classes = [IsAdminUserProfile]
+    keyset_ordering = ('-created_at', '-id')
     def get_queryset(self):
         queryset = Review.objects.select_related('user', 'book').order_by('-created_at')
         book_query = self.request.query_params.get('book')
@@ -304,16 +391,12 @@ class TopRatedBooksAPIView(APIView):
     """Get top-rated books with their average ratings"""
     permission_classes = []
     
+    @cache_response('home_top_rated', depends_on=('books', 'categories'))
     def get(self, request):
-        from django.db.models import Avg, Count
-        
-        # Get books with reviews, ordered by average rating
-        books = Book.objects.annotate(
-            avg_rating=Avg('reviews__rating'),
-            review_count=Count('reviews')
-        ).filter(
-            review_count__gt=0  # Only books with at least 1 review
-        ).order_by('-avg_rating', '-review_count')[:10]  # Top 10 books
+        # Get books with reviews, ordered by their stored average rating
+        books = Book.objects.select_related('category').filter(
+            rating_count__gt=0  # Only books with at least 1 review
+        ).order_by('-rating_average', '-rating_count')[:10]  # Top 10 books
         
         data = []
         for book in books:
@@ -323,8 +406,8 @@ class TopRatedBooksAPIView(APIView):
                 'author': book.author,
                 'category': book.category.name,
                 'cover_image': book.cover_image.url if book.cover_image else None,
-                'average_rating': round(book.avg_rating, 1) if book.avg_rating else 0,
-                'review_count': book.review_count,
+                'average_rating': book.average_rating or 0,
+                'review_count': book.rating_count,
                 'available_copies': book.available_copies
             })
         
@@ -335,15 +418,12 @@ class MostBorrowedBooksAPIView(APIView):
     """Get most borrowed books"""
     permission_classes = []
     
+    @cache_response('home_most_borrowed', depends_on=('books', 'categories'))
     def get(self, request):
-        from django.db.models import Count
-        
-        # Get books ordered by borrow count
-        books = Book.objects.annotate(
-            borrow_count=Count('borrowrecord')
-        ).filter(
+        # Get books ordered by their stored borrow count
+        books = Book.objects.select_related('category').filter(
             borrow_count__gt=0  # Only books that have been borrowed
-        ).order_by('-borrow_count')[:10]  # Top 10 most borrowed
+        ).order_by('-borrow_count', 'id')[:10]  # Top 10 most borrowed
         
         data = []
         for book in books:
@@ -365,31 +445,41 @@ class CategoriesWithBooksAPIView(APIView):
     """Get categories with their books"""
     permission_classes = []
     
+    BOOKS_PER_CATEGORY = 4
+
+    @cache_response('home_categories_with_books', depends_on=('books', 'categories'))
     def get(self, request):
-        categories = BookCategory.objects.prefetch_related('book_set').all()
-        
+        from collections import defaultdict
+        from django.db.models import Count, F, Window
+        from django.db.models.functions import RowNumber
+
+        # Two queries regardless of the number of categories: counts come from
+        # a GROUP BY, the first books of every category from a window function,
+        # and ratings from the stored aggregates on Book.
+        categories = BookCategory.objects.annotate(total_books=Count('book')).order_by('id')
+        books = Book.objects.annotate(
+            position=Window(RowNumber(), partition_by=F('category_id'), order_by=F('id').asc())
+        ).filter(position__lte=self.BOOKS_PER_CATEGORY).order_by('category_id', 'position')
+
+        books_by_category = defaultdict(list)
+        for book in books:
+            books_by_category[book.category_id].append({
+                'id': book.id,
+                'title': book.title,
+                'author': book.author,
+                'cover_image': book.cover_image.url if book.cover_image else None,
+                'available_copies': book.available_copies,
+                'average_rating': book.average_rating
+            })
+
         data = []
         for category in categories:
-            books = category.book_set.all()[:4]  # First 4 books per category
-            
-            category_data = {
+            data.append({
                 'id': category.id,
                 'name': category.name,
-                'total_books': category.book_set.count(),
-                'books': []
-            }
-            
-            for book in books:
-                category_data['books'].append({
-                    'id': book.id,
-                    'title': book.title,
-                    'author': book.author,
-                    'cover_image': book.cover_image.url if book.cover_image else None,
-                    'available_copies': book.available_copies,
-                    'average_rating': book.average_rating
-                })
-            
-            data.append(category_data)
+                'total_books': category.total_books,
+                'books': books_by_category[category.id]
+            })
         
         return Response(data)
 
@@ -398,6 +488,7 @@ class HomePageStatsAPIView(APIView):
     """Get general stats for home page"""
     permission_classes = []
     
+    @cache_response('home_stats', depends_on=('books', 'categories', 'borrowings', 'reviews'))
     def get(self, request):
         from django.db.models import Count, Avg
         
@@ -412,3 +503,26 @@ class HomePageStatsAPIView(APIView):
             'total_borrowings': total_borrowings,
             'average_rating': round(avg_rating, 1) if avg_rating else 0
         })
+
+
+class MetricsAPIView(APIView):
+    """
+    Per-route request metrics collected by RequestMetricsMiddleware.
+
+    Prometheus text by default, ``?format=json`` for a summary; DELETE resets.
+    """
+    permission_classes = [IsAdminUserProfile]
+
+    def get(self, request):
+        from django.http import HttpResponse
+        from .instrumentation import registry
+
+        if request.query_params.get('format') == 'json':
+            return Response(registry.summary())
+        return HttpResponse(registry.prometheus(), content_type='text/plain; version=0.0.4')
+
+    def delete(self, request):
+        from .instrumentation import registry
+
+        registry.reset()
+        return Response({'status': 'reset'})
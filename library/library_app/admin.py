@@ -1,8 +1,8 @@
 from django.contrib import admin
-from .models import Book, BookCategory, BorrowRecord, UserProfile
+from .models import Book, BookCategory, BorrowRecord, UserProfile, AnalyticsOutbox
 
 admin.site.register(Book)
 admin.site.register(BookCategory)
 admin.site.register(BorrowRecord)
 admin.site.register(UserProfile)
-
+admin.site.register(AnalyticsOutbox)
@@ -0,0 +1,46 @@
+import json
+import logging
+from urllib import request
+from urllib.error import URLError
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Analytics cache namespaces whose results read each synced table.
+SYNC_NAMESPACES = {
+    'category': 'books',
+    'book': 'books',
+    'borrowing': 'borrowings',
+    'review': 'reviews',
+}
+
+
+def invalidate_analytics_cache(namespaces=None):
+    """
+    Tell the Flask analytics service to drop cached results that depend on
+    ``namespaces`` (all of them when None).
+
+    A no-op unless ANALYTICS_CACHE_INVALIDATE_URL and the shared token are
+    configured. Failures are only logged: the service's cache timeout still
+    bounds how stale a result can get, and a sync must not fail over it.
+    """
+    url = getattr(settings, 'ANALYTICS_CACHE_INVALIDATE_URL', '')
+    token = getattr(settings, 'ANALYTICS_CACHE_INVALIDATE_TOKEN', '')
+    if not url or not token:
+        return False
+
+    body = {'namespaces': sorted(namespaces)} if namespaces else {}
+    invalidation = request.Request(
+        url,
+        data=json.dumps(body).encode(),
+        headers={'Content-Type': 'application/json', 'X-Analytics-Token': token},
+        method='POST',
+    )
+    try:
+        with request.urlopen(invalidation, timeout=getattr(settings, 'ANALYTICS_CACHE_INVALIDATE_TIMEOUT', 2)):
+            return True
+    except (URLError, OSError) as e:
+        logger.warning(f"Could not invalidate the analytics cache: {e}")
+        return False
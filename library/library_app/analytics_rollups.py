@@ -0,0 +1,276 @@
+from datetime import date
+
+
+# One row per (day, book): loans started, loans returned and fines charged at
+# return that day, plus the book's category. A second, much narrower table
+# sums it per (day, category) for the date-range charts. The Flask analytics
+# service reads these instead of scanning library_app_borrowrecord. The sync
+# path keeps both exact by recomputing, in the same transaction, every
+# (day, book) key a synced borrowing touched before and after the change and
+# then the (day, category) rows of those days, under advisory locks that
+# serialize concurrent batches touching the same books or days.
+ROLLUP_TABLE = 'analytics_daily_book_activity'
+CATEGORY_ROLLUP_TABLE = 'analytics_daily_category_activity'
+
+# Two-key advisory lock spaces: (BOOK_LOCK_SPACE, book_id) and
+# (DAY_LOCK_SPACE, days since LOCK_EPOCH).
+BOOK_LOCK_SPACE = 72_530_101
+DAY_LOCK_SPACE = 72_530_102
+LOCK_EPOCH = date(2000, 1, 1)
+
+ROLLUP_DDL = (
+    f"""
+    CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+        day DATE NOT NULL,
+        book_id INTEGER NOT NULL,
+        category_id INTEGER,
+        borrows INTEGER NOT NULL DEFAULT 0,
+        returns INTEGER NOT NULL DEFAULT 0,
+        fines NUMERIC(12,2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, book_id)
+    )
+    """,
+    f"CREATE INDEX IF NOT EXISTS {ROLLUP_TABLE}_book_idx ON {ROLLUP_TABLE} (book_id)",
+    f"CREATE INDEX IF NOT EXISTS {ROLLUP_TABLE}_category_idx ON {ROLLUP_TABLE} (category_id, day)",
+    f"""
+    CREATE TABLE IF NOT EXISTS {CATEGORY_ROLLUP_TABLE} (
+        day DATE NOT NULL,
+        category_id INTEGER,
+        borrows INTEGER NOT NULL DEFAULT 0,
+        returns INTEGER NOT NULL DEFAULT 0,
+        fines NUMERIC(12,2) NOT NULL DEFAULT 0
+    )
+    """,
+    f"CREATE UNIQUE INDEX IF NOT EXISTS {CATEGORY_ROLLUP_TABLE}_key ON {CATEGORY_ROLLUP_TABLE} (day, category_id)",
+    # Per-key recomputation reads the raw rows of one book on one day.
+    "CREATE INDEX IF NOT EXISTS analytics_borrow_book_date_idx ON library_app_borrowrecord (book_id, borrow_date)",
+    "CREATE INDEX IF NOT EXISTS analytics_borrow_book_return_idx ON library_app_borrowrecord (book_id, return_date)",
+)
+
+# Exact totals for every (day, book) with any activity, straight from the raw rows.
+RAW_TOTALS = """
+    SELECT activity.day, activity.book_id, b.category_id,
+           SUM(activity.borrows)::int AS borrows,
+           SUM(activity.returns)::int AS returns,
+           SUM(activity.fines)::numeric(12,2) AS fines
+    FROM (
+        SELECT borrow_date::date AS day, book_id, 1 AS borrows, 0 AS returns, 0 AS fines
+        FROM library_app_borrowrecord
+        UNION ALL
+        SELECT return_date::date, book_id, 0, 1, COALESCE(fine, 0)
+        FROM library_app_borrowrecord
+        WHERE is_returned AND return_date IS NOT NULL
+    ) activity
+    JOIN library_app_book b ON b.id = activity.book_id
+    GROUP BY activity.day, activity.book_id, b.category_id
+"""
+
+REFRESH_KEYS = f"""
+    WITH keys AS (
+        SELECT DISTINCT k.book_id, k.day
+        FROM unnest(%(book_ids)s::int[], %(days)s::date[]) AS k(book_id, day)
+    ),
+    totals AS (
+        SELECT k.day, k.book_id, b.category_id,
+               (SELECT COUNT(*) FROM library_app_borrowrecord br
+                WHERE br.book_id = k.book_id
+                  AND br.borrow_date >= k.day AND br.borrow_date < k.day + 1)::int AS borrows,
+               r.returns, r.fines
+        FROM keys k
+        JOIN library_app_book b ON b.id = k.book_id
+        CROSS JOIN LATERAL (
+            SELECT COUNT(*)::int AS returns, COALESCE(SUM(br.fine), 0)::numeric(12,2) AS fines
+            FROM library_app_borrowrecord br
+            WHERE br.book_id = k.book_id AND br.is_returned
+              AND br.return_date >= k.day AND br.return_date < k.day + 1
+        ) r
+    ),
+    emptied AS (
+        DELETE FROM {ROLLUP_TABLE} rollup
+        USING totals t
+        WHERE rollup.day = t.day AND rollup.book_id = t.book_id
+          AND t.borrows = 0 AND t.returns = 0
+    )
+    INSERT INTO {ROLLUP_TABLE} (day, book_id, category_id, borrows, returns, fines)
+    SELECT day, book_id, category_id, borrows, returns, fines
+    FROM totals
+    WHERE borrows > 0 OR returns > 0
+    ON CONFLICT (day, book_id) DO UPDATE SET
+        category_id = EXCLUDED.category_id,
+        borrows = EXCLUDED.borrows,
+        returns = EXCLUDED.returns,
+        fines = EXCLUDED.fines
+"""
+
+
+CATEGORY_TOTALS = f"""
+    SELECT day, category_id, SUM(borrows)::int, SUM(returns)::int, SUM(fines)::numeric(12,2)
+    FROM {ROLLUP_TABLE}
+"""
+
+
+def create_rollup_tables(cursor):
+    for statement in ROLLUP_DDL:
+        cursor.execute(statement)
+
+
+def activity_keys(cursor, borrowing_ids):
+    """(book_id, day) keys the stored versions of ``borrowing_ids`` count towards."""
+    if not borrowing_ids:
+        return set()
+    cursor.execute(
+        """
+        SELECT book_id, borrow_date::date, return_date::date
+        FROM library_app_borrowrecord
+        WHERE id = ANY(%s)
+        """,
+        (list(borrowing_ids),),
+    )
+    keys = set()
+    for book_id, borrow_day, return_day in cursor.fetchall():
+        keys.add((book_id, borrow_day))
+        if return_day is not None:
+            keys.add((book_id, return_day))
+    return keys
+
+
+def _lock(cursor, space, ids):
+    ids = sorted(set(ids))
+    if ids:
+        # unnest yields the ids in array order, so the locks are taken ascending.
+        cursor.execute("SELECT pg_advisory_xact_lock(%s, id) FROM unnest(%s::int[]) AS k(id)", (space, ids))
+
+
+def lock_rollup_keys(cursor, keys, books=None):
+    """
+    Take the transaction-level advisory locks that serialize rollup upkeep
+    with other sync transactions: every book in ``keys`` ((book_id, day)
+    pairs) and ``books`` (book id -> new category id), then every day in
+    ``keys`` plus the days whose rows a category change in ``books`` moves.
+
+    Recomputes read committed rows, so two batches recomputing the same key
+    unlocked could each miss the other's borrowings and the last writer
+    would win. Every caller locks books before days, each ascending, so
+    batches never deadlock on these locks. Locks already held are free to
+    take again.
+    """
+    books = books or {}
+    _lock(cursor, BOOK_LOCK_SPACE, [book_id for book_id, _ in keys] + list(books))
+    days = {day for _, day in keys}
+    if books:
+        cursor.execute(
+            f"""
+            SELECT DISTINCT rollup.day
+            FROM {ROLLUP_TABLE} rollup
+            JOIN unnest(%s::int[], %s::int[]) AS b(id, category_id) ON rollup.book_id = b.id
+            WHERE rollup.category_id IS DISTINCT FROM b.category_id
+            """,
+            (list(books), list(books.values())),
+        )
+        days.update(day for day, in cursor.fetchall())
+    _lock(cursor, DAY_LOCK_SPACE, [(day - LOCK_EPOCH).days for day in days])
+
+
+def refresh_category_days(cursor, days):
+    """Re-derive the (day, category) rows of ``days`` from the book rollup."""
+    days = sorted(set(days))
+    if not days:
+        return
+    cursor.execute(f"DELETE FROM {CATEGORY_ROLLUP_TABLE} WHERE day = ANY(%s)", (days,))
+    cursor.execute(
+        f"""
+        INSERT INTO {CATEGORY_ROLLUP_TABLE} (day, category_id, borrows, returns, fines)
+        {CATEGORY_TOTALS}
+        WHERE day = ANY(%s)
+        GROUP BY day, category_id
+        """,
+        (days,),
+    )
+
+
+def refresh_rollup_keys(cursor, keys):
+    """Recompute the rollup rows for ``keys``, an iterable of (book_id, day)."""
+    keys = list(keys)
+    if not keys:
+        return
+    lock_rollup_keys(cursor, keys)
+    cursor.execute(REFRESH_KEYS, {
+        'book_ids': [book_id for book_id, _ in keys],
+        'days': [day for _, day in keys],
+    })
+    refresh_category_days(cursor, [day for _, day in keys])
+
+
+def refresh_rollup_categories(cursor, book_ids):
+    """Carry category changes of ``book_ids`` over to their rollup rows."""
+    if not book_ids:
+        return
+    cursor.execute(
+        f"""
+        UPDATE {ROLLUP_TABLE} rollup
+        SET category_id = b.category_id
+        FROM library_app_book b
+        WHERE rollup.book_id = b.id AND b.id = ANY(%s)
+          AND rollup.category_id IS DISTINCT FROM b.category_id
+        RETURNING rollup.day
+        """,
+        (list(book_ids),),
+    )
+    days = [day for day, in cursor.fetchall()]
+    _lock(cursor, DAY_LOCK_SPACE, [(day - LOCK_EPOCH).days for day in days])
+    refresh_category_days(cursor, days)
+
+
+def rebuild_rollups(cursor):
+    """Recompute both rollups from the raw rows; returns the number of book rollup rows written."""
+    cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+    cursor.execute(
+        f"INSERT INTO {ROLLUP_TABLE} (day, book_id, category_id, borrows, returns, fines) {RAW_TOTALS}"
+    )
+    rows = cursor.rowcount
+    cursor.execute(f"DELETE FROM {CATEGORY_ROLLUP_TABLE}")
+    cursor.execute(
+        f"INSERT INTO {CATEGORY_ROLLUP_TABLE} (day, category_id, borrows, returns, fines) "
+        f"{CATEGORY_TOTALS} GROUP BY day, category_id"
+    )
+    return rows
+
+
+def rollup_drift(cursor, limit=20):
+    """
+    Rollup rows that disagree with the raw rows, at most ``limit`` per table,
+    as (table, day, book or category id).
+    """
+    cursor.execute(
+        f"""
+        SELECT '{ROLLUP_TABLE}', COALESCE(raw.day, rollup.day), COALESCE(raw.book_id, rollup.book_id)
+        FROM ({RAW_TOTALS}) raw
+        FULL OUTER JOIN {ROLLUP_TABLE} rollup
+          ON rollup.day = raw.day AND rollup.book_id = raw.book_id
+        WHERE raw.day IS NULL OR rollup.day IS NULL
+           OR (raw.category_id, raw.borrows, raw.returns, raw.fines)
+              IS DISTINCT FROM (rollup.category_id, rollup.borrows, rollup.returns, rollup.fines)
+        ORDER BY 2, 3
+        LIMIT %s
+        """,
+        (limit,),
+    )
+    drift = cursor.fetchall()
+    cursor.execute(
+        f"""
+        SELECT '{CATEGORY_ROLLUP_TABLE}', COALESCE(raw.day, rollup.day), COALESCE(raw.category_id, rollup.category_id)
+        FROM (
+            SELECT day, category_id, SUM(borrows) AS borrows, SUM(returns) AS returns, SUM(fines) AS fines
+            FROM ({RAW_TOTALS}) totals
+            GROUP BY day, category_id
+        ) raw
+        FULL OUTER JOIN {CATEGORY_ROLLUP_TABLE} rollup
+          ON rollup.day = raw.day AND rollup.category_id IS NOT DISTINCT FROM raw.category_id
+        WHERE raw.day IS NULL OR rollup.day IS NULL
+           OR (raw.borrows, raw.returns, raw.fines) IS DISTINCT FROM (rollup.borrows, rollup.returns, rollup.fines)
+        ORDER BY 2, 3
+        LIMIT %s
+        """,
+        (limit,),
+    )
+    return drift + cursor.fetchall()
@@ -0,0 +1,508 @@
+from django.conf import settings
+from django.utils import timezone
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone as dt_timezone
+from psycopg2 import extensions
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+import threading
+import logging
+import time
+
+from .analytics_cache import SYNC_NAMESPACES, invalidate_analytics_cache
+from .analytics_rollups import (
+    activity_keys, create_rollup_tables, lock_rollup_keys, refresh_rollup_categories, refresh_rollup_keys,
+)
+from .analytics_views import RANKING_VIEWS, create_ranking_views, note_ranking_changes, refresh_ranking_views
+
+
+logger = logging.getLogger(__name__)
+
+# Order in which model batches are shipped so foreign keys resolve on the
+# analytics side (categories before books, books before borrowings/reviews).
+SYNC_ORDER = ('user', 'category', 'book', 'borrowing', 'review')
+
+# Analytics table and column list for each sync key, in column order.
+ANALYTICS_TABLES = {
+    'user': ('auth_user', (
+        'id', 'username', 'email', 'first_name', 'last_name', 'is_staff',
+        'is_active', 'date_joined', 'full_name', 'address', 'phone',
+    )),
+    'category': ('library_app_bookcategory', ('id', 'name')),
+    'book': ('library_app_book', (
+        'id', 'title', 'author', 'isbn', 'total_copies', 'available_copies',
+        'category_id', 'cover_image',
+    )),
+    'borrowing': ('library_app_borrowrecord', (
+        'id', 'user_id', 'book_id', 'borrow_date', 'due_date', 'return_date',
+        'is_returned', 'fine',
+    )),
+    'review': ('library_app_review', (
+        'id', 'user_id', 'book_id', 'rating', 'comment', 'created_at',
+    )),
+}
+
+
+class PoolTimeout(Exception):
+    """Raised when no analytics connection frees up within the acquire timeout."""
+
+
+class AnalyticsConnectionPool:
+    """
+    Bounded, thread-safe pool of analytics database connections.
+
+    Wraps ``ThreadedConnectionPool`` with a semaphore so callers wait for a
+    free slot instead of getting ``PoolError``, checks connections that sat
+    idle before handing them out, and recycles ones idle for too long.
+    """
+
+    def __init__(self, config, minconn=1, maxconn=5, max_idle=300, health_check_after=30, acquire_timeout=10):
+        self.config = config
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self._stats = {
+            'checkouts': 0,
+            'connections_opened': 0,
+            'recycled_idle': 0,
+            'recycled_broken': 0,
+            'health_checks': 0,
+            'acquire_timeouts': 0,
+            'wait_seconds_total': 0.0,
+            'in_use': 0,
+        }
+
+    def _get_pool(self):
+        # Created lazily so importing the module never touches the network.
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, **self.config)
+                # psycopg2 closes returned connections once ``minconn`` are
+                # idle; keep up to ``maxconn`` warm and let max_idle shrink it.
+                self._pool.minconn = self.maxconn
+            return self._pool
+
+    def _record(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _checkout(self, pool):
+        conn = pool.getconn()
+        last_used = self._last_used.get(id(conn))
+        if last_used is None:
+            self._record('connections_opened')
+            return conn
+
+        idle = time.monotonic() - last_used
+        if conn.closed or idle > self.max_idle:
+            self._record('recycled_broken' if conn.closed else 'recycled_idle')
+            return self._replace(pool, conn)
+
+        if idle > self.health_check_after:
+            self._record('health_checks')
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                self._record('recycled_broken')
+                return self._replace(pool, conn)
+        return conn
+
+    def _replace(self, pool, conn):
+        self._last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+        self._record('connections_opened')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, blocking up to ``acquire_timeout`` seconds for a free slot."""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self._record('acquire_timeouts')
+            raise PoolTimeout(f"No analytics connection available after {self.acquire_timeout}s")
+        self._record('wait_seconds_total', time.monotonic() - started)
+
+        pool = None
+        conn = None
+        try:
+            pool = self._get_pool()
+            conn = self._checkout(pool)
+            self._record('checkouts')
+            self._record('in_use')
+            yield conn
+        finally:
+            if conn is not None:
+                self._record('in_use', -1)
+                self._release(pool, conn)
+            self._slots.release()
+
+    def _release(self, pool, conn):
+        broken = bool(conn.closed)
+        if not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            self._last_used.pop(id(conn), None)
+            self._record('recycled_broken')
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        pool.putconn(conn, close=broken)
+
+    def stats(self):
+        """Snapshot of pool counters plus current sizing."""
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot['max_connections'] = self.maxconn
+        snapshot['idle'] = len(self._pool._pool) if self._pool else 0
+        return snapshot
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._last_used.clear()
+
+
+class PostgreSQLSyncHandler:
+    """Handles PostgreSQL synchronization for Django models."""
+
+    def __init__(self):
+        self.postgres_config = {
+            'host': getattr(settings, 'ANALYTICS_DB_HOST'),
+            'port': getattr(settings, 'ANALYTICS_DB_PORT'),
+            'database': getattr(settings, 'ANALYTICS_DB_NAME'),
+            'user': getattr(settings, 'ANALYTICS_DB_USER'),
+            'password': getattr(settings, 'ANALYTICS_DB_PASSWORD')
+        }
+        self.enabled = getattr(settings, 'ENABLE_ANALYTICS_SYNC', False)
+        self.pool = AnalyticsConnectionPool(
+            self.postgres_config,
+            minconn=getattr(settings, 'ANALYTICS_DB_POOL_MIN', 1),
+            maxconn=getattr(settings, 'ANALYTICS_DB_POOL_MAX', 5),
+            max_idle=getattr(settings, 'ANALYTICS_DB_POOL_MAX_IDLE', 300),
+            health_check_after=getattr(settings, 'ANALYTICS_DB_POOL_HEALTH_CHECK_AFTER', 30),
+            acquire_timeout=getattr(settings, 'ANALYTICS_DB_POOL_ACQUIRE_TIMEOUT', 10),
+        )
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled analytics connection.
+
+        Yields None when sync is disabled or the database is unreachable, so
+        callers can skip work the same way they would for a failed connect.
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        with ExitStack() as stack:
+            try:
+                conn = stack.enter_context(self.pool.connection())
+            except Exception as e:
+                logger.error(f"Failed to connect to analytics database: {e}")
+                conn = None
+            yield conn
+
+    def ensure_tables_exist(self):
+        """Ensure all required tables exist in PostgreSQL."""
+        with self.connection() as conn:
+            if conn:
+                self._create_tables(conn)
+
+    def _create_tables(self, conn):
+        try:
+            cursor = conn.cursor()
+
+            # Create auth_user table if it doesn't exist
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS auth_user (
+                    id INTEGER PRIMARY KEY,
+                    username VARCHAR(150) UNIQUE NOT NULL,
+                    email VARCHAR(254),
+                    first_name VARCHAR(30),
+                    last_name VARCHAR(150),
+                    is_staff BOOLEAN DEFAULT FALSE,
+                    is_active BOOLEAN DEFAULT TRUE,
+                    date_joined TIMESTAMP,
+                    full_name VARCHAR(150),
+                    address TEXT,
+                    phone VARCHAR(13)
+                )
+            """)
+
+            # Create category table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS library_app_bookcategory (
+                    id INTEGER PRIMARY KEY,
+                    name VARCHAR(100) UNIQUE NOT NULL
+                )
+            """)
+
+            # Create book table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS library_app_book (
+                    id INTEGER PRIMARY KEY,
+                    title VARCHAR(200) NOT NULL,
+                    author VARCHAR(200) NOT NULL,
+                    isbn VARCHAR(13) UNIQUE,
+                    total_copies INTEGER DEFAULT 1,
+                    available_copies INTEGER DEFAULT 1,
+                    cover_image VARCHAR(255),
+                    category_id INTEGER REFERENCES library_app_bookcategory(id)
+                )
+            """)
+
+            # Create borrowing table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS library_app_borrowrecord (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER,
+                    book_id INTEGER REFERENCES library_app_book(id),
+                    borrow_date TIMESTAMP NOT NULL,
+                    return_date TIMESTAMP,
+                    due_date TIMESTAMP,
+                    is_returned BOOLEAN DEFAULT FALSE,
+                    fine NUMERIC(6,2) DEFAULT 0.00
+                )
+            """)
+            # Outstanding and overdue loans, counted by /analytics/borrowed-vs-returned
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS analytics_borrow_outstanding_idx
+                ON library_app_borrowrecord (due_date) WHERE NOT is_returned
+            """)
+
+            # Create review table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS library_app_review (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER,
+                    book_id INTEGER REFERENCES library_app_book(id),
+                    rating INTEGER NOT NULL,
+                    comment TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            create_rollup_tables(cursor)
+            create_ranking_views(cursor)
+
+            conn.commit()
+            logger.info("Ensured all analytics tables exist")
+
+        except Exception as e:
+            logger.error(f"Failed to ensure tables exist: {e}")
+            conn.rollback()
+
+    def sync_instances(self, instances):
+        """
+        Upsert a batch of instances in a single analytics transaction.
+
+        Args:
+            instances (dict): Maps a SYNC_ORDER key to a list of model instances
+
+        Each table is written with one multi-row statement. Books and
+        categories referenced by borrowings are inserted once per batch if
+        missing, instead of once per borrowing. The daily activity rollup rows
+        the borrowings counted towards before and after the upsert are
+        recomputed in the same transaction, and the rows are counted against
+        the ranking views, which are refreshed once
+        ANALYTICS_VIEW_REFRESH_CHANGES have piled up. Once committed, the
+        analytics service is told to drop cached results that read the
+        changed tables.
+
+        Raises an exception when the batch could not be committed so the
+        caller can keep its outbox rows and retry later.
+        """
+        rows = {key: [ROW_BUILDERS[key](instance) for instance in instances.get(key, ())] for key in SYNC_ORDER}
+
+        # Dependencies that must exist for foreign keys but are not themselves dirty.
+        books = {book.pk: book for book in instances.get('book', ())}
+        referenced_books = {}
+        for borrowing in instances.get('borrowing', ()):
+            if borrowing.book_id not in books:
+                referenced_books[borrowing.book_id] = borrowing.book
+        categories = {category.pk for category in instances.get('category', ())}
+        referenced_categories = {}
+        for book in list(books.values()) + list(referenced_books.values()):
+            if book.category_id not in categories:
+                referenced_categories[book.category_id] = book.category
+
+        with self.connection() as conn:
+            if not conn:
+                raise ConnectionError("Analytics database is unavailable")
+            try:
+                cursor = conn.cursor()
+                borrowing_ids = [borrowing.pk for borrowing in instances.get('borrowing', ())]
+                touched = activity_keys(cursor, borrowing_ids)
+                lock_rollup_keys(
+                    cursor,
+                    touched | borrowing_keys(instances.get('borrowing', ())),
+                    {book.pk: book.category_id for book in books.values()},
+                )
+                self.upsert_rows(cursor, 'user', rows['user'])
+                self.upsert_rows(cursor, 'category', [category_row(c) for c in referenced_categories.values()], update=False)
+                self.upsert_rows(cursor, 'category', rows['category'])
+                self.upsert_rows(cursor, 'book', [book_row(b) for b in referenced_books.values()], update=False)
+                self.upsert_rows(cursor, 'book', rows['book'])
+                refresh_rollup_categories(cursor, books)
+                self.upsert_rows(cursor, 'borrowing', rows['borrowing'])
+                refresh_rollup_keys(cursor, touched | activity_keys(cursor, borrowing_ids))
+                self.upsert_rows(cursor, 'review', rows['review'])
+                pending = note_ranking_changes(cursor, {key: len(batch) for key, batch in rows.items()})
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            refreshed = []
+            threshold = getattr(settings, 'ANALYTICS_VIEW_REFRESH_CHANGES', 0)
+            if threshold and any(changes >= threshold for changes in pending.values()):
+                try:
+                    refreshed = refresh_ranking_views(conn, min_changes=threshold)
+                except Exception as e:
+                    # The batch is committed; the next refresh picks these changes up.
+                    logger.warning(f"Ranking view refresh failed: {e}")
+
+        changed = {SYNC_NAMESPACES[key] for key, batch in rows.items() if batch and key in SYNC_NAMESPACES}
+        changed |= {RANKING_VIEWS[name]['namespace'] for name in refreshed}
+        if changed:
+            invalidate_analytics_cache(changed)
+
+    def upsert_rows(self, cursor, key, rows, update=True):
+        """Insert ``rows`` into the analytics table for ``key`` with a multi-row statement."""
+        if not rows:
+            return
+        table, columns = ANALYTICS_TABLES[key]
+        if update:
+            conflict = "DO UPDATE SET " + ", ".join(
+                f"{column} = EXCLUDED.{column}" for column in columns if column != 'id'
+            )
+        else:
+            conflict = "DO NOTHING"
+        execute_values(
+            cursor,
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s ON CONFLICT (id) {conflict}",
+            rows,
+            page_size=1000,
+        )
+
+
+def naive_utc(value):
+    """
+    An aware datetime as naive UTC for the analytics ``TIMESTAMP`` columns.
+
+    Left aware, psycopg2 would have PostgreSQL convert it to the session's
+    TimeZone and COPY would drop the offset, so the two load paths would only
+    agree on a server running in UTC. Other values pass through unchanged.
+    """
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.make_naive(value, dt_timezone.utc)
+    return value
+
+
+def user_row(user_instance):
+    # Get user profile data safely
+    full_name = ''
+    address = ''
+    phone = ''
+
+    try:
+        if hasattr(user_instance, 'userprofile'):
+            profile = user_instance.userprofile
+            full_name = getattr(profile, 'full_name', '')
+            address = getattr(profile, 'address', '')
+            phone = getattr(profile, 'phone', '')
+    except Exception:
+        # If userprofile doesn't exist, use empty strings
+        pass
+
+    return (
+        user_instance.id,
+        user_instance.username,
+        user_instance.email or '',
+        user_instance.first_name or '',
+        user_instance.last_name or '',
+        user_instance.is_staff,
+        user_instance.is_active,
+        naive_utc(user_instance.date_joined),
+        full_name,
+        address,
+        phone
+    )
+
+
+def category_row(category_instance):
+    return (category_instance.id, category_instance.name)
+
+
+def book_row(book_instance):
+    return (
+        book_instance.id,
+        book_instance.title,
+        book_instance.author,
+        book_instance.isbn,
+        book_instance.total_copies,
+        book_instance.available_copies,
+        book_instance.category_id,
+        str(book_instance.cover_image) if book_instance.cover_image else None
+    )
+
+
+def borrowing_row(borrowing_instance):
+    return (
+        borrowing_instance.id,
+        borrowing_instance.user_id,
+        borrowing_instance.book_id,
+        naive_utc(borrowing_instance.borrow_date),
+        naive_utc(borrowing_instance.due_date),
+        naive_utc(borrowing_instance.return_date),
+        borrowing_instance.is_returned,
+        float(borrowing_instance.fine) if borrowing_instance.fine else 0.0
+    )
+
+
+def borrowing_keys(borrowings):
+    """(book_id, day) rollup keys the given borrowings will count towards once synced."""
+    keys = set()
+    for borrowing in borrowings:
+        for moment in (borrowing.borrow_date, borrowing.return_date):
+            if moment is not None:
+                keys.add((borrowing.book_id, naive_utc(moment).date()))
+    return keys
+
+
+def review_row(review_instance):
+    return (
+        review_instance.id,
+        review_instance.user_id,
+        review_instance.book_id,
+        review_instance.rating,
+        review_instance.content,
+        naive_utc(review_instance.created_at)
+    )
+
+
+# Builds an ANALYTICS_TABLES-ordered tuple from a model instance.
+ROW_BUILDERS = {
+    'user': user_row,
+    'category': category_row,
+    'book': book_row,
+    'borrowing': borrowing_row,
+    'review': review_row,
+}
+
+
+sync_handler = PostgreSQLSyncHandler()
@@ -0,0 +1,124 @@
+from .analytics_rollups import ROLLUP_TABLE
+
+
+# Materialized rankings the Flask top-books endpoints read instead of
+# grouping every borrow record or review per request. Book details are
+# joined at read time, so only counts and ratings go stale between
+# refreshes. The sync path counts the changes each view has not seen yet;
+# refresh_ranking_views rebuilds the views CONCURRENTLY (readers are never
+# blocked) once enough have piled up, or on a schedule.
+REFRESH_TABLE = 'analytics_view_refresh'
+
+RANKING_VIEWS = {
+    'analytics_top_books_by_borrowings': {
+        'query': f"""
+            SELECT book_id, SUM(borrows)::int AS borrow_count
+            FROM {ROLLUP_TABLE}
+            GROUP BY book_id
+            HAVING SUM(borrows) >= 1
+        """,
+        'indexes': ('(book_id)', '(borrow_count DESC, book_id)'),
+        'sources': ('borrowing',),
+        'namespace': 'borrowings',
+    },
+    'analytics_top_books_by_ratings': {
+        'query': """
+            SELECT book_id, AVG(CAST(rating AS FLOAT)) AS avg_rating, COUNT(*)::int AS review_count
+            FROM library_app_review
+            GROUP BY book_id
+        """,
+        'indexes': ('(book_id)', '(avg_rating DESC, review_count DESC, book_id)'),
+        'sources': ('review',),
+        'namespace': 'reviews',
+    },
+}
+
+# Held while refreshing so concurrent refreshers skip instead of queueing.
+REFRESH_LOCK_ID = 72_530_001
+
+
+def create_ranking_views(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {REFRESH_TABLE} (
+            view_name VARCHAR(100) PRIMARY KEY,
+            refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            pending_changes INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for name, view in RANKING_VIEWS.items():
+        cursor.execute(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {view['query']}")
+        # The unique index on book_id is what REFRESH ... CONCURRENTLY requires.
+        unique, ranking = view['indexes']
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_key ON {name} {unique}")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name}_rank_idx ON {name} {ranking}")
+        cursor.execute(
+            f"INSERT INTO {REFRESH_TABLE} (view_name) VALUES (%s) ON CONFLICT (view_name) DO NOTHING",
+            (name,),
+        )
+
+
+def note_ranking_changes(cursor, counts):
+    """
+    Add synced row ``counts`` (SYNC_ORDER key -> rows) to the views that read
+    those tables; returns the new unseen-change totals of the views touched.
+    """
+    pending = {}
+    for name, view in RANKING_VIEWS.items():
+        changes = sum(counts.get(source, 0) for source in view['sources'])
+        if changes:
+            cursor.execute(
+                f"""
+                UPDATE {REFRESH_TABLE} SET pending_changes = pending_changes + %s
+                WHERE view_name = %s
+                RETURNING pending_changes
+                """,
+                (changes, name),
+            )
+            row = cursor.fetchone()
+            pending[name] = row[0] if row else changes
+    return pending
+
+
+def refresh_ranking_views(conn, min_changes=0):
+    """
+    Refresh, each in its own transaction, every ranking view with at least
+    ``min_changes`` unseen changes (any view when 0). Returns the names
+    refreshed; empty when another process is already refreshing.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(%s)", (REFRESH_LOCK_ID,))
+    if not cursor.fetchone()[0]:
+        conn.rollback()
+        return []
+
+    refreshed = []
+    try:
+        cursor.execute(
+            f"SELECT view_name, pending_changes FROM {REFRESH_TABLE} WHERE view_name = ANY(%s)",
+            (list(RANKING_VIEWS),),
+        )
+        pending = dict(cursor.fetchall())
+        conn.commit()
+        for name in RANKING_VIEWS:
+            if min_changes and pending.get(name, 0) < min_changes:
+                continue
+            try:
+                # Changes synced while the refresh runs stay counted for the next one.
+                cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}")
+                cursor.execute(
+                    f"""
+                    UPDATE {REFRESH_TABLE}
+                    SET refreshed_at = now(), pending_changes = GREATEST(pending_changes - %s, 0)
+                    WHERE view_name = %s
+                    """,
+                    (pending.get(name, 0), name),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            refreshed.append(name)
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (REFRESH_LOCK_ID,))
+        conn.commit()
+    return refreshed
@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
 
 class LibraryAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -6,3 +8,12 @@ class LibraryAppConfig(AppConfig):
     
     def ready(self):
         import library_app.signals
+        from library_app.search import create_search_index
+        from library_app.services import backfill_counters
+
+        post_migrate.connect(create_search_index, sender=self)
+        post_migrate.connect(backfill_counters, sender=self)
+
+        if getattr(settings, 'ANALYTICS_OUTBOX_AUTOSTART', False):
+            from library_app.outbox import start_outbox_worker
+            start_outbox_worker()
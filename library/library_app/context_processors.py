@@ -1,29 +1,59 @@
-from .models import UserProfile
-
-def profile_context(request):
-    if request.user.is_authenticated:
-        try:
-            profile = UserProfile.objects.get(user=request.user)
-            return {'profile': profile}
-        except UserProfile.DoesNotExist:
-            return {}
-    return {}
-
-from .models import Notification
-
-def unread_notifications(request):
-    if request.user.is_authenticated:
-        return {
-            'notifications': Notification.objects.filter(user=request.user, is_read=False).order_by('-created_at')[:5]
-        }
-    return {'notifications': []}
-
-def notifications_filter(request):
-    if request.user.is_authenticated:
-        all_notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-        unread_count = all_notifications.filter(is_read=False).count()
-        return {
-            'notifications': all_notifications,
-            'unread_count': unread_count
-        }
-    return {}
\ No newline at end of file
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, cached_property
+
+from .models import Notification, UserProfile
+
+
+class UserMenu:
+    """
+    Profile and notifications shown in the navbar of every page.
+
+    Nothing is queried until a template reads one of the attributes; then the
+    latest unread notifications come back with their owner's profile joined,
+    and with it the maintained ``unread_notifications`` counter, in a single
+    query.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def _loaded(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return None, [], 0
+
+        notifications = list(
+            Notification.objects
+            .filter(user=user, is_read=False)
+            .select_related('user__userprofile')
+            .order_by('-created_at', '-id')[:getattr(settings, 'NOTIFICATION_MENU_SIZE', 5)]
+        )
+        if notifications:
+            profile = getattr(notifications[0].user, 'userprofile', None)
+        else:
+            profile = UserProfile.objects.filter(user=user).first()
+        unread_count = profile.unread_notifications if profile else len(notifications)
+        return profile, notifications, unread_count
+
+    @property
+    def profile(self):
+        return self._loaded[0]
+
+    @property
+    def notifications(self):
+        return self._loaded[1]
+
+    @property
+    def unread_count(self):
+        return self._loaded[2]
+
+
+def user_menu(request):
+    menu = UserMenu(request)
+    return {
+        'user_menu': menu,
+        'profile': SimpleLazyObject(lambda: menu.profile),
+        'notifications': SimpleLazyObject(lambda: menu.notifications),
+        'unread_count': SimpleLazyObject(lambda: menu.unread_count),
+    }
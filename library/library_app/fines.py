@@ -0,0 +1,180 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DateTimeField, DecimalField, ExpressionWrapper, F, Func, IntegerField, Q, Value
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .models import BorrowRecord, Notification
+from .response_cache import bump_cache_version
+from .signals import analytics_sync_batch, enqueue_analytics_sync
+
+
+def _max_fine():
+    field = BorrowRecord._meta.get_field('fine')
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(10) ** -field.decimal_places
+
+
+MAX_FINE = _max_fine()
+
+
+class DaysOverdue(Func):
+    """Whole days elapsed from ``due`` to ``now``, truncated, as an integer."""
+    output_field = IntegerField()
+    template = 'CAST(EXTRACT(DAY FROM (%(expressions)s)) AS INTEGER)'
+    arg_joiner = ' - '
+
+    def __init__(self, now, due, **extra):
+        super().__init__(now, due, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context,
+        )
+
+
+def accrued_fine(now, fine_per_day=None):
+    """
+    Expression for the fine a loan has accrued by ``now``: whole days past
+    ``due_date`` times ``fine_per_day``, the same figure ``return_book``
+    charges, capped at what the ``fine`` column can hold.
+    """
+    rate = BorrowRecord.DEFAULT_FINE_PER_DAY if fine_per_day is None else Decimal(fine_per_day)
+    days = DaysOverdue(Value(now, output_field=DateTimeField()), F('due_date'))
+    fine = ExpressionWrapper(days * Value(rate), output_field=DecimalField(max_digits=12, decimal_places=2))
+    return Least(fine, Value(MAX_FINE), output_field=DecimalField(max_digits=6, decimal_places=2))
+
+
+def overdue_records(now=None):
+    """Unreturned loans at least one whole day past due (served by ``borrow_overdue_idx``)."""
+    now = now or timezone.now()
+    return BorrowRecord.objects.filter(is_returned=False, due_date__lte=now - timedelta(days=1))
+
+
+def reminder_message(title, days_overdue, fine):
+    return f"Reminder: '{title}' is {days_overdue} days overdue. Your fine so far is Rs.{fine}."
+
+
+def return_reminder_message(title, due_date):
+    return f"Reminder: Please return '{title}' by {due_date.strftime('%b %d, %Y') if due_date else 'ASAP'}."
+
+
+def assess_overdue_fines(now=None, fine_per_day=None, remind=True, batch_size=5000, dry_run=False):
+    """
+    Charge every overdue unreturned loan the fine it has accrued so far.
+
+    Loans are walked in ``(due_date, id)`` order in chunks of ``batch_size``.
+    Each chunk is one transaction: a SELECT of loans whose stored fine is
+    below the accrued one, a single UPDATE raising them, and a
+    ``bulk_create`` of one reminder per loan. Fines only ever go up, so a
+    larger fine set by an admin is kept, and running the job more than once
+    a day sends no extra reminders.
+
+    Returns:
+        dict: ``loans`` fined, ``reminders`` sent, ``total_increase`` in fines
+    """
+    from .services import recount_unread_notifications
+
+    now = now or timezone.now()
+    accrued = accrued_fine(now, fine_per_day)
+    candidates = (
+        overdue_records(now)
+        .annotate(accrued=accrued)
+        .filter(fine__lt=F('accrued'))
+        .order_by('due_date', 'id')
+    )
+    summary = {'loans': 0, 'reminders': 0, 'total_increase': Decimal('0.00')}
+
+    last = None
+    while True:
+        chunk = candidates
+        if last is not None:
+            # The plain >= bound lets the planner range-scan borrow_overdue_idx.
+            chunk = chunk.filter(Q(due_date__gt=last[0]) | Q(id__gt=last[1]), due_date__gte=last[0])
+        with transaction.atomic():
+            rows = list(chunk.values(
+                'id', 'user_id', 'due_date', 'fine', 'accrued', 'book__title',
+            )[:batch_size])
+            if not rows:
+                break
+            last = (rows[-1]['due_date'], rows[-1]['id'])
+            summary['loans'] += len(rows)
+            for row in rows:
+                row['accrued'] = Decimal(row['accrued']).quantize(Decimal('0.01'))
+                summary['total_increase'] += row['accrued'] - row['fine']
+            if dry_run:
+                continue
+
+            ids = [row['id'] for row in rows]
+            # Stamped per chunk, not with the job's ``now``: each chunk commits
+            # on its own and must not land behind the incremental sync's watermark.
+            BorrowRecord.objects.filter(pk__in=ids).update(fine=accrued, updated_at=timezone.now())
+            with analytics_sync_batch():
+                for pk in ids:
+                    enqueue_analytics_sync('borrowing', pk)
+
+            if remind:
+                Notification.objects.bulk_create([
+                    Notification(
+                        user_id=row['user_id'],
+                        created_at=now,
+                        message=reminder_message(
+                            row['book__title'], (now - row['due_date']).days, row['accrued'],
+                        ),
+                    )
+                    for row in rows
+                ])
+                # bulk_create skips the signals that maintain the counters.
+                recount_unread_notifications({row['user_id'] for row in rows})
+                summary['reminders'] += len(rows)
+            bump_cache_version('borrowings')
+        if len(rows) < batch_size:
+            break
+    return summary
+
+
+def send_return_reminders(records, batch_size=1000):
+    """
+    Remind the borrower of every unreturned loan in ``records`` to return it:
+    one SELECT, ``bulk_create`` in ``batch_size`` inserts, and a set-based
+    recount of the affected unread counters.
+
+    Returns:
+        int: Reminders sent
+    """
+    from .services import recount_unread_notifications
+
+    rows = list(records.filter(is_returned=False).values('user_id', 'due_date', 'book__title'))
+    if not rows:
+        return 0
+    with transaction.atomic():
+        Notification.objects.bulk_create([
+            Notification(user_id=row['user_id'], message=return_reminder_message(row['book__title'], row['due_date']))
+            for row in rows
+        ], batch_size=batch_size)
+        recount_unread_notifications({row['user_id'] for row in rows})
+    return len(rows)
+
+
+def set_fines(records, amount):
+    """
+    Set the fine of every loan in ``records`` to ``amount`` with one UPDATE.
+
+    Returns:
+        int: Loans updated
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(records.values_list('pk', flat=True))
+        if not ids:
+            return 0
+        updated = records.order_by().update(fine=amount, updated_at=now)
+        with analytics_sync_batch():
+            for pk in ids:
+                enqueue_analytics_sync('borrowing', pk)
+        bump_cache_version('borrowings')
+    return updated
@@ -0,0 +1,191 @@
+import csv
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from library_app.analytics_cache import invalidate_analytics_cache
+from library_app.analytics_rollups import ROLLUP_TABLE, rebuild_rollups
+from library_app.analytics_sync import ANALYTICS_TABLES, naive_utc, sync_handler
+from library_app.analytics_views import refresh_ranking_views
+from library_app.models import Book, BookCategory, BorrowRecord, Review
+
+
+def _blank_profile(row):
+    # Users without a profile sync with empty strings, like upsert_user does.
+    return row[:8] + tuple(value or '' for value in row[8:])
+
+
+def _blank_cover(row):
+    return row[:7] + (row[7] or None,)
+
+
+# Source rows for each analytics table, listed in ANALYTICS_TABLES column order.
+BACKFILL_SOURCES = {
+    'user': (
+        lambda: User.objects.values_list(
+            'id', 'username', 'email', 'first_name', 'last_name', 'is_staff',
+            'is_active', 'date_joined', 'userprofile__full_name',
+            'userprofile__address', 'userprofile__phone',
+        ),
+        _blank_profile,
+    ),
+    'category': (lambda: BookCategory.objects.values_list('id', 'name'), None),
+    'book': (
+        lambda: Book.objects.values_list(
+            'id', 'title', 'author', 'isbn', 'total_copies', 'available_copies',
+            'category_id', 'cover_image',
+        ),
+        _blank_cover,
+    ),
+    'borrowing': (
+        lambda: BorrowRecord.objects.values_list(
+            'id', 'user_id', 'book_id', 'borrow_date', 'due_date', 'return_date',
+            'is_returned', 'fine',
+        ),
+        None,
+    ),
+    'review': (
+        lambda: Review.objects.values_list(
+            'id', 'user_id', 'book_id', 'rating', 'content', 'created_at',
+        ),
+        None,
+    ),
+}
+
+# Tables in the same wave have no foreign keys between them and load in parallel.
+BACKFILL_WAVES = (('user', 'category'), ('book',), ('borrowing', 'review'))
+
+NULL = r'\N'
+
+
+class Command(BaseCommand):
+    help = (
+        "Reseed the PostgreSQL analytics database from the library database using "
+        "COPY into staging tables followed by a set-based upsert."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', nargs='+', choices=list(BACKFILL_SOURCES), help="Only backfill these tables.")
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Rows read and copied per chunk.")
+        parser.add_argument('--workers', type=int, default=2, help="Tables loaded in parallel within a wave.")
+
+    def handle(self, *args, **options):
+        if not sync_handler.enabled:
+            raise CommandError("ENABLE_ANALYTICS_SYNC is off; nothing to backfill.")
+
+        self.chunk_size = options['chunk_size']
+        self._output_lock = threading.Lock()
+        selected = set(options['tables'] or BACKFILL_SOURCES)
+        workers = max(1, min(options['workers'], sync_handler.pool.maxconn))
+
+        sync_handler.ensure_tables_exist()
+
+        started = time.monotonic()
+        results = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for wave in BACKFILL_WAVES:
+                keys = [key for key in wave if key in selected]
+                results.extend(executor.map(self.backfill_table, keys))
+        if selected & {'book', 'borrowing'}:
+            results.append(self.rebuild_rollups())
+        with sync_handler.connection() as conn:
+            if conn:
+                refresh_ranking_views(conn)
+        elapsed = time.monotonic() - started
+        invalidate_analytics_cache()
+
+        self.stdout.write("")
+        self.stdout.write(f"{'table':<28}{'rows':>12}{'seconds':>10}{'rows/s':>12}")
+        for table, rows, seconds in results:
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(f"{table:<28}{rows:>12,}{seconds:>10.1f}{rate:>12,.0f}")
+        total_rows = sum(rows for _, rows, _ in results)
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {total_rows:,} rows in {elapsed:.1f}s ({total_rows / elapsed if elapsed else 0:,.0f} rows/s)"
+        ))
+
+    def progress(self, message):
+        with self._output_lock:
+            self.stdout.write(message)
+
+    def rebuild_rollups(self):
+        # The bulk load bypasses the per-batch rollup refresh in sync_instances.
+        started = time.monotonic()
+        with sync_handler.connection() as conn:
+            if not conn:
+                raise CommandError("Analytics database is unavailable")
+            cursor = conn.cursor()
+            try:
+                rows = rebuild_rollups(cursor)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        seconds = time.monotonic() - started
+        self.progress(f"  {ROLLUP_TABLE}: {rows:,} rows rebuilt")
+        return ROLLUP_TABLE, rows, seconds
+
+    def backfill_table(self, key):
+        table, columns = ANALYTICS_TABLES[key]
+        source, transform = BACKFILL_SOURCES[key]
+        staging = f"backfill_{table}"
+        column_list = ', '.join(columns)
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns if column != 'id')
+
+        started = time.monotonic()
+        rows = 0
+        try:
+            with sync_handler.connection() as conn:
+                if not conn:
+                    raise CommandError("Analytics database is unavailable")
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                pending = 0
+                queryset = source().order_by('pk').iterator(chunk_size=self.chunk_size)
+                for row in queryset:
+                    if transform:
+                        row = transform(row)
+                    # Naive UTC, exactly as the sync's row builders write them.
+                    writer.writerow([NULL if value is None else naive_utc(value) for value in row])
+                    pending += 1
+                    if pending == self.chunk_size:
+                        rows += self.copy_chunk(cursor, staging, column_list, buffer, pending)
+                        pending = 0
+                        elapsed = time.monotonic() - started
+                        self.progress(f"  {table}: {rows:,} rows copied ({rows / elapsed:,.0f} rows/s)")
+                if pending:
+                    rows += self.copy_chunk(cursor, staging, column_list, buffer, pending)
+
+                cursor.execute(f"""
+                    INSERT INTO {table} ({column_list})
+                    SELECT {column_list} FROM {staging}
+                    ON CONFLICT (id) DO UPDATE SET {updates}
+                """)
+                conn.commit()
+        finally:
+            # Each worker thread has its own library database connection.
+            connection.close()
+
+        seconds = time.monotonic() - started
+        self.progress(f"  {table}: done, {rows:,} rows upserted in {seconds:.1f}s")
+        return table, rows, seconds
+
+    def copy_chunk(self, cursor, staging, column_list, buffer, count):
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '{NULL}')",
+            buffer,
+        )
+        buffer.seek(0)
+        buffer.truncate()
+        return count
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library_app.incremental_sync import IncrementalSync
+
+
+class Command(BaseCommand):
+    help = "Ship rows changed since the last watermark to the PostgreSQL analytics database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=30, help="Seconds between runs with --loop.")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows fetched and shipped per chunk.")
+
+    def handle(self, *args, **options):
+        sync = IncrementalSync(chunk_size=options['chunk_size'])
+        try:
+            while True:
+                results = sync.run()
+                for table, result in results.items():
+                    self.stdout.write(f"{table:<12}{result['rows']:>10} rows   lag {result['lag_seconds']:.1f}s")
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
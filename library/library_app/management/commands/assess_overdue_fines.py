@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library_app.fines import assess_overdue_fines
+
+
+class Command(BaseCommand):
+    help = "Charge accrued fines on every overdue loan and remind the borrowers. Run it daily (cron/systemd timer)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Loans fined per transaction.")
+        parser.add_argument('--no-reminders', action='store_true', help="Update fines without notifying borrowers.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        summary = assess_overdue_fines(
+            remind=not options['no_reminders'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        elapsed = time.perf_counter() - started
+        verb = "Would fine" if options['dry_run'] else "Fined"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['loans']} overdue loan(s) (+Rs.{summary['total_increase']}), "
+            f"sent {summary['reminders']} reminder(s) in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from library_app.analytics_sync import sync_handler
+from library_app.models import AnalyticsOutbox
+from library_app.outbox import OutboxDrainer
+
+
+class Command(BaseCommand):
+    help = "Ship pending analytics outbox rows to the PostgreSQL analytics database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain what is due and exit instead of polling.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Outbox rows shipped per analytics transaction.")
+        parser.add_argument(
+            '--interval', type=float, default=getattr(settings, 'ANALYTICS_OUTBOX_POLL_INTERVAL', 5),
+            help="Seconds to sleep between polls (default: ANALYTICS_OUTBOX_POLL_INTERVAL).",
+        )
+        parser.add_argument('--requeue-dead', action='store_true', help="Give dead rows a fresh set of attempts first.")
+
+    def handle(self, *args, **options):
+        drainer = OutboxDrainer(batch_size=options['batch_size'])
+
+        if options['requeue_dead']:
+            requeued = AnalyticsOutbox.objects.filter(dead_at__isnull=False).update(
+                dead_at=None, attempts=0, next_attempt_at=timezone.now(),
+            )
+            self.stdout.write(f"Requeued {requeued} dead outbox rows")
+
+        if options['once']:
+            shipped = drainer.drain()
+            self.stdout.write(self.style.SUCCESS(f"Shipped {shipped} outbox rows"))
+            self.report_pool_stats(options['verbosity'])
+            return
+
+        self.stdout.write(f"Draining analytics outbox every {options['interval']}s (Ctrl+C to stop)")
+        try:
+            while True:
+                shipped = drainer.drain()
+                if shipped:
+                    self.stdout.write(f"Shipped {shipped} outbox rows")
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
+            self.report_pool_stats(options['verbosity'])
+
+    def report_pool_stats(self, verbosity):
+        if verbosity >= 2:
+            for key, value in sync_handler.pool.stats().items():
+                self.stdout.write(f"  pool.{key} = {value}")
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from library_app.analytics_cache import invalidate_analytics_cache
+from library_app.analytics_rollups import rebuild_rollups, rollup_drift
+from library_app.analytics_sync import sync_handler
+from library_app.analytics_views import refresh_ranking_views
+
+
+class Command(BaseCommand):
+    help = "Recompute the analytics daily activity rollups from the synced borrow records."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report rollup rows that disagree with the raw rows.")
+
+    def handle(self, *args, **options):
+        if not sync_handler.enabled:
+            raise CommandError("ENABLE_ANALYTICS_SYNC is off; no analytics database to rebuild.")
+
+        sync_handler.ensure_tables_exist()
+        with sync_handler.connection() as conn:
+            if not conn:
+                raise CommandError("Analytics database is unavailable.")
+            cursor = conn.cursor()
+            if options['check']:
+                drift = rollup_drift(cursor)
+                conn.rollback()
+                for table, day, key in drift:
+                    self.stdout.write(f"{table}: {day} {key}")
+                if drift:
+                    raise CommandError(f"{len(drift)} rollup row(s) drifted; run without --check to rebuild.")
+                self.stdout.write(self.style.SUCCESS("Rollup matches the borrow records"))
+                return
+            try:
+                rows = rebuild_rollups(cursor)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            # The borrowings ranking is summed from the rollup.
+            refresh_ranking_views(conn)
+        invalidate_analytics_cache({'borrowings'})
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows:,} daily book rollup row(s)"))
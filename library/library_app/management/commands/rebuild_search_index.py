@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from library_app.search import ensure_search_index
+
+
+class Command(BaseCommand):
+    help = "Drop and rebuild the book full-text search index from the books table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database alias to rebuild.")
+
+    def handle(self, *args, **options):
+        if not ensure_search_index(options['database'], rebuild=True):
+            raise CommandError("Indexed search is not available on this database; searches use icontains.")
+        self.stdout.write(self.style.SUCCESS("Book search index rebuilt"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from library_app.services import recount_borrow_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute Book.borrow_count/active_borrow_count from borrow records, fixing any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('book_ids', nargs='*', type=int, help="Only check these books (default: all).")
+
+    def handle(self, *args, **options):
+        repaired = recount_borrow_counts(options['book_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Repaired borrow counters on {repaired} book(s)"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from library_app.services import recount_unread_notifications
+
+
+class Command(BaseCommand):
+    help = "Recompute UserProfile.unread_notifications from notifications, fixing any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help="Only check these users (default: all).")
+
+    def handle(self, *args, **options):
+        repaired = recount_unread_notifications(options['user_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Repaired unread counters on {repaired} profile(s)"))
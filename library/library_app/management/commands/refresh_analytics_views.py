@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library_app.analytics_cache import invalidate_analytics_cache
+from library_app.analytics_sync import sync_handler
+from library_app.analytics_views import RANKING_VIEWS, refresh_ranking_views
+
+
+class Command(BaseCommand):
+    help = "Refresh the analytics top-books materialized views concurrently."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-changes', type=int, default=0, help="Only refresh views with at least this many unseen changes.")
+        parser.add_argument('--loop', action='store_true', help="Keep running every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=300, help="Seconds between runs with --loop.")
+
+    def handle(self, *args, **options):
+        if not sync_handler.enabled:
+            raise CommandError("ENABLE_ANALYTICS_SYNC is off; no analytics database to refresh.")
+
+        sync_handler.ensure_tables_exist()
+        try:
+            while True:
+                started = time.monotonic()
+                with sync_handler.connection() as conn:
+                    if not conn:
+                        raise CommandError("Analytics database is unavailable.")
+                    refreshed = refresh_ranking_views(conn, min_changes=options['min_changes'])
+                if refreshed:
+                    invalidate_analytics_cache({RANKING_VIEWS[name]['namespace'] for name in refreshed})
+                self.stdout.write(
+                    f"Refreshed {', '.join(refreshed) or 'nothing'} in {time.monotonic() - started:.2f}s"
+                )
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from library_app.services import recount_book_rating
+
+
+class Command(BaseCommand):
+    help = "Recompute Book.rating_sum/rating_count/rating_average from reviews, fixing any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('book_ids', nargs='*', type=int, help="Only check these books (default: all).")
+
+    def handle(self, *args, **options):
+        repaired = recount_book_rating(options['book_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Repaired rating aggregates on {repaired} book(s)"))
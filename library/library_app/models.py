@@ -1,6 +1,6 @@
 import random
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator, MinValueValidator
@@ -9,6 +9,7 @@ from django.core.validators import RegexValidator, MinValueValidator
 
 class BookCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -39,28 +40,57 @@ class Book(models.Model):
         ],
     )
     cover_image = models.ImageField(upload_to='book_covers/', blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Denormalized review aggregates, kept in step by the Review signals and
+    # rebuilt by `manage.py repair_book_ratings`.
+    rating_sum = models.IntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.FloatField(null=True, blank=True, editable=False)
+    # Borrow counters, kept in step by services.take_copy/put_back_copy and
+    # rebuilt by `manage.py reconcile_borrow_counts`.
+    borrow_count = models.PositiveIntegerField(default=0, editable=False)
+    active_borrow_count = models.PositiveIntegerField(default=0, editable=False)
+
+    DENORMALIZED_FIELDS = (
+        'rating_sum', 'rating_count', 'rating_average', 'borrow_count', 'active_borrow_count',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating_average', '-rating_count', 'id'], name='book_rating_idx'),
+            models.Index(fields=['-borrow_count', 'id'], name='book_popularity_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.author}"
 
+    def save(self, *args, **kwargs):
+        # The rating and borrow counters are maintained with UPDATEs elsewhere;
+        # never write back a copy that may have gone stale since this instance was loaded.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def borrow(self):
-        if self.available_copies < 1:
+        from .services import take_copy
+        if not take_copy(self.pk):
             raise ValueError("No copies available.")
-        self.available_copies -= 1
-        self.save()
+        self.refresh_from_db(fields=['available_copies', 'updated_at'])
 
     def return_copy(self):
-        if self.available_copies >= self.total_copies:
+        from .services import put_back_copy
+        if not put_back_copy(self.pk):
             raise ValueError("All copies are already returned.")
-        self.available_copies += 1
-        self.save()
+        self.refresh_from_db(fields=['available_copies', 'updated_at'])
 
     @property
     def average_rating(self):
-        reviews = self.reviews.all()
-        if not reviews:
+        if not self.rating_count:
             return None
-        return round(sum(r.rating for r in reviews) / len(reviews), 1)
+        return round(self.rating_average, 1)
     
 
 
@@ -69,11 +99,25 @@ class UserProfile(models.Model):
     full_name = models.CharField(max_length=150)
     address = models.TextField()
     phone = models.CharField(max_length=13)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     # is_admin = models.BooleanField(default=False)
+    unread_notifications = models.PositiveIntegerField(default=0, editable=False)
+
+    DENORMALIZED_FIELDS = ('unread_notifications',)
 
     def __str__(self):
         return self.user.username
 
+    def save(self, *args, **kwargs):
+        # unread_notifications is maintained with UPDATEs elsewhere; a full
+        # save of a stale instance must not write its old value back.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def is_admin(self):
         return self.user.username == 'admin'
@@ -99,6 +143,24 @@ class BorrowRecord(models.Model):
     is_returned = models.BooleanField(default=False)
     due_date = models.DateTimeField(null=True, blank=True)
     fine = models.DecimalField(max_digits=6, decimal_places=2, default=0.00, validators=[MinValueValidator(Decimal('0.00'))])
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            # A user can hold at most one open loan of the same book.
+            models.UniqueConstraint(
+                fields=['user', 'book'],
+                condition=models.Q(is_returned=False),
+                name='unique_active_borrow',
+            ),
+        ]
+        indexes = [
+            # Keyset pagination orderings for the borrowing lists
+            models.Index(fields=['-borrow_date', '-id'], name='borrow_recent_idx'),
+            models.Index(fields=['user', '-borrow_date', '-id'], name='borrow_user_recent_idx'),
+            # Overdue scans: the fines job and the admin "overdue" filter
+            models.Index(fields=['is_returned', 'due_date'], name='borrow_overdue_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} borrowed {self.book.title}"
@@ -109,27 +171,8 @@ class BorrowRecord(models.Model):
         super().save(*args, **kwargs)
 
     def return_book(self):
-        if self.is_returned:
-            raise ValueError("Already returned.")
-
-        self.book.return_copy()
-        self.is_returned = True
-        self.return_date = timezone.now()
-
-        if self.due_date and self.return_date > self.due_date:
-            days_overdue = (self.return_date - self.due_date).days
-            if days_overdue > 0:
-                self.fine = self.DEFAULT_FINE_PER_DAY * Decimal(days_overdue)
-                Notification.objects.create(
-                    user=self.user,
-                    message=f"You were {days_overdue} days late returning '{self.book.title}'. A fine of Rs.{self.fine} has been added."
-                )
-            else:
-                self.fine = Decimal('0.00')
-        else:
-            self.fine = Decimal('0.00')
-
-        self.save()
+        from .services import return_book
+        return_book(self)
 
 
 class Review(models.Model):
@@ -138,13 +181,30 @@ class Review(models.Model):
     content = models.TextField(blank=True)  
     rating = models.IntegerField() 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('user', 'book')  
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='review_recent_idx'),
+            models.Index(fields=['book', '-created_at', '-id'], name='review_book_recent_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} rated {self.book.title} ⭐{self.rating}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the book's rating aggregates currently include.
+        instance._counted_rating = (instance.__dict__.get('book_id'), instance.__dict__.get('rating'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The post_save receiver adjusts Book.rating_*; keep both in one transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 
 class Notification(models.Model):
@@ -153,5 +213,57 @@ class Notification(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Notification for {self.user.username}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the user's unread counter currently reflects for this row.
+        instance._counted_state = (instance.__dict__.get('user_id'), instance.__dict__.get('is_read'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The post_save receiver adjusts UserProfile.unread_notifications; keep both in one transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class AnalyticsOutbox(models.Model):
+    """
+    Pending analytics sync work, written in the same transaction as the change
+    it describes and shipped to PostgreSQL later by the outbox drainer. Rows
+    that keep failing are marked dead (``dead_at``) and left for an operator.
+    """
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    dead_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at', 'id'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Outbox {self.model}:{self.object_id} (attempts={self.attempts}{', dead' if self.dead_at else ''})"
+
+
+class AnalyticsSyncWatermark(models.Model):
+    """Position of the incremental analytics sync in one table, as (updated_at, id)."""
+    table = models.CharField(max_length=20, unique=True)
+    last_updated_at = models.DateTimeField(null=True, blank=True)
+    last_id = models.BigIntegerField(default=0)
+    lag_seconds = models.FloatField(default=0)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+
     def __str__(self):
-        return f"Notification for {self.user.username}"
\ No newline at end of file
+        return f"Watermark {self.table}: {self.last_updated_at} #{self.last_id}"
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+
+QUEUE_SIZE = 100
+
+
+def notification_payload(notification):
+    return {
+        'id': notification.id,
+        'message': notification.message,
+        'created_at': notification.created_at.isoformat(),
+        'is_read': notification.is_read,
+    }
+
+
+class NotificationBroker:
+    """
+    In-process fan-out of new notifications to the streams connected to this
+    worker, one bounded queue per open stream, keyed by user.
+
+    ``publish`` is called from sync code (request threads, management
+    commands) and hands each payload to the subscriber's event loop. Streams
+    on other worker processes never see it here; they pick the row up from
+    the database on their next heartbeat instead, as they do for anything a
+    full queue had to drop.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        queue.loop = asyncio.get_running_loop()
+        with self.lock:
+            self.subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self.lock:
+            queues = self.subscribers.get(user_id)
+            if queues is None:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def publish(self, user_id, payload):
+        with self.lock:
+            queues = list(self.subscribers.get(user_id, ()))
+        for queue in queues:
+            try:
+                queue.loop.call_soon_threadsafe(self._put, queue, payload)
+            except RuntimeError:
+                # The stream's loop has already shut down.
+                self.unsubscribe(user_id, queue)
+
+    @staticmethod
+    def _put(queue, payload):
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            pass
+
+    def connection_count(self):
+        with self.lock:
+            return sum(len(queues) for queues in self.subscribers.values())
+
+
+broker = NotificationBroker()
@@ -0,0 +1,205 @@
+import logging
+import random
+import threading
+from datetime import timedelta
+
+import psycopg2
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .analytics_sync import PoolTimeout, sync_handler
+from .models import AnalyticsOutbox, Book, BookCategory, BorrowRecord, Review
+
+
+logger = logging.getLogger(__name__)
+
+# How each outbox ``model`` key is loaded back from the library database.
+OUTBOX_QUERYSETS = {
+    'user': lambda: User.objects.select_related('userprofile'),
+    'category': lambda: BookCategory.objects.all(),
+    'book': lambda: Book.objects.select_related('category'),
+    'borrowing': lambda: BorrowRecord.objects.select_related('book__category'),
+    'review': lambda: Review.objects.all(),
+}
+
+# Failures that say nothing about the rows in the batch: the whole batch is
+# retried later instead of being split up to find a bad row.
+UNAVAILABLE_ERRORS = (ConnectionError, PoolTimeout, psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class OutboxDrainer:
+    """
+    Ships pending ``AnalyticsOutbox`` rows to PostgreSQL in batches.
+
+    A batch is claimed first: its rows are locked with ``SKIP LOCKED`` and
+    leased for ``ANALYTICS_OUTBOX_CLAIM_SECONDS``, so drainers in other
+    processes (the autostarted workers, the management command) pick
+    different rows instead of shipping the same ones concurrently. A drainer
+    that dies mid-batch only delays its rows until the lease runs out.
+
+    Rows are deleted only after the analytics transaction commits, so every
+    change is delivered at least once. Upserts are idempotent and always read
+    the current row, so re-delivery is harmless. A batch that fails while the
+    analytics database is reachable is retried row by row, so one bad row
+    cannot hold back the rest. Failed rows are retried with exponential
+    backoff, and marked dead after ``ANALYTICS_OUTBOX_MAX_ATTEMPTS``.
+    """
+
+    def __init__(self, batch_size=None, handler=sync_handler):
+        self.batch_size = batch_size or getattr(settings, 'ANALYTICS_OUTBOX_BATCH_SIZE', 500)
+        self.backoff_base = getattr(settings, 'ANALYTICS_OUTBOX_BACKOFF_BASE', 2)
+        self.backoff_max = getattr(settings, 'ANALYTICS_OUTBOX_BACKOFF_MAX', 300)
+        self.claim_seconds = getattr(settings, 'ANALYTICS_OUTBOX_CLAIM_SECONDS', 300)
+        self.max_attempts = getattr(settings, 'ANALYTICS_OUTBOX_MAX_ATTEMPTS', 10)
+        self.handler = handler
+        self._tables_ensured = False
+
+    def backoff(self, attempts):
+        """Seconds to wait before retrying a batch that has failed ``attempts`` times."""
+        delay = min(self.backoff_max, self.backoff_base ** attempts)
+        return delay * random.uniform(0.5, 1.0)
+
+    def claim(self):
+        """Lock, lease and return up to ``batch_size`` due outbox rows no other drainer holds."""
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                AnalyticsOutbox.objects
+                .select_for_update(skip_locked=True)
+                .filter(next_attempt_at__lte=now, dead_at__isnull=True)
+                .order_by('id')[:self.batch_size]
+            )
+            if rows:
+                AnalyticsOutbox.objects.filter(id__in=[row.id for row in rows]).update(
+                    next_attempt_at=now + timedelta(seconds=self.claim_seconds),
+                )
+        return rows
+
+    def drain_once(self):
+        """
+        Ship one batch of due outbox rows.
+
+        Returns:
+            int: Number of outbox rows delivered (0 when nothing was due or the batch failed)
+        """
+        rows = self.claim()
+        if not rows:
+            return 0
+
+        if not self._tables_ensured:
+            self.handler.ensure_tables_exist()
+            self._tables_ensured = True
+
+        try:
+            self.ship(rows)
+        except UNAVAILABLE_ERRORS as e:
+            logger.error(f"Failed to ship {len(rows)} outbox rows to analytics database: {e}")
+            self.reschedule(rows, e)
+            return 0
+        except Exception as e:
+            if len(rows) == 1:
+                logger.error(f"Failed to ship outbox row {rows[0]}: {e}")
+                self.reschedule(rows, e)
+                return 0
+            logger.warning(f"Failed to ship {len(rows)} outbox rows ({e}); retrying them one by one")
+            return self.ship_each(rows)
+
+        logger.info(f"Shipped {len(rows)} outbox rows to analytics database")
+        return len(rows)
+
+    def ship(self, rows):
+        self.handler.sync_instances(self.load_instances(rows))
+        AnalyticsOutbox.objects.filter(id__in=[row.id for row in rows]).delete()
+
+    def ship_each(self, rows):
+        """Ship ``rows`` one at a time, rescheduling only the ones that fail."""
+        shipped = 0
+        for index, row in enumerate(rows):
+            try:
+                self.ship([row])
+            except UNAVAILABLE_ERRORS as e:
+                logger.error(f"Analytics database became unavailable: {e}")
+                self.reschedule(rows[index:], e)
+                break
+            except Exception as e:
+                logger.error(f"Failed to ship outbox row {row}: {e}")
+                self.reschedule([row], e)
+            else:
+                shipped += 1
+        logger.info(f"Shipped {shipped} of {len(rows)} outbox rows to analytics database one by one")
+        return shipped
+
+    def drain(self):
+        """Drain until no due rows remain or a batch fails."""
+        total = 0
+        while True:
+            shipped = self.drain_once()
+            if not shipped:
+                return total
+            total += shipped
+
+    def load_instances(self, rows):
+        """Load the current state of every object referenced by ``rows``, one query per model."""
+        ids_by_model = {}
+        for row in rows:
+            ids_by_model.setdefault(row.model, set()).add(row.object_id)
+
+        instances = {}
+        for model, ids in ids_by_model.items():
+            queryset = OUTBOX_QUERYSETS.get(model)
+            if queryset is None:
+                logger.warning(f"Dropping outbox rows for unknown model '{model}'")
+                continue
+            # Objects deleted since they were enqueued simply drop out here.
+            instances[model] = list(queryset().filter(pk__in=ids).order_by('pk'))
+        return instances
+
+    def reschedule(self, rows, error):
+        now = timezone.now()
+        for row in rows:
+            row.attempts += 1
+            row.next_attempt_at = now + timedelta(seconds=self.backoff(row.attempts))
+            row.last_error = str(error)[:1000]
+            if row.attempts >= self.max_attempts:
+                row.dead_at = now
+                logger.error(f"Giving up on outbox row {row} after {row.attempts} attempts: {error}")
+        AnalyticsOutbox.objects.bulk_update(rows, ['attempts', 'next_attempt_at', 'last_error', 'dead_at'])
+
+
+class OutboxWorker(threading.Thread):
+    """Background thread that keeps draining the outbox until stopped."""
+
+    def __init__(self, interval=None, batch_size=None):
+        super().__init__(name='analytics-outbox-worker', daemon=True)
+        self.interval = interval or getattr(settings, 'ANALYTICS_OUTBOX_POLL_INTERVAL', 5)
+        self.drainer = OutboxDrainer(batch_size=batch_size)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            close_old_connections()
+            try:
+                self.drainer.drain()
+            except Exception as e:
+                logger.error(f"Analytics outbox worker iteration failed: {e}")
+            self._stop_event.wait(self.interval)
+        close_old_connections()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_outbox_worker():
+    """Start the in-process outbox worker once per process."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = OutboxWorker()
+            _worker.start()
+    return _worker
@@ -0,0 +1,105 @@
+import functools
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'response_cache:version:{}'
+ENTRY_KEY = 'response_cache:entry:{}'
+LOCK_KEY = 'response_cache:lock:{}'
+
+
+def bump_cache_version(*namespaces):
+    """
+    Invalidate every cached response that depends on ``namespaces``
+    ('books', 'reviews', 'borrowings', 'categories').
+
+    The bump runs after the current transaction commits, so a request that
+    recomputes in between cannot store pre-commit data under the new
+    version. Versions are timestamps rather than counters so an evicted
+    version key can never come back with a value that was already used.
+    """
+    def bump():
+        version = time.time_ns()
+        cache.set_many({VERSION_KEY.format(name): version for name in namespaces}, timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def current_version(namespaces):
+    keys = [VERSION_KEY.format(name) for name in namespaces]
+    versions = cache.get_many(keys)
+    return tuple(versions.get(key, 0) for key in keys)
+
+
+def get_or_compute(name, compute, ttl, depends_on):
+    """
+    Return the cached value for ``name``, recomputing it with ``compute()``
+    when it is older than ``ttl`` seconds or any of ``depends_on`` changed.
+
+    Stale-while-revalidate: the first request to find a stale entry takes a
+    short lock and recomputes; concurrent requests keep serving the stale
+    value meanwhile. On a cold cache the others wait for the lock holder
+    instead of all recomputing at once.
+    """
+    version = current_version(depends_on)
+    entry_key = ENTRY_KEY.format(name)
+    entry = cache.get(entry_key)
+    if entry and entry['version'] == version and entry['fresh_until'] > time.time():
+        return entry['value']
+
+    lock_key = LOCK_KEY.format(name)
+    lock_seconds = getattr(settings, 'RESPONSE_CACHE_LOCK_SECONDS', 10)
+    if not cache.add(lock_key, 1, timeout=lock_seconds):
+        if entry:
+            return entry['value']
+        deadline = time.monotonic() + lock_seconds
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(entry_key)
+            if entry:
+                return entry['value']
+        logger.warning(f"Timed out waiting for {name} to be recomputed; computing it here")
+
+    try:
+        value = compute()
+        stale_seconds = getattr(settings, 'RESPONSE_CACHE_STALE_SECONDS', 300)
+        cache.set(
+            entry_key,
+            {'value': value, 'version': version, 'fresh_until': time.time() + ttl},
+            timeout=ttl + stale_seconds,
+        )
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def cache_response(name, depends_on):
+    """
+    Cache the data of an APIView ``get`` that is identical for every visitor.
+
+    The TTL comes from ``RESPONSE_CACHE_TTLS[name]``; a missing or zero TTL
+    disables caching for that endpoint.
+
+        @cache_response('home_stats', depends_on=('books', 'borrowings'))
+        def get(self, request):
+            ...
+    """
+    def decorator(get):
+        @functools.wraps(get)
+        def wrapper(view, request, *args, **kwargs):
+            ttl = getattr(settings, 'RESPONSE_CACHE_TTLS', {}).get(name)
+            if not ttl:
+                return get(view, request, *args, **kwargs)
+            data = get_or_compute(
+                name, lambda: get(view, request, *args, **kwargs).data, ttl, depends_on,
+            )
+            return Response(data)
+        return wrapper
+    return decorator
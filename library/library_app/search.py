@@ -0,0 +1,201 @@
+import logging
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import IntegerField, Q
+from django.db.models.expressions import RawSQL
+
+
+logger = logging.getLogger(__name__)
+
+BOOK_TABLE = 'library_app_book'
+FTS_TABLE = 'library_app_book_fts'
+
+# PostgreSQL indexes the same expressions the queries below filter on, so the
+# planner can use them; keep the two in sync.
+PG_DOCUMENT = "(title || ' ' || author)"
+PG_VECTOR = f"to_tsvector('simple', {PG_DOCUMENT})"
+
+SQLITE_SCHEMA = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author,
+        content='{BOOK_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {BOOK_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {BOOK_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, author ON {BOOK_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO {FTS_TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END""",
+)
+
+POSTGRES_SCHEMA = (
+    f"CREATE INDEX IF NOT EXISTS book_search_tsv_idx ON {BOOK_TABLE} USING gin ({PG_VECTOR})",
+)
+
+# Typo-tolerant fallback; skipped when the pg_trgm extension is not installed.
+POSTGRES_TRIGRAM_SCHEMA = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS book_search_trgm_idx ON {BOOK_TABLE} USING gin ({PG_DOCUMENT} gin_trgm_ops)",
+)
+
+_available = {}
+_trigram = {}
+
+
+def tokenize(term):
+    """Split a search term into word tokens; punctuation is dropped so it cannot break query syntax."""
+    return re.findall(r'\w+', term.lower())
+
+
+def ensure_search_index(using='default', rebuild=False):
+    """
+    Create the book search index for the ``using`` database if it is missing.
+
+    SQLite gets an FTS5 external-content table kept in sync by triggers, so
+    every write path (save, update(), raw SQL) is covered. PostgreSQL gets
+    GIN expression indexes for tsvector and trigram matching, which the
+    database maintains itself. Other backends fall back to ``icontains``.
+
+    Returns:
+        bool: Whether indexed search is available on this database
+    """
+    connection = connections[using]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                existed = FTS_TABLE in connection.introspection.table_names(cursor)
+                if rebuild and existed:
+                    cursor.execute(f"DROP TABLE {FTS_TABLE}")
+                    existed = False
+                for statement in SQLITE_SCHEMA:
+                    cursor.execute(statement)
+                if not existed:
+                    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            elif connection.vendor == 'postgresql':
+                for statement in POSTGRES_SCHEMA:
+                    cursor.execute(statement)
+                if rebuild:
+                    cursor.execute("REINDEX INDEX book_search_tsv_idx")
+                try:
+                    with transaction.atomic(using=using):
+                        for statement in POSTGRES_TRIGRAM_SCHEMA:
+                            cursor.execute(statement)
+                        if rebuild:
+                            cursor.execute("REINDEX INDEX book_search_trgm_idx")
+                    _trigram[using] = True
+                except DatabaseError as e:
+                    logger.info(f"pg_trgm unavailable, book search will not correct typos: {e}")
+                    _trigram[using] = False
+            else:
+                _available[using] = False
+                return False
+    except DatabaseError as e:
+        # e.g. SQLite built without FTS5, or no permission to create pg_trgm
+        logger.warning(f"Book search index unavailable, falling back to icontains: {e}")
+        _available[using] = False
+        return False
+    _available[using] = True
+    return True
+
+
+def search_available(using='default'):
+    if using not in _available:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                _available[using] = FTS_TABLE in connection.introspection.table_names(cursor)
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT indexname FROM pg_indexes WHERE indexname IN "
+                    "('book_search_tsv_idx', 'book_search_trgm_idx')"
+                )
+                indexes = {row[0] for row in cursor.fetchall()}
+                _available[using] = 'book_search_tsv_idx' in indexes
+                _trigram[using] = 'book_search_trgm_idx' in indexes
+            else:
+                _available[using] = False
+    return _available[using]
+
+
+def ranked_book_ids(term, limit=None, using='default'):
+    """
+    Ids of books matching ``term``, best match first.
+
+    Every token must match the start of a word in the title or author, so
+    partial input works for typeahead ("harr pot" finds "Harry Potter").
+    Title matches outrank author matches. On PostgreSQL, a query with no
+    word matches falls back to trigram similarity (pg_trgm) to tolerate typos.
+    """
+    tokens = tokenize(term)
+    if not tokens:
+        return []
+    limit = limit or getattr(settings, 'BOOK_SEARCH_MAX_RESULTS', 200)
+    connection = connections[using]
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, 2.0, 1.0), rowid LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+        query = ' & '.join(f'{token}:*' for token in tokens)
+        cursor.execute(
+            f"SELECT id FROM {BOOK_TABLE} WHERE {PG_VECTOR} @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank(setweight(to_tsvector('simple', title), 'A') || to_tsvector('simple', author), "
+            f"to_tsquery('simple', %s)) DESC, id LIMIT %s",
+            [query, query, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if ids or not _trigram.get(using):
+            return ids
+        phrase = ' '.join(tokens)
+        cursor.execute(
+            f"SELECT id FROM {BOOK_TABLE} WHERE {PG_DOCUMENT} %% %s "
+            f"ORDER BY similarity({PG_DOCUMENT}, %s) DESC, id LIMIT %s",
+            [phrase, phrase, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_books(queryset, term):
+    """
+    Filter a Book queryset down to matches for ``term``, ordered by relevance.
+
+    The ranking is exposed as a ``search_rank`` annotation (lower is better).
+    """
+    term = term.strip()
+    if not term:
+        return queryset
+    if not search_available(queryset.db):
+        return queryset.filter(Q(title__icontains=term) | Q(author__icontains=term))
+
+    ids = ranked_book_ids(term, using=queryset.db)
+    if not ids:
+        return queryset.none()
+    # One positional expression instead of a CASE with a branch per id, which
+    # costs more to build than the search itself.
+    if connections[queryset.db].vendor == 'sqlite':
+        rank = RawSQL(
+            f"instr(%s, ',' || {BOOK_TABLE}.id || ',')",
+            (',' + ','.join(map(str, ids)) + ',',),
+            output_field=IntegerField(),
+        )
+    else:
+        rank = RawSQL(f"array_position(%s, {BOOK_TABLE}.id)", (ids,), output_field=IntegerField())
+    return queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by('search_rank')
+
+
+def create_search_index(sender, using='default', **kwargs):
+    """post_migrate hook: the index lives outside the (untracked) migrations."""
+    ensure_search_index(using)
@@ -0,0 +1,289 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf
+from django.utils import timezone
+
+from .models import Book, BorrowRecord, Notification, Review, UserProfile
+from .response_cache import bump_cache_version
+from .signals import enqueue_analytics_sync
+
+
+class BorrowError(ValueError):
+    """A borrow or return that cannot go ahead; the message is safe to show users."""
+
+
+def take_copy(book_id):
+    """
+    Atomically take one copy of a book; returns False when none are left.
+
+    The same UPDATE bumps the book's borrow counters, so they roll back with
+    the copy if the surrounding borrow fails.
+    """
+    taken = Book.objects.filter(pk=book_id, available_copies__gt=0).update(
+        available_copies=F('available_copies') - 1,
+        borrow_count=F('borrow_count') + 1,
+        active_borrow_count=F('active_borrow_count') + 1,
+        updated_at=timezone.now(),
+    ) == 1
+    if taken:
+        # update() skips post_save, so sync and invalidate caches ourselves.
+        enqueue_analytics_sync('book', book_id)
+        bump_cache_version('books')
+    return taken
+
+
+def put_back_copy(book_id):
+    """Atomically put one copy of a book back; returns False when all copies are already in."""
+    returned = Book.objects.filter(pk=book_id, available_copies__lt=F('total_copies')).update(
+        available_copies=F('available_copies') + 1,
+        active_borrow_count=Greatest(F('active_borrow_count') - 1, 0),
+        updated_at=timezone.now(),
+    ) == 1
+    if returned:
+        enqueue_analytics_sync('book', book_id)
+        bump_cache_version('books')
+    return returned
+
+
+def adjust_book_rating(book_id, rating_delta, count_delta):
+    """
+    Apply a review change to a book's stored rating aggregates in one UPDATE.
+
+    The average is computed from the pre-update column values plus the
+    deltas, so it always matches the new sum and count.
+    """
+    new_sum = F('rating_sum') + rating_delta
+    new_count = F('rating_count') + count_delta
+    Book.objects.filter(pk=book_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating_average=Cast(new_sum, FloatField()) / NullIf(new_count, 0),
+        updated_at=timezone.now(),
+    )
+    bump_cache_version('books')
+
+
+def recount_book_rating(book_ids=None):
+    """
+    Rebuild the stored rating aggregates from the reviews table.
+
+    Only books whose stored sum or count has drifted are written. Pass
+    ``book_ids`` to limit the check, or None for the whole catalog.
+
+    Returns:
+        int: Number of books repaired
+    """
+    reviews = Review.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    true_sum = Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0)
+    true_count = Coalesce(Subquery(reviews.annotate(total=Count('id')).values('total')), 0)
+
+    books = Book.objects.all() if book_ids is None else Book.objects.filter(pk__in=book_ids)
+    drifted = list(
+        books.annotate(true_sum=true_sum, true_count=true_count)
+        .exclude(rating_sum=F('true_sum'), rating_count=F('true_count'))
+        .values_list('pk', flat=True)
+    )
+    if not drifted:
+        return 0
+    bump_cache_version('books')
+    return Book.objects.filter(pk__in=drifted).update(
+        rating_sum=true_sum,
+        rating_count=true_count,
+        rating_average=Cast(true_sum, FloatField()) / NullIf(true_count, 0),
+        updated_at=timezone.now(),
+    )
+
+
+def recount_borrow_counts(book_ids=None):
+    """
+    Rebuild ``borrow_count`` and ``active_borrow_count`` from BorrowRecord.
+
+    Only books whose stored counters have drifted are written. Pass
+    ``book_ids`` to limit the check, or None for the whole catalog.
+
+    Returns:
+        int: Number of books repaired
+    """
+    records = BorrowRecord.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    true_total = Coalesce(Subquery(records.annotate(total=Count('id')).values('total')), 0)
+    true_active = Coalesce(
+        Subquery(records.filter(is_returned=False).annotate(total=Count('id')).values('total')), 0
+    )
+
+    books = Book.objects.all() if book_ids is None else Book.objects.filter(pk__in=book_ids)
+    drifted = list(
+        books.annotate(true_total=true_total, true_active=true_active)
+        .exclude(borrow_count=F('true_total'), active_borrow_count=F('true_active'))
+        .values_list('pk', flat=True)
+    )
+    if not drifted:
+        return 0
+    bump_cache_version('books')
+    return Book.objects.filter(pk__in=drifted).update(
+        borrow_count=true_total,
+        active_borrow_count=true_active,
+        updated_at=timezone.now(),
+    )
+
+
+def borrow_book(user, book_id):
+    """
+    Borrow a book for ``user``.
+
+    The copy is taken with a conditional UPDATE, so concurrent borrowers can
+    never oversell, and the ``unique_active_borrow`` constraint stops the same
+    user holding two open loans of one book. On success the library tables
+    see two statements: the UPDATE and the BorrowRecord INSERT.
+
+    Raises:
+        Book.DoesNotExist: No book with ``book_id``
+        BorrowError: Already borrowed by this user, or no copies available
+    """
+    with transaction.atomic():
+        if not take_copy(book_id):
+            if not Book.objects.filter(pk=book_id).exists():
+                raise Book.DoesNotExist(f"Book {book_id} does not exist.")
+            if BorrowRecord.objects.filter(user=user, book_id=book_id, is_returned=False).exists():
+                raise BorrowError("You have already borrowed this book and not returned it yet.")
+            raise BorrowError("No copies available")
+        try:
+            record = BorrowRecord.objects.create(user=user, book_id=book_id)
+        except IntegrityError:
+            # Raising rolls the outer transaction back, restoring the copy.
+            raise BorrowError("You have already borrowed this book and not returned it yet.")
+    return record
+
+
+def return_book(record):
+    """
+    Return a borrowed book and charge any overdue fine.
+
+    The record is flipped with a conditional UPDATE so a double submit cannot
+    return the same loan twice or put back a copy that was never taken.
+
+    Raises:
+        BorrowError: The record was already returned, or every copy is already in
+    """
+    with transaction.atomic():
+        return_date = timezone.now()
+        fine = Decimal('0.00')
+        days_overdue = 0
+        if record.due_date and return_date > record.due_date:
+            days_overdue = (return_date - record.due_date).days
+            if days_overdue > 0:
+                fine = BorrowRecord.DEFAULT_FINE_PER_DAY * Decimal(days_overdue)
+
+        updated = BorrowRecord.objects.filter(pk=record.pk, is_returned=False).update(
+            is_returned=True,
+            return_date=return_date,
+            fine=fine,
+            updated_at=return_date,
+        )
+        if not updated:
+            raise BorrowError("Already returned.")
+        if not put_back_copy(record.book_id):
+            raise BorrowError("All copies are already returned.")
+
+        if fine > 0:
+            Notification.objects.create(
+                user_id=record.user_id,
+                message=f"You were {days_overdue} days late returning '{record.book.title}'. A fine of Rs.{fine} has been added."
+            )
+        enqueue_analytics_sync('borrowing', record.pk)
+        bump_cache_version('borrowings')
+
+    record.is_returned = True
+    record.return_date = return_date
+    record.fine = fine
+    record.updated_at = return_date
+    return record
+
+
+def adjust_unread_notifications(user_id, delta):
+    """Move ``UserProfile.unread_notifications`` by ``delta`` with a single UPDATE."""
+    UserProfile.objects.filter(user_id=user_id).update(
+        unread_notifications=Greatest(F('unread_notifications') + delta, 0)
+    )
+
+
+def recount_unread_notifications(user_ids=None):
+    """
+    Rebuild ``UserProfile.unread_notifications`` from Notification.
+
+    Only profiles whose stored counter has drifted are written. Pass
+    ``user_ids`` to limit the check, or None for every user.
+
+    Returns:
+        int: Number of profiles repaired
+    """
+    unread = (
+        Notification.objects.filter(user=OuterRef('user'), is_read=False)
+        .order_by().values('user').annotate(total=Count('id')).values('total')
+    )
+    true_unread = Coalesce(Subquery(unread), 0)
+
+    profiles = UserProfile.objects.all() if user_ids is None else UserProfile.objects.filter(user_id__in=user_ids)
+    drifted = list(
+        profiles.annotate(true_unread=true_unread)
+        .exclude(unread_notifications=F('true_unread'))
+        .values_list('pk', flat=True)
+    )
+    if not drifted:
+        return 0
+    return UserProfile.objects.filter(pk__in=drifted).update(unread_notifications=true_unread)
+
+
+def mark_all_notifications_read(user):
+    """
+    Mark every unread notification of ``user`` read; returns how many changed.
+
+    The counter is decremented by the rows actually flipped rather than reset
+    to zero, so a notification created concurrently stays counted.
+    """
+    with transaction.atomic():
+        updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+        if updated:
+            adjust_unread_notifications(user.pk, -updated)
+    return updated
+
+
+# Counter columns and the recount that fills them. When a migration adds one to
+# a table that already has rows, it starts at 0 and must be rebuilt.
+COUNTER_BACKFILLS = {
+    ('book', 'rating_sum'): recount_book_rating,
+    ('book', 'rating_count'): recount_book_rating,
+    ('book', 'rating_average'): recount_book_rating,
+    ('book', 'borrow_count'): recount_borrow_counts,
+    ('book', 'active_borrow_count'): recount_borrow_counts,
+    ('userprofile', 'unread_notifications'): recount_unread_notifications,
+}
+
+
+def backfill_counters(sender, plan=None, using='default', verbosity=1, **kwargs):
+    """
+    post_migrate hook: rebuild counters whose columns were just added.
+
+    Same work as ``repair_book_ratings``, ``reconcile_borrow_counts`` and
+    ``reconcile_unread_notifications``, run once by ``migrate`` itself so a
+    deploy cannot leave existing rows reading 0.
+    """
+    from django.db.migrations.operations import AddField
+
+    if using != 'default':
+        return
+    recounts = []
+    for migration, backwards in plan or ():
+        if backwards or migration.app_label != 'library_app':
+            continue
+        for operation in migration.operations:
+            if not isinstance(operation, AddField):
+                continue
+            recount = COUNTER_BACKFILLS.get((operation.model_name_lower, operation.name_lower))
+            if recount and recount not in recounts:
+                recounts.append(recount)
+    for recount in recounts:
+        repaired = recount()
+        if repaired and verbosity >= 1:
+            print(f"  Backfilled {recount.__name__.removeprefix('recount_').replace('_', ' ')} on {repaired} rows")
@@ -1,420 +1,278 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from django.conf import settings
-import psycopg2
+from contextlib import contextmanager
+import threading
 import logging
-from datetime import datetime
-from .models import BookCategory, Book, BorrowRecord, Review, UserProfile
+from .models import BookCategory, Book, BorrowRecord, Review, UserProfile, Notification, AnalyticsOutbox
+from .notification_stream import broker, notification_payload
+from .response_cache import bump_cache_version
 
 
 logger = logging.getLogger(__name__)
 
-class PostgreSQLSyncHandler:
-    """Handles PostgreSQL synchronization for Django models."""
-    
-    def __init__(self):
-        self.postgres_config = {
-            'host': getattr(settings, 'ANALYTICS_DB_HOST'),
-            'port': getattr(settings, 'ANALYTICS_DB_PORT'),
-            'database': getattr(settings, 'ANALYTICS_DB_NAME'),
-            'user': getattr(settings, 'ANALYTICS_DB_USER'),
-            'password': getattr(settings, 'ANALYTICS_DB_PASSWORD')
-        }
-        self.enabled = getattr(settings, 'ENABLE_ANALYTICS_SYNC', False)
-    
-    def get_connection(self):
-        if not self.enabled:
-            return None
-            
-        try:
-            return psycopg2.connect(**self.postgres_config)
-        except Exception as e:
-            logger.error(f"Failed to connect to analytics database: {e}")
-            return None
-    
-    def ensure_tables_exist(self):
-        """Ensure all required tables exist in PostgreSQL."""
-        conn = self.get_connection()
-        if not conn:
-            return
-            
-        try:
-            cursor = conn.cursor()
-            
-            # Create auth_user table if it doesn't exist
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS auth_user (
-                    id INTEGER PRIMARY KEY,
-                    username VARCHAR(150) UNIQUE NOT NULL,
-                    email VARCHAR(254),
-                    first_name VARCHAR(30),
-                    last_name VARCHAR(150),
-                    is_staff BOOLEAN DEFAULT FALSE,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    date_joined TIMESTAMP,
-                    full_name VARCHAR(150),
-                    address TEXT,
-                    phone VARCHAR(13)
-                )
-            """)
-            
-            # Create category table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS library_app_bookcategory (
-                    id INTEGER PRIMARY KEY,
-                    name VARCHAR(100) UNIQUE NOT NULL
-                )
-            """)
-            
-            # Create book table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS library_app_book (
-                    id INTEGER PRIMARY KEY,
-                    title VARCHAR(200) NOT NULL,
-                    author VARCHAR(200) NOT NULL,
-                    isbn VARCHAR(13) UNIQUE,
-                    total_copies INTEGER DEFAULT 1,
-                    available_copies INTEGER DEFAULT 1,
-                    cover_image VARCHAR(255),
-                    category_id INTEGER REFERENCES library_app_bookcategory(id)
-                )
-            """)
-            
-            # Create borrowing table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS library_app_borrowrecord (
-                    id INTEGER PRIMARY KEY,
-                    user_id INTEGER,
-                    book_id INTEGER REFERENCES library_app_book(id),
-                    borrow_date TIMESTAMP NOT NULL,
-                    return_date TIMESTAMP,
-                    due_date TIMESTAMP,
-                    is_returned BOOLEAN DEFAULT FALSE,
-                    fine NUMERIC(6,2) DEFAULT 0.00
-                )
-            """)
-            
-            # Create review table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS library_app_review (
-                    id INTEGER PRIMARY KEY,
-                    user_id INTEGER,
-                    book_id INTEGER REFERENCES library_app_book(id),
-                    rating INTEGER NOT NULL,
-                    comment TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            conn.commit()
-            logger.info("Ensured all analytics tables exist")
-            
-        except Exception as e:
-            logger.error(f"Failed to ensure tables exist: {e}")
-        finally:
-            conn.close()
-    
-    def sync_user(self, user_instance):
-        conn = self.get_connection()
-        if not conn:
-            return
-            
-        try:
-            cursor = conn.cursor()
-            
-            # Get user profile data safely
-            full_name = ''
-            address = ''
-            phone = ''
-            
-            try:
-                if hasattr(user_instance, 'userprofile'):
-                    profile = user_instance.userprofile
-                    full_name = getattr(profile, 'full_name', '')
-                    address = getattr(profile, 'address', '')
-                    phone = getattr(profile, 'phone', '')
-            except Exception:
-                # If userprofile doesn't exist, use empty strings
-                pass
-            
-            cursor.execute("""
-                INSERT INTO auth_user (id, username, email, first_name, last_name, 
-                                     is_staff, is_active, date_joined, full_name, address, phone)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (id) DO UPDATE SET
-                    username = EXCLUDED.username,
-                    email = EXCLUDED.email,
-                    first_name = EXCLUDED.first_name,
-                    last_name = EXCLUDED.last_name,
-                    is_staff = EXCLUDED.is_staff,
-                    is_active = EXCLUDED.is_active,
-                    full_name = EXCLUDED.full_name,
-                    address = EXCLUDED.address,
-                    phone = EXCLUDED.phone
-            """, (
-                user_instance.id,
-                user_instance.username,
-                user_instance.email or '',
-                user_instance.first_name or '',
-                user_instance.last_name or '',
-                user_instance.is_staff,
-                user_instance.is_active,
-                user_instance.date_joined,
-                full_name,
-                address,
-                phone
-            ))
-            
-            conn.commit()
-            logger.info(f"Synced user {user_instance.id} to analytics database")
-            
-        except Exception as e:
-            logger.error(f"Failed to sync user {user_instance.id}: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
-    
-
-    def sync_category(self, category_instance):
-        """Sync category to PostgreSQL."""
-        conn = self.get_connection()
-        if not conn:
-            return
-            
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO library_app_bookcategory (id, name)
-                VALUES (%s, %s)
-                ON CONFLICT (id) DO UPDATE SET
-                    name = EXCLUDED.name
-            """, (
-                category_instance.id,
-                category_instance.name
-            ))
-            
-            conn.commit()
-            logger.info(f"Synced category {category_instance.id} to analytics database")
-            
-        except Exception as e:
-            logger.error(f"Failed to sync category {category_instance.id}: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
-    
-
-
-    def sync_book(self, book_instance):
-        """Sync book to PostgreSQL."""
-        conn = self.get_connection()
-        if not conn:
-            return
-            
-        try:
-            cursor = conn.cursor()
-            
-            # Ensure category exists first
-            cursor.execute("""
-                INSERT INTO library_app_bookcategory (id, name)
-                VALUES (%s, %s)
-                ON CONFLICT (id) DO NOTHING
-            """, (
-                book_instance.category.id,
-                book_instance.category.name
-            ))
-            
-            # Now sync the book
-            cursor.execute("""
-                INSERT INTO library_app_book (id, title, author, isbn, total_copies,
-                                            available_copies, category_id, cover_image)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (id) DO UPDATE SET
-                    title = EXCLUDED.title,
-                    author = EXCLUDED.author,
-                    isbn = EXCLUDED.isbn,
-                    total_copies = EXCLUDED.total_copies,
-                    available_copies = EXCLUDED.available_copies,
-                    category_id = EXCLUDED.category_id,
-                    cover_image = EXCLUDED.cover_image
-            """, (
-                book_instance.id,
-                book_instance.title,
-                book_instance.author,
-                book_instance.isbn,
-                book_instance.total_copies,
-                book_instance.available_copies,
-                book_instance.category_id,
-                str(book_instance.cover_image) if book_instance.cover_image else None
-            ))
-            
-            conn.commit()
-            logger.info(f"Synced book {book_instance.id} to analytics database")
-            
-        except Exception as e:
-            logger.error(f"Failed to sync book {book_instance.id}: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
-    
-
-
-    def sync_borrowing(self, borrowing_instance):
-        """Sync borrowing to PostgreSQL - CRITICAL for analytics."""
-        conn = self.get_connection()
-        if not conn:
+_batch_state = threading.local()
+
+
+def _batches():
+    stack = getattr(_batch_state, 'stack', None)
+    if stack is None:
+        stack = _batch_state.stack = []
+    return stack
+
+
+def enqueue_analytics_sync(model, object_id):
+    """
+    Record that an object must be shipped to the analytics database.
+
+    The outbox row is written on the default database connection, so it joins
+    whatever transaction the model change is part of and is only visible to
+    the drainer once that change commits. The request path never talks to
+    PostgreSQL.
+    """
+    if not getattr(settings, 'ENABLE_ANALYTICS_SYNC', False):
+        return
+    if getattr(settings, 'ANALYTICS_SYNC_MODE', 'outbox') != 'outbox':
+        return
+    batches = _batches()
+    if batches:
+        pending, transactional = batches[-1]
+        # Outside a transactional batch only autocommit saves may wait for the
+        # flush; a save inside someone else's atomic block writes its row now
+        # so it commits (or rolls back) with that block.
+        if transactional or not transaction.get_connection().in_atomic_block:
+            pending.add((model, object_id))
             return
-            
-        try:
-            cursor = conn.cursor()
-            
-            # Ensure user exists first (but we can't create it here without profile info)
-            # So we'll skip this and rely on user sync from auth signals
-            
-            # Ensure book exists first
-            try:
-                cursor.execute("""
-                    INSERT INTO library_app_bookcategory (id, name)
-                    VALUES (%s, %s)
-                    ON CONFLICT (id) DO NOTHING
-                """, (
-                    borrowing_instance.book.category.id,
-                    borrowing_instance.book.category.name
-                ))
-                
-                cursor.execute("""
-                    INSERT INTO library_app_book (id, title, author, isbn, total_copies,
-                                                available_copies, category_id, cover_image)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO NOTHING
-                """, (
-                    borrowing_instance.book.id,
-                    borrowing_instance.book.title,
-                    borrowing_instance.book.author,
-                    borrowing_instance.book.isbn,
-                    borrowing_instance.book.total_copies,
-                    borrowing_instance.book.available_copies,
-                    borrowing_instance.book.category_id,
-                    str(borrowing_instance.book.cover_image) if borrowing_instance.book.cover_image else None
-                ))
-            except Exception:
-                # If book sync fails, continue with borrowing sync
-                pass
-            
-            # Now sync the borrowing record
-            cursor.execute("""
-                INSERT INTO library_app_borrowrecord (id, user_id, book_id, borrow_date, due_date,
-                                                    return_date, is_returned, fine)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (id) DO UPDATE SET
-                    return_date = EXCLUDED.return_date,
-                    is_returned = EXCLUDED.is_returned,
-                    fine = EXCLUDED.fine
-            """, (
-                borrowing_instance.id,
-                borrowing_instance.user_id,
-                borrowing_instance.book_id,
-                borrowing_instance.borrow_date,
-                borrowing_instance.due_date,
-                borrowing_instance.return_date,
-                borrowing_instance.is_returned,
-                float(borrowing_instance.fine) if borrowing_instance.fine else 0.0
-            ))
-            
-            conn.commit()
-            logger.info(f"Synced borrowing {borrowing_instance.id} to analytics database")
-            print(f"✅ SUCCESS: Synced borrowing {borrowing_instance.id} to analytics database")
-            
-        except Exception as e:
-            logger.error(f"Failed to sync borrowing {borrowing_instance.id}: {e}")
-            logger.error(f"Error details: {str(e)}")
-            print(f"❌ ERROR: Failed to sync borrowing {borrowing_instance.id}: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
-
-
-    def sync_review(self, review_instance):
-            """Sync review to PostgreSQL - for ratings analytics."""
-            conn = self.get_connection()
-            if not conn:
-                return
-                
-            try:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO library_app_review (id, user_id, book_id, rating, comment, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO UPDATE SET
-                        rating = EXCLUDED.rating,
-                        comment = EXCLUDED.comment
-                """, (
-                    review_instance.id,
-                    review_instance.user_id,
-                    review_instance.book_id,
-                    review_instance.rating,
-                    review_instance.content,
-                    review_instance.created_at
-                ))
-                
-                conn.commit()
-                logger.info(f"Synced review {review_instance.id} to analytics database")
-                
-            except Exception as e:
-                logger.error(f"Failed to sync review {review_instance.id}: {e}")
-            finally:
-                conn.close()
-
-
-# Initialize sync handler
-sync_handler = PostgreSQLSyncHandler()
-
-# Ensure tables exist on startup
-try:
-    sync_handler.ensure_tables_exist()
-except Exception as e:
-    logger.error(f"Failed to ensure tables exist on startup: {e}")
+    AnalyticsOutbox.objects.create(model=model, object_id=object_id)
+
+
+@contextmanager
+def analytics_sync_batch():
+    """
+    Coalesce analytics sync work for the duration of an atomic block.
+
+    The block runs inside ``transaction.atomic()``. Saves inside it are
+    collected and deduplicated by (model, pk), then written as a single
+    multi-row outbox insert just before that transaction (or savepoint, when
+    the caller already holds one) commits, so the outbox rows commit or roll
+    back together with the changes they describe. Nested batches join the
+    outer one; only the outermost flushes.
+
+        with analytics_sync_batch():
+            for book in books:
+                book.save()
+    """
+    batches = _batches()
+    if batches and batches[-1][1]:
+        yield
+        return
+
+    pending = set()
+    batches.append((pending, True))
+    try:
+        with transaction.atomic():
+            yield
+            # A swallowed database error leaves nothing to commit; atomic() rolls back.
+            if not transaction.get_connection().needs_rollback:
+                _flush_batch(pending)
+    finally:
+        batches.pop()
+
+
+@contextmanager
+def deferred_analytics_sync():
+    """
+    Coalesce the sync work of autocommit saves without opening a transaction.
+
+    Each autocommit save has already committed by the time its signal fires,
+    so its outbox row is deferred and the deduplicated rows are written in one
+    insert when the block exits. Saves made inside an atomic block still write
+    their row straight away, in that block's transaction.
+    """
+    pending = set()
+    batches = _batches()
+    batches.append((pending, False))
+    try:
+        yield
+    finally:
+        batches.pop()
+        _flush_batch(pending)
+
+
+def _flush_batch(pending):
+    if pending:
+        AnalyticsOutbox.objects.bulk_create(
+            [AnalyticsOutbox(model=model, object_id=object_id) for model, object_id in sorted(pending)]
+        )
+
+
+class AnalyticsSyncBatchMiddleware:
+    """
+    Runs every write request inside ``deferred_analytics_sync`` so repeated
+    saves coalesce. No transaction is held for the request: the services and
+    views open their own short atomic blocks. Safe methods skip it, which
+    also keeps the notification streams out of it.
+    """
+
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in self.safe_methods:
+            return self.get_response(request)
+        with deferred_analytics_sync():
+            return self.get_response(request)
+
 
 @receiver(post_save, sender='auth.User')
-def sync_user_to_analytics(sender, instance, created, **kwargs):
+def sync_user_to_analytics(sender, instance, created, update_fields=None, **kwargs):
     """Sync user changes to analytics database."""
-    sync_handler.sync_user(instance)
+    enqueue_analytics_sync('user', instance.pk)
+    if (
+        getattr(settings, 'ENABLE_ANALYTICS_SYNC', False)
+        and getattr(settings, 'ANALYTICS_SYNC_MODE', 'outbox') == 'incremental'
+        and not created
+        and update_fields != frozenset({'last_login'})
+    ):
+        # auth.User has no modification timestamp; stamp the profile's so the
+        # incremental sync sees User-only edits (email, names, flags).
+        UserProfile.objects.filter(user_id=instance.pk).update(updated_at=timezone.now())
 
 
 @receiver(post_save, sender=BookCategory)
 def sync_category_to_analytics(sender, instance, created, **kwargs):
     """Sync category changes to analytics database."""
-    sync_handler.sync_category(instance)
+    enqueue_analytics_sync('category', instance.pk)
 
 
 @receiver(post_save, sender=Book)
 def sync_book_to_analytics(sender, instance, created, **kwargs):
     """Sync book changes to analytics database."""
-    sync_handler.sync_book(instance)
+    enqueue_analytics_sync('book', instance.pk)
 
 
 @receiver(post_save, sender=BorrowRecord)
 def sync_borrowing_to_analytics(sender, instance, created, **kwargs):
     """Sync borrowing changes to analytics database - MOST IMPORTANT."""
-    sync_handler.sync_borrowing(instance)
+    enqueue_analytics_sync('borrowing', instance.pk)
 
 
 @receiver(post_save, sender=Review)
 def sync_review_to_analytics(sender, instance, created, **kwargs):
     """Sync review changes to analytics database - for ratings analytics."""
-    sync_handler.sync_review(instance)    
+    enqueue_analytics_sync('review', instance.pk)
+
+
+# Namespaces of the public response cache that a model's writes invalidate
+CACHE_NAMESPACES = {
+    Book: ('books',),
+    BookCategory: ('categories',),
+    Review: ('reviews',),
+    BorrowRecord: ('borrowings',),
+}
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=BookCategory)
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=BorrowRecord)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=BookCategory)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=BorrowRecord)
+def invalidate_cached_responses(sender, **kwargs):
+    """Expire cached public responses built from this model."""
+    bump_cache_version(*CACHE_NAMESPACES[sender])
+
+
+@receiver(post_save, sender=Review)
+def update_book_rating_on_save(sender, instance, created, **kwargs):
+    """Fold a new or edited review into the book's stored rating aggregates."""
+    from .services import adjust_book_rating, recount_book_rating
+
+    counted = getattr(instance, '_counted_rating', None)
+    if created:
+        adjust_book_rating(instance.book_id, instance.rating, 1)
+    elif counted is None or None in counted:
+        # Saved without being loaded first, or loaded with the rating or book
+        # deferred, so we don't know what was counted.
+        old_book_id = counted[0] if counted else None
+        recount_book_rating({old_book_id, instance.book_id} - {None})
+    elif counted != (instance.book_id, instance.rating):
+        old_book_id, old_rating = counted
+        adjust_book_rating(old_book_id, -old_rating, -1)
+        adjust_book_rating(instance.book_id, instance.rating, 1)
+    instance._counted_rating = (instance.book_id, instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def update_book_rating_on_delete(sender, instance, **kwargs):
+    """Take a deleted review back out of the book's stored rating aggregates."""
+    from .services import adjust_book_rating, recount_book_rating
+
+    book_id, rating = getattr(instance, '_counted_rating', None) or (instance.book_id, instance.rating)
+    if rating is None:
+        # Loaded with the rating deferred; the row is gone, so recount the book.
+        recount_book_rating([book_id])
+    else:
+        adjust_book_rating(book_id, -rating, -1)
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count_on_save(sender, instance, created, **kwargs):
+    """Keep UserProfile.unread_notifications in step with a new or edited notification."""
+    from .services import adjust_unread_notifications, recount_unread_notifications
+
+    counted = getattr(instance, '_counted_state', None)
+    if created:
+        if not instance.is_read:
+            adjust_unread_notifications(instance.user_id, 1)
+    elif counted is None or None in counted:
+        # Saved without being loaded first, or loaded with fields deferred, so
+        # we don't know what was counted.
+        old_user_id = counted[0] if counted else None
+        recount_unread_notifications({old_user_id, instance.user_id} - {None})
+    elif counted != (instance.user_id, instance.is_read):
+        old_user_id, old_is_read = counted
+        if not old_is_read:
+            adjust_unread_notifications(old_user_id, -1)
+        if not instance.is_read:
+            adjust_unread_notifications(instance.user_id, 1)
+    instance._counted_state = (instance.user_id, instance.is_read)
+
+
+@receiver(post_save, sender=Notification)
+def push_new_notification(sender, instance, created, **kwargs):
+    """Send a new notification to the user's open streams once it is committed."""
+    if created:
+        payload = notification_payload(instance)
+        transaction.on_commit(lambda: broker.publish(instance.user_id, payload))
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_count_on_delete(sender, instance, **kwargs):
+    """Take a deleted unread notification back out of the user's counter."""
+    from .services import adjust_unread_notifications, recount_unread_notifications
+
+    user_id, is_read = getattr(instance, '_counted_state', None) or (instance.user_id, instance.is_read)
+    if is_read is None:
+        recount_unread_notifications([user_id])
+    elif not is_read:
+        adjust_unread_notifications(user_id, -1)
 
 
 @receiver(post_save, sender=UserProfile)
 def sync_user_profile_to_analytics(sender, instance, created, **kwargs):
     """Sync user profile changes - this will update the user in analytics database."""
-    sync_handler.sync_user(instance.user)    
+    enqueue_analytics_sync('user', instance.user_id)
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
-        Token.objects.create(user=instance)    
\ No newline at end of file
+        Token.objects.create(user=instance)
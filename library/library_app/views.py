@@ -1,6 +1,8 @@
 from django.db.models import Q
 from django.urls import reverse
 from django.http import JsonResponse
+from . import services
+from . import search
 from .forms import UserSignupForm
 from django.contrib import messages
 from django.utils.timezone import now
@@ -63,16 +65,14 @@ def list_books(request):
 def borrow_book(request, book_id):
     book = get_object_or_404(Book, id=book_id)
 
-    already_borrowed = BorrowRecord.objects.filter(user=request.user, book=book, is_returned=False).exists()
-
-    if already_borrowed:
-        messages.warning(request, "You have already borrowed this book.")
-    elif book.available_copies > 0:
-        book.borrow()
-        BorrowRecord.objects.create(user=request.user, book=book)
+    try:
+        services.borrow_book(request.user, book.id)
         messages.success(request, f"You've successfully borrowed: {book.title}")
-    else:
-        messages.error(request, "No copies available to borrow at the moment.")
+    except services.BorrowError:
+        if BorrowRecord.objects.filter(user=request.user, book=book, is_returned=False).exists():
+            messages.warning(request, "You have already borrowed this book.")
+        else:
+            messages.error(request, "No copies available to borrow at the moment.")
 
     return redirect(request.META.get('HTTP_REFERER') or reverse('list_books'))
 
@@ -80,7 +80,10 @@ def borrow_book(request, book_id):
 def return_book(request, record_id):
     record = get_object_or_404(BorrowRecord, id=record_id, user=request.user)
     if not record.is_returned:
-        record.return_book()
+        try:
+            services.return_book(record)
+        except services.BorrowError as e:
+            messages.error(request, str(e))
     return redirect('my_borrowings')
 
 
@@ -93,9 +96,7 @@ def search_books(request):
     query = request.GET.get('query', '').strip()
     results = []
     if query:
-        results = Book.objects.filter(
-            Q(title__icontains=query) | Q(author__icontains=query)
-        )
+        results = search.search_books(Book.objects.all(), query)
     return render(request, 'search.html', {'query': query, 'results': results})
 
 def books_by_category(request, category_id):
@@ -280,7 +281,7 @@ def admin_manage_borrowings(request):
 @csrf_exempt
 def mark_all_notifications_read(request):
     if request.method == "POST":
-        updated_count = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        services.mark_all_notifications_read(request.user)
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'invalid method'}, status=400)
 